@@ -0,0 +1,193 @@
+# --- SYMULATOR BALANSU ---
+# Wiele rozgrywek bez okna (bot z trybu headless) na puli procesów, dla każdej kombinacji
+# parametrów z siatki. Wynik: zagregowane rozkłady czasu przeżycia, osiągniętego poziomu,
+# punktów i czasu zabicia bossa (CSV albo Parquet), opcjonalnie też wiersz na każdą grę.
+# Każda kombinacja gra na tych samych ziarnach, więc różnice między wierszami wynikają
+# z parametrów, a nie z losowania.
+# Przykład:
+#   python balance.py --difficulty normal hard --grid spawn_rate=0.8,1.0,1.2 --grid boss_hp_per_level=5,10 --games 500
+import os
+import sys
+import copy
+import csv
+import time
+import argparse
+import itertools
+import multiprocessing
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import game
+
+# Parametry do przestawiania w siatce (nazwa=wartość1,wartość2,...)
+DIFFICULTY_FIELDS = ("speed", "damage", "spawn_rate")
+GLOBAL_PARAMS = {"boss_base_hp": "BOSS_BASE_HP", "boss_hp_per_level": "BOSS_HP_PER_LEVEL",
+                 "boss_coop_hp": "BOSS_COOP_HP", "level_step": "LEVEL_CURVE_STEP"}
+WEIGHT_PARAMS = {"w_" + name: name for name in game.ENEMY_SPAWN_WEIGHTS}
+PARAMETERS = DIFFICULTY_FIELDS + tuple(GLOBAL_PARAMS) + tuple(WEIGHT_PARAMS)
+
+BASE_DIFFICULTY = copy.deepcopy(game.DIFFICULTY_SETTINGS)
+BASE_WEIGHTS = dict(game.ENEMY_SPAWN_WEIGHTS)
+BASE_GLOBALS = {name: getattr(game, attr) for name, attr in GLOBAL_PARAMS.items()}
+
+def apply_params(difficulty, params):
+    # Zawsze od wartości wyjściowych - proces z puli gra po kolei różne kombinacje
+    game.DIFFICULTY_SETTINGS = copy.deepcopy(BASE_DIFFICULTY)
+    game.ENEMY_SPAWN_WEIGHTS = dict(BASE_WEIGHTS)
+    for name, attr in GLOBAL_PARAMS.items(): setattr(game, attr, BASE_GLOBALS[name])
+    for name, value in params.items():
+        if name in DIFFICULTY_FIELDS: game.DIFFICULTY_SETTINGS[difficulty][name] = value
+        elif name in WEIGHT_PARAMS: game.ENEMY_SPAWN_WEIGHTS[WEIGHT_PARAMS[name]] = value
+        else: setattr(game, GLOBAL_PARAMS[name], value)
+
+def parse_value(text):
+    # Liczby bez kropki zostają całkowite (level_step, boss_base_hp, wagi w_*)
+    try:
+        return int(text) if not any(c in text for c in ".eE") else float(text)
+    except ValueError:
+        raise SystemExit(f"Zła wartość w siatce: {text!r} (oczekiwana liczba)")
+
+def positive_int(text):
+    value = int(text)
+    if value < 1: raise argparse.ArgumentTypeError(f"musi być co najmniej 1, podano {value}")
+    return value
+
+def parse_grid(items):
+    grid = {}
+    for item in items:
+        name, _, values = item.partition("=")
+        if name not in PARAMETERS or not values:
+            raise SystemExit(f"Zły parametr siatki: {item!r} (dostępne: {', '.join(PARAMETERS)})")
+        grid[name] = [parse_value(value.strip()) for value in values.split(",")]
+    return grid
+
+def worker_init():
+    game.sound_enabled = False
+
+def play_game(task):
+    combo_id, difficulty, params, seed, max_ticks, is_multiplayer, start_level, policy = task
+    apply_params(difficulty, params)
+    save_data = {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": start_level}}
+    session = game.GameSession(difficulty, is_multiplayer, "balanced", "balanced", save_data, seed=seed)
+    controller = game.HEADLESS_POLICIES[policy](seed)
+    victory_tick = None
+    while session.tick < max_ticks:
+        session.step(controller(session))
+        if session.outcome == "VICTORY":
+            # Zwycięstwo zapisujemy i gramy dalej (endless), jak gracz, który wybrał "graj dalej"
+            victory_tick = session.tick
+            session.endless_mode = True; session.outcome = None
+        elif session.outcome == "GAME_OVER":
+            break
+    return {"combo": combo_id, "seed": seed, "died": session.outcome == "GAME_OVER",
+            "survival_s": session.tick / game.SIM_HZ, "level": session.shared_level, "score": session.shared_score,
+            "victory_s": victory_tick / game.SIM_HZ if victory_tick is not None else None,
+            "boss_kills_s": [ticks / game.SIM_HZ for ticks in session.boss_kill_ticks]}
+
+def distribution(prefix, values):
+    values = sorted(values)
+    if not values: return {f"{prefix}_{key}": None for key in ("mean", "p10", "p50", "p90")}
+    return {f"{prefix}_mean": sum(values) / len(values), f"{prefix}_p10": game.percentile(values, 0.1),
+            f"{prefix}_p50": game.percentile(values, 0.5), f"{prefix}_p90": game.percentile(values, 0.9)}
+
+def aggregate(combo, games):
+    row = dict(combo)
+    row["games"] = len(games)
+    row["died_pct"] = 100 * sum(g["died"] for g in games) / len(games)
+    row["victory_pct"] = 100 * sum(g["victory_s"] is not None for g in games) / len(games)
+    row.update(distribution("survival_s", [g["survival_s"] for g in games]))
+    row.update(distribution("level", [g["level"] for g in games]))
+    row["level_max"] = max(g["level"] for g in games)
+    row.update(distribution("score", [g["score"] for g in games]))
+    row.update(distribution("victory_s", [g["victory_s"] for g in games if g["victory_s"] is not None]))
+    kills = [t for g in games for t in g["boss_kills_s"]]
+    row["boss_kills"] = len(kills)
+    row.update(distribution("boss_kill_s", kills))
+    return row
+
+def require_pyarrow():
+    # Parquet jest opcjonalny - sprawdzamy przed symulacją, żeby nie stracić wyników na końcu
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("Zapis do Parquet wymaga pakietu pyarrow (pip install pyarrow) - albo podaj plik .csv")
+    return pyarrow
+
+def write_rows(path, rows):
+    if path.endswith(".parquet"):
+        pyarrow = require_pyarrow()
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), path)
+        return
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def run(args):
+    grid = parse_grid(args.grid)
+    if any(path and path.endswith(".parquet") for path in (args.out, args.raw)): require_pyarrow()
+    names = list(grid)
+    combos = [{"difficulty": difficulty, **dict(zip(names, values))}
+              for difficulty in args.difficulty for values in itertools.product(*(grid[name] for name in names))]
+    max_ticks = int(args.minutes * 60 * game.SIM_HZ)
+    tasks = [(combo_id, combo["difficulty"], {name: combo[name] for name in names}, args.seed + i,
+              max_ticks, args.coop, args.start_level, args.policy)
+             for combo_id, combo in enumerate(combos) for i in range(args.games)]
+    workers = args.workers or os.cpu_count() or 1
+    print(f"{len(combos)} kombinacji x {args.games} gier = {len(tasks)} gier (do {args.minutes:g} min każda), procesów: {workers}")
+
+    results = [[] for _ in combos]
+    start = time.perf_counter()
+    step = max(1, len(tasks) // 10)
+    if workers == 1:
+        worker_init()
+        finished = map(play_game, tasks)
+    else:
+        pool = multiprocessing.Pool(workers, initializer=worker_init)
+        # Kilka zadań na paczkę: mniej komunikacji, a procesy i tak kończą mniej więcej równo
+        finished = pool.imap_unordered(play_game, tasks, chunksize=max(1, min(16, len(tasks) // (workers * 8))))
+    for done, result in enumerate(finished, 1):
+        results[result["combo"]].append(result)
+        if done % step == 0 or done == len(tasks):
+            elapsed = time.perf_counter() - start
+            print(f"  {done}/{len(tasks)} gier, {elapsed:.1f} s ({done / elapsed:.1f} gier/s)")
+    if workers > 1:
+        pool.close()
+        pool.join()
+
+    rows = [aggregate(combo, games) for combo, games in zip(combos, results)]
+    write_rows(args.out, rows)
+    print(f"Wyniki zbiorcze: {args.out}")
+    for row in rows:
+        params = ", ".join(f"{name}={row[name]:g}" for name in names)
+        print(f"  [{row['difficulty']}{', ' + params if params else ''}] przeżycie p50 {row['survival_s_p50']:.0f} s, "
+              f"poziom p50 {row['level_p50']:g}, punkty p50 {row['score_p50']:g}, zgonów {row['died_pct']:.0f}%, "
+              f"zwycięstw {row['victory_pct']:.0f}%, bossów {row['boss_kills']}")
+    if args.raw:
+        raw = []
+        for combo, games in zip(combos, results):
+            for g in sorted(games, key=lambda g: g["seed"]):
+                raw.append({**combo, "seed": g["seed"], "died": g["died"], "survival_s": g["survival_s"], "level": g["level"],
+                            "score": g["score"], "victory_s": g["victory_s"], "boss_kills_s": ";".join(f"{t:.2f}" for t in g["boss_kills_s"])})
+        write_rows(args.raw, raw)
+        print(f"Wyniki pojedynczych gier: {args.raw}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Symulator balansu: wiele gier z botem na siatce parametrów")
+    parser.add_argument("--difficulty", nargs="+", choices=list(game.DIFFICULTY_SETTINGS), default=["normal"], help="poziomy trudności")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAZWA=W1,W2",
+                        help=f"parametr i wartości do sprawdzenia (można powtarzać): {', '.join(PARAMETERS)}")
+    parser.add_argument("--games", type=positive_int, default=100, help="gier na kombinację")
+    parser.add_argument("--minutes", type=float, default=10.0, help="limit długości jednej gry")
+    parser.add_argument("--coop", action="store_true", help="tryb dwóch graczy")
+    parser.add_argument("--start-level", type=int, default=1, help="poziom startowy")
+    parser.add_argument("--policy", choices=list(game.HEADLESS_POLICIES), default="bot", help="kto steruje statkiem")
+    parser.add_argument("--seed", type=int, default=0, help="pierwsze ziarno (gra i ma ziarno seed + i)")
+    parser.add_argument("--workers", type=int, default=0, help="liczba procesów (0 = wszystkie rdzenie)")
+    parser.add_argument("--out", default="balans.csv", help="plik wyników zbiorczych (.csv albo .parquet)")
+    parser.add_argument("--raw", help="opcjonalny plik z wierszem na każdą grę (.csv albo .parquet)")
+    run(parser.parse_args())
+    sys.exit(0)
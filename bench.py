@@ -0,0 +1,768 @@
+# --- BENCHMARKI WYDAJNOŚCI ---
+# Uruchomienie: python bench.py <nazwa> (bez nazwy - wszystkie)
+# Domyślnie bez okna i dźwięku (sterowniki SDL "dummy"), żeby wyniki były powtarzalne.
+import os
+import sys
+import math
+import random
+import time
+import subprocess
+import tempfile
+import copy
+import json
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+import game
+
+GAME_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game.py")
+
+def measure(frame_fn, frames):
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        frame_fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return sum(times) / len(times), times[int(len(times) * 0.99) - 1]
+
+def report(label, mean_ms, p99_ms):
+    print(f"  {label:<34} średnio {mean_ms:7.3f} ms   p99 {p99_ms:7.3f} ms")
+
+# --- POCISKI: pula NumPy vs. obiekty Bullet ---
+class LegacyBullet:
+    # Dawna implementacja (obiekt na pocisk), trzymana tylko do porównania
+    def __init__(self, x, y, angle, speed, radius, color):
+        self.x, self.y, self.angle = x, y, angle
+        self.speed, self.radius, self.color = speed, radius, color
+        self.history = []
+
+    def update(self):
+        self.history.append((self.x, self.y))
+        if len(self.history) > 6: self.history.pop(0)
+        self.x += math.cos(self.angle) * self.speed
+        self.y += math.sin(self.angle) * self.speed
+
+    def draw(self, surface):
+        for i, (hx, hy) in enumerate(self.history):
+            size = int(self.radius * (i / len(self.history)))
+            if size > 0: pygame.draw.circle(surface, self.color, (int(hx), int(hy)), size)
+        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
+
+    def is_off_screen(self):
+        return self.x < -50 or self.x > game.WIDTH + 50 or self.y < -50 or self.y > game.HEIGHT + 50
+
+def bench_bullets(frames=120):
+    surface = pygame.Surface((game.WIDTH, game.HEIGHT))
+    print("Pociski (symulacja: ruch + odrzucanie + kompaktowanie; cała klatka: + rysowanie):")
+    for count in (1000, 5000, 10000):
+        rng = random.Random(1)
+        spawn_args = lambda: (rng.uniform(0, game.WIDTH), rng.uniform(0, game.HEIGHT), rng.uniform(0, 2 * math.pi))
+
+        legacy = [LegacyBullet(*spawn_args(), 10, 5, game.YELLOW) for _ in range(count)]
+        def legacy_sim():
+            for bullet in legacy[:]:
+                bullet.update()
+                if bullet.is_off_screen(): legacy.remove(bullet)
+            while len(legacy) < count: legacy.append(LegacyBullet(*spawn_args(), 10, 5, game.YELLOW))
+        def legacy_frame():
+            legacy_sim()
+            surface.fill(game.BLACK)
+            for bullet in legacy: bullet.draw(surface)
+
+        pool = game.BulletPool()
+        for _ in range(count): pool.spawn(*spawn_args())
+        def pool_sim():
+            pool.update()
+            pool.cull_off_screen()
+            pool.compact()
+            while pool.count < count: pool.spawn(*spawn_args())
+        def pool_frame():
+            pool_sim()
+            surface.fill(game.BLACK)
+            pool.draw(surface)
+
+        report(f"{count} x Bullet, symulacja", *measure(legacy_sim, frames))
+        report(f"{count} x BulletPool, symulacja", *measure(pool_sim, frames))
+        report(f"{count} x Bullet, cała klatka", *measure(legacy_frame, frames))
+        report(f"{count} x BulletPool, cała klatka", *measure(pool_frame, frames))
+
+# --- ŚLADY POCISKÓW: kółka z historii pozycji vs. ślad liczony z prędkości + blits ---
+def trail_scene(count, b_types, ticks=8, seed=3):
+    # Te same pociski w obu wersjach; co tick dochodzi nowa porcja, więc wiek (i długość śladu) jest różny
+    rng = random.Random(seed)
+    legacy, pool = [], game.BulletPool()
+    for tick in range(ticks):
+        for bullet in legacy: bullet.update()
+        pool.update()
+        for _ in range(count // ticks):
+            x, y, angle, t = rng.uniform(0, game.WIDTH), rng.uniform(0, game.HEIGHT), rng.uniform(0, 2 * math.pi), rng.choice(b_types)
+            legacy.append(LegacyBullet(x, y, angle, game.BULLET_SPEEDS[t], game.BULLET_RADII[t], game.BULLET_COLORS[t]))
+            pool.spawn(x, y, angle, game.OWNER_PLAYER, t)
+    return legacy, pool
+
+def bench_trails(frames=120):
+    surface = pygame.Surface((game.WIDTH, game.HEIGHT))
+    reference = pygame.Surface((game.WIDTH, game.HEIGHT))
+    legacy, pool = trail_scene(400, [game.BULLET_NORMAL])
+    reference.fill(game.BLACK)
+    for bullet in legacy: bullet.draw(reference)
+    surface.fill(game.BLACK)
+    pool.draw(surface)
+    diff = np.count_nonzero(pygame.surfarray.array3d(reference) != pygame.surfarray.array3d(surface))
+    print(f"Ślady pocisków (zgodność z rysowaniem kółek, 400 pocisków: {'OK' if diff == 0 else f'{diff} różnych składowych pikseli'}):")
+    types = [game.BULLET_NORMAL, game.BULLET_SHOTGUN, game.BULLET_PIERCE, game.BULLET_ENEMY]
+    for count in (200, 1000, 3000):
+        legacy, pool = trail_scene(count, types)
+        def legacy_frame():
+            surface.fill(game.BLACK)
+            for bullet in legacy: bullet.draw(surface)
+        report(f"{count} pocisków, kółka z historii", *measure(legacy_frame, frames))
+        for quality in game.TRAIL_QUALITIES:
+            def pool_frame():
+                surface.fill(game.BLACK)
+                pool.draw(surface, 1.0, quality)
+            report(f"{count} pocisków, ślad {quality}", *measure(pool_frame, frames))
+
+# --- USUWANIE ENCJI: list.remove vs. EntityList ---
+class Dummy:
+    def __init__(self, rng):
+        self.life = rng.randint(1, 40)
+
+def bench_despawn(frames=200):
+    print("Usuwanie encji (co klatkę ginie ok. 5% obiektów, uzupełniamy do stałej liczby):")
+    for count in (500, 2000, 5000):
+        rng = random.Random(2)
+        legacy = [Dummy(rng) for _ in range(count)]
+        def legacy_frame():
+            for obj in legacy[:]:
+                obj.life -= 1
+                if obj.life <= 0 and obj in legacy: legacy.remove(obj)
+            while len(legacy) < count: legacy.append(Dummy(rng))
+
+        entities = game.EntityList()
+        for _ in range(count): entities.append(Dummy(rng))
+        def entity_list_frame():
+            for obj in entities:
+                obj.life -= 1
+                if obj.life <= 0: entities.kill(obj)
+            entities.compact()
+            while len(entities) < count: entities.append(Dummy(rng))
+
+        report(f"{count} x list[:] + remove", *measure(legacy_frame, frames))
+        report(f"{count} x EntityList", *measure(entity_list_frame, frames))
+
+# --- CZĄSTECZKI: obiekty Particle vs. ParticleSystem ---
+class LegacyParticle:
+    def __init__(self, x, y, color):
+        self.x, self.y = x, y
+        self.color = color
+        self.vx, self.vy = random.uniform(-3, 3), random.uniform(-3, 3)
+        self.radius = random.randint(3, 6)
+        self.life = random.randint(20, 40)
+    def update(self):
+        self.x += self.vx; self.y += self.vy; self.life -= 1
+        if self.life % 5 == 0 and self.radius > 0: self.radius -= 1
+    def draw(self, surface):
+        if self.radius > 0: pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
+
+def bench_particles(frames=240):
+    surface = pygame.Surface((game.WIDTH, game.HEIGHT))
+    colors = [game.RED, game.ORANGE, game.CYAN, game.GREEN, game.PURPLE]
+    print("Cząsteczki (fala eksplozji: co klatkę 3 wrogów po 15 + co 20 klatek boss 50):")
+    rng = random.Random(3)
+    bursts = []
+    for f in range(frames):
+        frame_bursts = [(rng.uniform(0, game.WIDTH), rng.uniform(0, game.HEIGHT), rng.choice(colors), 15) for _ in range(3)]
+        if f % 20 == 0: frame_bursts.append((rng.uniform(0, game.WIDTH), rng.uniform(0, game.HEIGHT), game.PURPLE, 50))
+        bursts.append(frame_bursts)
+
+    legacy, frame_no = [], [0]
+    def legacy_frame():
+        for x, y, color, amount in bursts[frame_no[0] % frames]:
+            for _ in range(amount): legacy.append(LegacyParticle(x, y, color))
+        frame_no[0] += 1
+        for particle in legacy[:]:
+            particle.update()
+            if particle.life <= 0: legacy.remove(particle)
+        surface.fill(game.BLACK)
+        for particle in legacy: particle.draw(surface)
+
+    system = game.ParticleSystem()
+    def system_frame():
+        for x, y, color, amount in bursts[frame_no[0] % frames]: system.emit(x, y, color, amount)
+        frame_no[0] += 1
+        system.update()
+        surface.fill(game.BLACK)
+        system.draw(surface)
+
+    random.seed(4)
+    report("lista obiektów Particle", *measure(legacy_frame, frames))
+    print(f"    (cząsteczek na końcu: {len(legacy)})")
+    frame_no[0] = 0
+    random.seed(4)
+    report(f"ParticleSystem (limit {system.max_particles})", *measure(system_frame, frames))
+    print(f"    (cząsteczek na końcu: {len(system)})")
+
+# --- TŁO: gwiazdy rysowane co klatkę vs. warstwy w pamięci ---
+class LegacyParallax:
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.layers = []
+        for i in range(3):
+            num_stars = int((width * height) / 3000)
+            self.layers.append([[random.randint(0, width), random.randint(0, height), random.randint(1, 3), (i+1)*0.5] for _ in range(num_stars)])
+
+    def update_and_draw(self, surface):
+        surface.fill(game.BLACK)
+        for i, layer in enumerate(self.layers):
+            color = (100 + i*50, 100 + i*50, 100 + i*50)
+            for star in layer:
+                star[1] += star[3]
+                if star[1] > self.height:
+                    star[1] = 0
+                    star[0] = random.randint(0, self.width)
+                pygame.draw.circle(surface, color, (int(star[0]), int(star[1])), star[2])
+
+def bench_parallax(frames=120):
+    print("Tło parallax (3 warstwy gwiazd), na klatkę:")
+    for width, height in ((800, 600), (1920, 1080), (2560, 1440)):
+        surface = pygame.Surface((width, height))
+        legacy = LegacyParallax(width, height)
+        cached = game.ParallaxBackground(width, height)
+        report(f"{width}x{height} rysowanie gwiazd", *measure(lambda: legacy.update_and_draw(surface), frames))
+        report(f"{width}x{height} warstwy w pamięci", *measure(lambda: cached.update_and_draw(surface), frames))
+
+# --- WROGOWIE: Enemy.update na obiekt vs. steer_enemies (NumPy) ---
+def legacy_enemy_update(enemy, players, bullets):
+    # Dawne Enemy.update (pętla po graczach + atan2/cos/sin na wroga), wzorzec do porównania
+    closest_player = None
+    min_dist = float('inf')
+    for p in players:
+        d = math.hypot(p.x - enemy.x, p.y - enemy.y)
+        if d < min_dist:
+            min_dist = d
+            closest_player = p
+    if closest_player:
+        angle = math.atan2(closest_player.y - enemy.y, closest_player.x - enemy.x)
+        if enemy.type == "shooter" and min_dist < 200:
+            enemy.shoot_timer -= 1
+            if enemy.shoot_timer <= 0:
+                bullets.spawn(enemy.x, enemy.y, angle, owner=game.OWNER_ENEMY)
+                enemy.shoot_timer = 80
+        else:
+            enemy.x += math.cos(angle) * enemy.speed
+            enemy.y += math.sin(angle) * enemy.speed
+
+class DummyPlayer:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+def enemy_scenario(seed, count, num_players):
+    game.sim_random.seed(seed)
+    rng = random.Random(seed)
+    settings = game.DIFFICULTY_SETTINGS["hard"]
+    enemies = game.EntityList()
+    for _ in range(count):
+        enemy = game.Enemy(game.ENEMY_TYPE_IDS[rng.choice(game.ENEMY_TYPES)], 2.0, settings)
+        enemy.x, enemy.y = rng.uniform(-50, game.WIDTH + 50), rng.uniform(-50, game.HEIGHT + 50)
+        enemy.shoot_timer = rng.randint(1, 80)
+        enemies.append(enemy)
+    players = [DummyPlayer(rng.uniform(0, game.WIDTH), rng.uniform(0, game.HEIGHT)) for _ in range(num_players)]
+    if enemies.items and players:
+        enemies.items[0].x, enemies.items[0].y = players[0].x, players[0].y
+    return enemies, players, rng
+
+def check_enemy_equivalence(ticks=300, tolerance=1e-9):
+    # Co tick ten sam stan liczony po staremu i wsadowo: pozycje, liczniki strzałów i wystrzelone pociski.
+    # Pozycje nie są identyczne bit w bit (wektor jednostkowy zamiast cos/sin(atan2)), stąd tolerancja
+    # i największa zaobserwowana różnica w wyniku
+    max_diff = 0.0
+    for seed in range(5):
+        for num_players in (0, 1, 2):
+            enemies, players, rng = enemy_scenario(seed, 200, num_players)
+            legacy_bullets, batched_bullets = game.BulletPool(), game.BulletPool()
+            for tick in range(ticks):
+                for p in players: p.x, p.y = p.x + rng.uniform(-5, 5), p.y + rng.uniform(-5, 5)
+                twins = [copy.copy(enemy) for enemy in enemies]
+                for enemy in twins: legacy_enemy_update(enemy, players, legacy_bullets)
+                game.steer_enemies(enemies, players, batched_bullets)
+                for a, b in zip(twins, enemies):
+                    max_diff = max(max_diff, abs(a.x - b.x), abs(a.y - b.y))
+                    if abs(a.x - b.x) > tolerance or abs(a.y - b.y) > tolerance or a.shoot_timer != b.shoot_timer:
+                        return max_diff, f"ziarno {seed}, graczy {num_players}, tick {tick}: wróg {a.type} ({a.x}, {a.y}) != ({b.x}, {b.y})"
+                n = len(legacy_bullets)
+                if n != len(batched_bullets):
+                    return max_diff, f"ziarno {seed}, graczy {num_players}, tick {tick}: {n} != {len(batched_bullets)} pocisków"
+                for column in ("x", "y", "vx", "vy"):
+                    if (getattr(legacy_bullets, column)[:n] != getattr(batched_bullets, column)[:n]).any():
+                        return max_diff, f"ziarno {seed}, graczy {num_players}, tick {tick}: różne pociski wrogów (kolumna {column})"
+                legacy_bullets.clear(); batched_bullets.clear()
+    return max_diff, None
+
+def bench_enemies(frames=200):
+    print("Wrogowie (najbliższy gracz + ruch + strzelcy, 2 graczy):")
+    max_diff, error = check_enemy_equivalence()
+    print(f"  {'zgodność ze starą logiką':<34} {'OK' if error is None else 'BŁĄD: ' + error} (największa różnica pozycji {max_diff:.1e} px)")
+    for count in (100, 500, 2000):
+        enemies, players, _ = enemy_scenario(7, count, 2)
+        twins = [copy.copy(enemy) for enemy in enemies]
+        bullets = game.BulletPool()
+        def legacy_frame():
+            for enemy in twins: legacy_enemy_update(enemy, players, bullets)
+            bullets.clear()
+        def batched_frame():
+            game.steer_enemies(enemies, players, bullets)
+            bullets.clear()
+        report(f"{count} x Enemy.update", *measure(legacy_frame, frames))
+        report(f"{count} x steer_enemies", *measure(batched_frame, frames))
+    if error is not None: sys.exit(1)
+
+# --- AUTOCELOWANIE: skan enemies + bosses vs. siatka kolizji ---
+def legacy_aim_target(x, y, enemies, bosses):
+    closest_target = None
+    min_dist = float('inf')
+    for group in (enemies, bosses):
+        for target in group:
+            dist = math.hypot(target.x - x, target.y - y)
+            if dist < min_dist:
+                min_dist = dist
+                closest_target = target
+    return closest_target
+
+class DummyTarget:
+    def __init__(self, rng, radius, hp):
+        self.x, self.y = rng.uniform(-50, game.WIDTH + 50), rng.uniform(-50, game.HEIGHT + 50)
+        self.radius, self.hp = radius, hp
+
+def bench_autoaim(queries=2000):
+    print("Autocelowanie gracza 2 (na jedno wyszukanie celu, siatki budowane i tak dla kolizji):")
+    for count in (20, 200, 2000):
+        rng = random.Random(count)
+        enemies = [DummyTarget(rng, rng.choice((10, 12, 15, 30)), rng.randint(1, 5)) for _ in range(count)]
+        bosses = [DummyTarget(rng, 60, rng.randint(50, 200)) for _ in range(rng.randint(0, 1))]
+        enemy_grid, boss_grid = game.SpatialGrid(), game.SpatialGrid()
+        enemy_grid.build(enemies); boss_grid.build(bosses)
+        points = [(rng.uniform(0, game.WIDTH), rng.uniform(0, game.HEIGHT)) for _ in range(queries)]
+        mismatches = sum(legacy_aim_target(x, y, enemies, bosses) is not game.find_aim_target(x, y, enemy_grid, boss_grid) for x, y in points)
+        print(f"  {count} wrogów: zgodność z pełnym skanem {'OK' if mismatches == 0 else f'BŁĄD ({mismatches} różnych celów)'}")
+        point = iter(points * 1000)
+        report(f"{count} x pełny skan", *measure(lambda: legacy_aim_target(*next(point), enemies, bosses), queries))
+        for priority in game.AIM_PRIORITIES:
+            report(f"{count} x siatka ({priority})", *measure(lambda: game.find_aim_target(*next(point), enemy_grid, boss_grid, priority), queries))
+        if mismatches: sys.exit(1)
+
+# --- SPRITE'Y: prymitywy pygame.draw vs. gotowe powierzchnie ---
+def legacy_entity_draw(entity, surface):
+    # Dawne metody draw (Enemy, Boss, PowerUp, HealthPack) rysowane prymitywami w każdej klatce
+    x, y = entity.x, entity.y
+    if isinstance(entity, game.Enemy):
+        if entity.type == "kamikaze":
+            pygame.draw.polygon(surface, entity.color, [(x, y - entity.radius), (x - entity.radius, y + entity.radius), (x + entity.radius, y + entity.radius)])
+        elif entity.type == "shooter":
+            pygame.draw.rect(surface, entity.color, (x - entity.radius, y - entity.radius, entity.radius*2, entity.radius*2))
+        else:
+            pygame.draw.circle(surface, entity.color, (int(x), int(y)), entity.radius)
+        if entity.type == "tank" and entity.hp < 5:
+            pygame.draw.rect(surface, game.RED, (x - 20, y - 40, 40, 5))
+            pygame.draw.rect(surface, game.GREEN, (x - 20, y - 40, 40 * (entity.hp/5), 5))
+    elif isinstance(entity, game.Boss):
+        pygame.draw.circle(surface, entity.color, (int(x), int(y)), entity.radius)
+        if entity.state == "dashing": pygame.draw.circle(surface, game.WHITE, (int(x), int(y)), entity.radius, 4)
+        entity.draw_health_bar(surface)
+    elif isinstance(entity, game.PowerUp):
+        fill, edge = {"shield": (game.LIGHT_BLUE, game.WHITE), "rapid_fire": (game.YELLOW, game.ORANGE),
+                      "shotgun": (game.RED, game.ORANGE), "pierce": (game.CYAN, game.WHITE)}[entity.type]
+        pygame.draw.circle(surface, fill, (x, y), entity.radius)
+        pygame.draw.circle(surface, edge, (x, y), entity.radius, 2)
+    else:
+        pygame.draw.rect(surface, game.WHITE, pygame.Rect(x - 12, y - 12, 24, 24))
+        pygame.draw.line(surface, game.RED, (x, y - 8), (x, y + 8), 4)
+        pygame.draw.line(surface, game.RED, (x - 8, y), (x + 8, y), 4)
+
+def sprite_scene(count, seed):
+    game.sim_random.seed(seed)
+    rng = random.Random(seed)
+    settings = game.DIFFICULTY_SETTINGS["normal"]
+    session = game.GameSession("normal", False, "balanced", "balanced", {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": 1}}, seed=seed)
+    session.players.clear()
+    for i in range(count):
+        enemy = game.Enemy(i % len(game.ENEMY_TYPES), 1.0, settings)
+        enemy.hp = rng.randint(1, 5)
+        session.enemies.append(enemy)
+    boss = game.Boss(1.0, settings, 3, False)
+    boss.hp = boss.max_hp // 2
+    session.bosses.append(boss)
+    for _ in range(4): session.power_ups.append(game.PowerUp())
+    for _ in range(3): session.health_packs.append(game.HealthPack())
+    for group in (session.enemies, session.bosses):
+        for entity in group:
+            entity.x, entity.y = rng.randint(40, game.WIDTH - 40), rng.randint(40, game.HEIGHT - 40)
+            entity.prev_x, entity.prev_y = entity.x, entity.y
+    return session
+
+def legacy_scene_draw(session, surface):
+    for group in (session.power_ups, session.health_packs, session.bosses, session.enemies):
+        for entity in group: legacy_entity_draw(entity, surface)
+
+def bench_sprites(frames=200):
+    print("Rysowanie wrogów, bossa i znajdziek (bez tła, cząsteczek i pocisków):")
+    # Zgodność pikseli: każda encja osobno w całkowitej pozycji, prymitywy vs. sprite + pasek zdrowia
+    old_surface, new_surface = pygame.Surface((game.WIDTH, game.HEIGHT)), pygame.Surface((game.WIDTH, game.HEIGHT))
+    session = sprite_scene(len(game.ENEMY_TYPES) * 4, 11)
+    mismatches = 0
+    for state in ("moving", "dashing"):
+        session.bosses.items[0].state = state
+        for group in (session.power_ups, session.health_packs, session.bosses, session.enemies):
+            for entity in group:
+                old_surface.fill(game.BLACK); new_surface.fill(game.BLACK)
+                legacy_entity_draw(entity, old_surface)
+                entity.draw(new_surface)
+                if pygame.image.tobytes(old_surface, "RGB") != pygame.image.tobytes(new_surface, "RGB"): mismatches += 1
+    print(f"  {'zgodność pikseli ze starym rysowaniem':<34} {'OK' if mismatches == 0 else f'BŁĄD ({mismatches} encji)'}")
+    for count in (20, 100, 500):
+        session = sprite_scene(count, count)
+        report(f"{count} wrogów, prymitywy", *measure(lambda: legacy_scene_draw(session, old_surface), frames))
+        report(f"{count} wrogów, sprite'y + blits", *measure(lambda: session.draw(new_surface, 0.5), frames))
+    if mismatches: sys.exit(1)
+
+# --- SKŁADANIE KLATKI: kopia game_surface vs. rysowanie prosto na ekran ---
+def bench_compose(frames=120):
+    print("Składanie klatki (tło + encje, bez HUD), na klatkę:")
+    for width, height in ((1920, 1080), (2560, 1440), (3840, 2160)):
+        game.WIDTH, game.HEIGHT = width, height
+        screen = pygame.display.set_mode((width, height))
+        game_surface = pygame.Surface((width, height))
+        parallax = game.ParallaxBackground(width, height)
+        session = sprite_scene(50, 5)
+        rng = random.Random(6)
+        cached_overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+        cached_overlay.fill((0, 0, 0, 180))
+
+        def legacy_frame(shaking, paused):
+            parallax.update_and_draw(game_surface)
+            session.draw(game_surface)
+            if paused:
+                overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+                overlay.fill((0, 0, 0, 180))
+                game_surface.blit(overlay, (0, 0))
+            screen.fill(game.BLACK)
+            screen.blit(game_surface, (rng.randint(-5, 5), rng.randint(-5, 5)) if shaking else (0, 0))
+
+        def direct_frame(shaking, paused):
+            parallax.update_and_draw(screen)
+            session.draw(screen)
+            if paused: screen.blit(cached_overlay, (0, 0))
+            if shaking:
+                dx, dy = rng.randint(-5, 5), rng.randint(-5, 5)
+                screen.scroll(dx, dy)
+                if dx > 0: screen.fill(game.BLACK, (0, 0, dx, height))
+                elif dx < 0: screen.fill(game.BLACK, (width + dx, 0, -dx, height))
+                if dy > 0: screen.fill(game.BLACK, (0, 0, width, dy))
+                elif dy < 0: screen.fill(game.BLACK, (0, height + dy, width, -dy))
+
+        for label, shaking, paused in (("gra", False, False), ("wstrząs", True, False), ("pauza", False, True)):
+            report(f"{width}x{height} {label}, game_surface", *measure(lambda: legacy_frame(shaking, paused), frames))
+            report(f"{width}x{height} {label}, prosto na ekran", *measure(lambda: direct_frame(shaking, paused), frames))
+
+    game.WIDTH, game.HEIGHT = 800, 600
+    pygame.display.set_mode((800, 600))
+
+# --- ZAPIS: synchroniczny JSON vs. Storage w tle ---
+def legacy_save_json(filename, data):
+    with open(filename, "w", encoding="utf-8") as file: json.dump(data, file)
+
+def bench_storage(frames=200):
+    # Sam zapis postępu (save_json) - ranking ma własny zapis w tle i osobny benchmark
+    print("Zapis monet i ulepszeń (save_data.json na koniec rozgrywki):")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            save_data = {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": 1}}
+            def legacy_frame():
+                save_data["coins"] += 1
+                legacy_save_json("save_data.json", save_data)
+            def storage_frame():
+                save_data["coins"] += 1
+                game.save_json("save_data.json", save_data)
+            def writer_frame():
+                storage_frame()
+                game.storage.flush()
+            report("synchronicznie (wątek gry)", *measure(legacy_frame, frames))
+            report("Storage, wątek gry", *measure(storage_frame, frames))
+            game.storage.flush()
+            # Koszt po stronie wątku w tle: .tmp + fsync + os.replace przy każdym zapisie
+            report("Storage, wątek w tle", *measure(writer_frame, frames))
+        finally:
+            game.storage.flush()
+            game.storage.cache.clear()
+            # Połączenie z bazą otwarte w katalogu tymczasowym nie może przeżyć benchmarku
+            game.leaderboard_db.close()
+            os.chdir(cwd)
+
+# --- RANKING: lista JSON vs. SQLite z indeksem ---
+def bench_leaderboard(frames=200):
+    print("Ranking (czas w wątku gry: zapis wyniku + top 10 jednej tablicy, przy N zapisanych rozgrywkach):")
+    rng = random.Random(9)
+    def random_run():
+        return (f"gracz{rng.randint(0, 999)}", rng.randint(0, 5000), rng.choice(list(game.DIFFICULTY_SETTINGS)),
+                rng.choice(game.GAME_MODES), rng.choice(game.SHIP_TYPES))
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in (1000, 10000, 100000):
+            runs = [random_run() for _ in range(count)]
+            json_path = os.path.join(workdir, f"runs{count}.json")
+            legacy_save_json(json_path, [{"name": n, "score": sc, "difficulty": d, "mode": m, "ship": sh} for n, sc, d, m, sh in runs])
+            def json_frame():
+                # Cała historia w jednym pliku: wczytaj, dopisz, posortuj, zapisz, przefiltruj
+                with open(json_path, "r", encoding="utf-8") as file: history = json.load(file)
+                name, score, difficulty, mode, ship = random_run()
+                history.append({"name": name, "score": score, "difficulty": difficulty, "mode": mode, "ship": ship})
+                history.sort(key=lambda x: x["score"], reverse=True)
+                legacy_save_json(json_path, history)
+                return [entry for entry in history if entry["difficulty"] == difficulty and entry["mode"] == mode and entry["ship"] == ship][:10]
+
+            board = game.Leaderboard(os.path.join(workdir, f"runs{count}.db"), os.path.join(workdir, "brak.json"))
+            with board.connect() as db:
+                db.executemany("INSERT INTO runs (name, score, difficulty, mode, ship) VALUES (?, ?, ?, ?, ?)", runs)
+                db.execute("INSERT INTO run_ships (run_id, ship, score, difficulty, mode) SELECT id, ship, score, difficulty, mode FROM runs")
+            def sqlite_frame():
+                name, score, difficulty, mode, ship = random_run()
+                board.add(name, score, difficulty, mode, ship)
+                return board.page(0, difficulty=difficulty, mode=mode, ship=ship)
+
+            report(f"{count} rozgrywek, JSON", *measure(json_frame, max(10, frames * 1000 // count)))
+            report(f"{count} rozgrywek, SQLite", *measure(sqlite_frame, frames))
+            board.flush()
+            # Niepełne filtry ekranu rankingu (sam odczyt strony i licznika stron)
+            for label, filters in (("wszystkie", {}), ("sam tryb", {"mode": "coop"}), ("sam statek", {"ship": "heavy"})):
+                report(f"{count} rozgrywek, SQLite {label}", *measure(lambda: (board.page(0, **filters), board.count(**filters)), frames))
+            board.close()
+
+# --- START GRY: od uruchomienia procesu do pierwszej klatki ---
+def startup_run(workdir):
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    start = time.time()
+    result = subprocess.run([sys.executable, GAME_SCRIPT, "--startup-probe"], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    fields = next(line for line in result.stdout.splitlines() if line.startswith("first_frame")).split()
+    return (float(fields[1]) - start) * 1000, fields[3] == "True"
+
+def bench_startup(runs=5):
+    print("Start gry (proces -> pierwsza klatka):")
+    with tempfile.TemporaryDirectory() as workdir:
+        cold_ms, ready = startup_run(workdir)
+        print(f"  {'pusty cache dźwięków':<34} {cold_ms:7.1f} ms   (dźwięki gotowe: {'tak' if ready else 'nie'})")
+        warm = sorted(startup_run(workdir)[0] for _ in range(runs))
+        print(f"  {'cache dźwięków na dysku':<34} {warm[len(warm) // 2]:7.1f} ms   (mediana z {runs})")
+    start = time.perf_counter()
+    for lazy in game.sound_bank.sounds: game.render_melody(*lazy.recipe)
+    print(f"  {'synteza wszystkich dźwięków':<34} {(time.perf_counter() - start) * 1000:7.1f} ms   (dawniej przed menu, teraz w tle)")
+
+# --- SYMULACJA: cała rozgrywka sterowana botem (tryb headless) ---
+def bench_simulation(minutes=1.0):
+    print(f"Symulacja rozgrywki ({minutes:g} min na poziom trudności, bot, ziarno 0):")
+    game.run_headless(minutes=minutes)
+    game.sound_enabled = True
+
+# --- POWTÓRKI: rozmiar zapisu i szybkość odtwarzania bez rysowania ---
+def bench_replay(minutes=2.0, coop=True):
+    print(f"Powtórka ({minutes:g} min gry, bot, {'2 graczy' if coop else '1 gracz'}):")
+    game.sound_enabled = False
+    session = game.GameSession("normal", coop, "balanced", "balanced", {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": 1}}, seed=0)
+    session.recorder = game.ReplayRecorder(session)
+    policy = game.BotPolicy(0)
+    start = time.perf_counter()
+    while session.tick < minutes * 60 * game.SIM_HZ and session.outcome != "GAME_OVER":
+        if session.outcome == "VICTORY": session.endless_mode = True; session.outcome = None
+        session.step(policy(session))
+    live_s = time.perf_counter() - start
+    data = session.recorder.finish(session)
+    # Dla porównania: pełny stan wejść zapisany w każdym ticku (5 bajtów przycisków + 2x int16 celownika na gracza)
+    raw = session.tick * len(session.recorder.p_ids) * (5 + 4)
+    print(f"  {session.tick} ticków, plik {len(data)} B (surowe wejścia co tick: {raw} B, {raw / len(data):.0f}x mniej)")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "bench.ksr")
+        with open(path, "wb") as file: file.write(data)
+        start = time.perf_counter()
+        ok = game.run_replay(path)
+        replay_s = time.perf_counter() - start
+    print(f"  gra z botem {session.tick / live_s:.0f} ticków/s, odtwarzanie {session.tick / replay_s:.0f} ticków/s "
+          f"({session.tick / game.SIM_HZ / replay_s:.0f}x szybciej niż w czasie rzeczywistym), zgodność: {'tak' if ok else 'NIE'}")
+    game.sound_enabled = True
+
+# --- PROFILER: koszt znaczników czasu, gdy profiler jest wyłączony i włączony ---
+def bench_profiler(ticks=3000, calls=200000):
+    print(f"Profiler klatki ({ticks} ticków gry z botem, ziarno 0):")
+    game.sound_enabled = False
+    profiler = game.profiler
+    def run(enabled):
+        if profiler.enabled != enabled: profiler.toggle()
+        session = game.GameSession("normal", True, "balanced", "balanced", {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": 3}}, seed=0)
+        policy = game.BotPolicy(0)
+        times = []
+        for _ in range(ticks):
+            if session.outcome is not None: break
+            inputs = policy(session)
+            start = time.perf_counter()
+            session.step(inputs)
+            times.append((time.perf_counter() - start) * 1000)
+            profiler.end_frame(session)
+        times.sort()
+        return sum(times) / len(times), times[int(len(times) * 0.99) - 1]
+    for enabled in (False, True, False, True):
+        mean, p99 = run(enabled)
+        report(f"tick, profiler {'włączony' if enabled else 'wyłączony'}", mean, p99)
+    for enabled in (False, True):
+        if profiler.enabled != enabled: profiler.toggle()
+        start = time.perf_counter()
+        for _ in range(calls): profiler.lap("players")
+        print(f"  {'lap() ' + ('włączony' if enabled else 'wyłączony'):<34} {(time.perf_counter() - start) / calls * 1e9:7.0f} ns / wywołanie")
+    if profiler.enabled: profiler.toggle()
+    game.sound_enabled = True
+
+# --- CULLING I LOD: scena z wrogami i pociskami za krawędzią ekranu ---
+def bench_culling(frames=120, enemies=400, bullets=1500):
+    game.sound_enabled = False
+    rng = random.Random(0)
+    settings = game.DIFFICULTY_SETTINGS["hard"]
+    session = game.GameSession("hard", True, "balanced", "balanced", {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": 8}}, seed=0)
+    # Świeżo zespawnowani wrogowie czekają za krawędzią; co drugiego przenosimy na ekran
+    for i in range(enemies):
+        enemy = game.Enemy(i % len(game.ENEMY_TYPES), 1.0, settings)
+        session.enemies.append(enemy)
+        if i % 2: enemy.x, enemy.y = enemy.prev_x, enemy.prev_y = rng.uniform(0, game.WIDTH), rng.uniform(0, game.HEIGHT)
+    for _ in range(bullets):
+        session.bullets.spawn(rng.uniform(-50, game.WIDTH + 50), rng.uniform(-50, game.HEIGHT + 50), rng.uniform(0, 2 * math.pi), game.OWNER_PLAYER, rng.randrange(3))
+    for _ in range(16): session.particles.emit(rng.uniform(0, game.WIDTH), rng.uniform(0, game.HEIGHT), game.ORANGE, 50)
+    for _ in range(game.TRAIL_LENGTH):
+        session.bullets.update()
+        session.particles.update()
+    surface = pygame.Surface((game.WIDTH, game.HEIGHT)).convert()
+    everything = pygame.Rect(-10**6, -10**6, 2 * 10**6, 2 * 10**6)
+    def render(level, view):
+        surface.fill(game.BLACK)
+        session.draw(surface, 1.0, level["trails"], level, view)
+        return pygame.image.tostring(surface, "RGB")
+    same = render(game.QUALITY_LEVELS[0], everything) == render(game.QUALITY_LEVELS[0], None)
+    print(f"Culling i LOD ({len(session.enemies)} wrogów, {len(session.bullets)} pocisków, {len(session.particles)} cząsteczek; zgodność pikseli: {'OK' if same else 'RÓŻNICE'}):")
+    report("bez cullingu", *measure(lambda: render(game.QUALITY_LEVELS[0], everything), frames))
+    # Poziom WYSOKA z samymi punktami LOD (bez pozostałych cięć jakości) pokazuje ich własny zysk
+    for level in game.QUALITY_LEVELS[:1] + [dict(game.QUALITY_LEVELS[0], name="WYSOKA + punkty", points=2)] + game.QUALITY_LEVELS[1:]:
+        mean, p99 = measure(lambda: render(level, None), frames)
+        drawn, culled, points = session.draw_counts
+        report(f"culling, {level['name']}", mean, p99)
+        print(f"  {'':<34} sprite'y {drawn}, poza ekranem {culled}, punkty LOD {points}")
+    game.sound_enabled = True
+    if not same: sys.exit(1)
+
+# --- DEFINICJE ENCJI: łańcuch if/elif po nazwie typu vs rekord z rejestru ---
+def legacy_enemy(enemy_type, diff_multiplier, diff_settings):
+    # Dawne Enemy.__init__ (porównania nazw przy każdym spawnie), wzorzec do porównania
+    enemy = game.Enemy.__new__(game.Enemy)
+    enemy.dead = False
+    side = game.sim_random.choice(['top', 'bottom', 'left', 'right'])
+    if side == 'top': enemy.x, enemy.y = game.sim_random.randint(0, game.WIDTH), -50
+    elif side == 'bottom': enemy.x, enemy.y = game.sim_random.randint(0, game.WIDTH), game.HEIGHT + 50
+    elif side == 'left': enemy.x, enemy.y = -50, game.sim_random.randint(0, game.HEIGHT)
+    else: enemy.x, enemy.y = game.WIDTH + 50, game.sim_random.randint(0, game.HEIGHT)
+    enemy.prev_x, enemy.prev_y = enemy.x, enemy.y
+    enemy.type = enemy_type
+    enemy.shoot_timer = 60
+    if enemy.type == "normal":
+        enemy.radius, base_speed, enemy.color, enemy.hp, base_damage = 15, game.sim_random.uniform(1.5, 3.0), game.RED, 1, 25
+    elif enemy.type == "tank":
+        enemy.radius, base_speed, enemy.color, enemy.hp, base_damage = 30, game.sim_random.uniform(0.5, 1.0), game.ORANGE, 5, 50
+    elif enemy.type == "fast":
+        enemy.radius, base_speed, enemy.color, enemy.hp, base_damage = 10, game.sim_random.uniform(3.5, 5.0), game.CYAN, 1, 15
+    elif enemy.type == "shooter":
+        enemy.radius, base_speed, enemy.color, enemy.hp, base_damage = 15, game.sim_random.uniform(1.0, 2.0), game.GREEN, 2, 20
+    elif enemy.type == "kamikaze":
+        enemy.radius, base_speed, enemy.color, enemy.hp, base_damage = 12, game.sim_random.uniform(4.0, 6.0), game.PURPLE, 1, 40
+    enemy.speed = base_speed * diff_multiplier * diff_settings["speed"]
+    enemy.damage = int(base_damage * diff_settings["damage"])
+    return enemy
+
+def bench_entities(repeats=200, spawns=1000):
+    settings = game.DIFFICULTY_SETTINGS["hard"]
+    legacy_names = ["normal", "tank", "fast", "shooter", "kamikaze"]
+    rng = random.Random(0)
+    types = [rng.randrange(len(legacy_names)) for _ in range(spawns)]
+    mismatches = 0
+    for type_id in range(len(legacy_names)):
+        game.sim_random.seed(type_id)
+        twin = legacy_enemy(legacy_names[type_id], 2.0, settings)
+        game.sim_random.seed(type_id)
+        enemy = game.Enemy(game.ENEMY_TYPE_IDS[legacy_names[type_id]], 2.0, settings)
+        fields = ("type", "x", "y", "radius", "color", "hp", "speed", "damage", "shoot_timer")
+        mismatches += any(getattr(enemy, f) != getattr(twin, f) for f in fields)
+    print(f"Spawn wrogów ({spawns} nowych, najlepszy z {repeats} pomiarów na przemian):")
+    print(f"  {'zgodność ze starymi statystykami':<34} {'OK' if not mismatches else f'{mismatches} RÓŻNIC'}")
+    # Różnica jest mała wobec szumu, więc minimum z wielu przebiegów, mierzonych na przemian
+    # (obie wersje trafiają na te same zakłócenia tła)
+    variants = [("if/elif po nazwie", lambda: [legacy_enemy(legacy_names[t], 2.0, settings) for t in types]),
+                ("rejestr (ID -> rekord)", lambda: [game.Enemy(t, 2.0, settings) for t in types])]
+    best = [float("inf")] * len(variants)
+    for _ in range(repeats):
+        for i, (_, fn) in enumerate(variants):
+            start = time.perf_counter()
+            fn()
+            best[i] = min(best[i], (time.perf_counter() - start) * 1000)
+    for (label, _), ms in zip(variants, best):
+        print(f"  {label:<34} najlepszy {ms:7.3f} ms")
+    if mismatches: sys.exit(1)
+
+# --- JAKOŚĆ GRAFIKI: koszt rysowania ciężkiej sceny na każdym poziomie regulatora ---
+def bench_quality(frames=120, warmup=2400):
+    game.sound_enabled = False
+    session = game.GameSession("hard", True, "balanced", "balanced", {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": 8}}, seed=0)
+    policy = game.BotPolicy(0)
+    for _ in range(warmup):
+        if session.outcome == "VICTORY": session.endless_mode = True; session.outcome = None
+        if session.outcome == "GAME_OVER": break
+        session.step(policy(session))
+    # Wybuch bossa i salwy, jak w najcięższych momentach walki
+    for _ in range(16): session.particles.emit(game.WIDTH / 2, game.HEIGHT / 2, game.ORANGE, 50)
+    for _ in range(10): session.bullets.spawn_ring(game.WIDTH / 2, game.HEIGHT / 2, 12)
+    print(f"Jakość grafiki (tło + scena: {len(session.enemies)} wrogów, {len(session.bullets)} pocisków, {len(session.particles)} cząsteczek):")
+    for width, height in ((800, 600), (1920, 1080)):
+        surface = pygame.Surface((width, height))
+        background = game.ParallaxBackground(width, height)
+        for level in game.QUALITY_LEVELS:
+            def frame():
+                background.update_and_draw(surface, layers=level["stars"])
+                session.draw(surface, 1.0, level["trails"], level)
+            report(f"{width}x{height} {level['name']}", *measure(frame, frames))
+    game.sound_enabled = True
+
+BENCHMARKS = {
+    "bullets": bench_bullets,
+    "despawn": bench_despawn,
+    "particles": bench_particles,
+    "parallax": bench_parallax,
+    "enemies": bench_enemies,
+    "autoaim": bench_autoaim,
+    "sprites": bench_sprites,
+    "compose": bench_compose,
+    "storage": bench_storage,
+    "leaderboard": bench_leaderboard,
+    "startup": bench_startup,
+    "simulation": bench_simulation,
+    "replay": bench_replay,
+    "profiler": bench_profiler,
+    "trails": bench_trails,
+    "quality": bench_quality,
+    "entities": bench_entities,
+    "culling": bench_culling,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Nieznany benchmark: {name} (dostępne: {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+        BENCHMARKS[name]()
@@ -3,10 +3,24 @@ import math
 import random
 import sys
 import os
-import array 
 import json 
+import hashlib
+import threading
+import time
+import argparse
+import atexit
+import gc
+import sqlite3
+import struct
+import zlib
+from collections import OrderedDict, deque, namedtuple
+import numpy as np
 
 # --- INICJALIZACJA ---
+if "--headless" in sys.argv or ("--replay" in sys.argv and "--realtime" not in sys.argv):
+    # Tryb bez okna i dźwięku - sterowniki muszą być ustawione przed pygame.init()
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
 pygame.init()
 pygame.mixer.init(frequency=44100, size=-16, channels=1, buffer=512) 
 WIDTH, HEIGHT = 800, 600
@@ -27,6 +41,59 @@ ORANGE = (255, 140, 0)
 CYAN = (0, 255, 255)
 PURPLE = (150, 0, 255)     
 LIGHT_BLUE = (100, 200, 255)
+COLOR_NAMES = {"WHITE": WHITE, "BLACK": BLACK, "BLUE": BLUE, "PINK": PINK, "RED": RED, "GREEN": GREEN, "DARK_GREEN": DARK_GREEN,
+               "YELLOW": YELLOW, "ORANGE": ORANGE, "CYAN": CYAN, "PURPLE": PURPLE, "LIGHT_BLUE": LIGHT_BLUE}
+
+# --- DEFINICJE ENCJI (entities.json) ---
+# Statystyki wrogów, statków, pocisków i znajdziek są w pliku danych wczytywanym raz przy
+# starcie do list rekordów indeksowanych całkowitym ID typu. Obiekty trzymają ID (i rekord)
+# zamiast porównywać nazwy przy każdym spawnie i rysowaniu. Nowy typ wroga to nowy wpis
+# w pliku: kształt, kolor, statystyki i waga spawnu, bez zmian w kodzie.
+ENTITIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "entities.json")
+ENEMY_SHAPES = ["circle", "square", "triangle"]
+SHAPE_CIRCLE, SHAPE_SQUARE, SHAPE_TRIANGLE = range(3)
+POWERUP_EFFECTS = ["shield", "rapid_fire", "weapon"]
+EFFECT_SHIELD, EFFECT_RAPID_FIRE, EFFECT_WEAPON = range(3)
+# Typy, do których kod odwołuje się wprost (zachowanie, menu wyboru statku)
+REQUIRED_ENTITIES = {"ships": ("light", "balanced", "heavy"), "bullets": ("normal", "shotgun", "pierce", "enemy")}
+
+EnemyStats = namedtuple("EnemyStats", "name radius speed_min speed_max hp damage color shape spawn_weight shoots death_ring health_bar")
+ShipStats = namedtuple("ShipStats", "name speed max_health dash_cooldown damage_taken")
+BulletStats = namedtuple("BulletStats", "name speed radius color barrel_color barrels spread extra_delay")
+PowerUpStats = namedtuple("PowerUpStats", "name color outline effect weapon duration")
+
+def parse_color(value):
+    # Nazwa koloru z sekcji KOLORY albo lista [r, g, b]
+    return COLOR_NAMES[value] if isinstance(value, str) else tuple(value)
+
+def load_entities(path=ENTITIES_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as file: data = json.load(file)
+        registry = {
+            "enemies": [EnemyStats(e["name"], e["radius"], e["speed"][0], e["speed"][1], e["hp"], e["damage"], parse_color(e["color"]),
+                                   ENEMY_SHAPES.index(e.get("shape", "circle")), e.get("spawn_weight", 0), e.get("shoots", False),
+                                   e.get("death_ring", 0), e.get("health_bar", False)) for e in data["enemies"]],
+            "ships": [ShipStats(s["name"], s["speed"], s["max_health"], s["dash_cooldown"], s.get("damage_taken", 1.0)) for s in data["ships"]],
+            "bullets": [BulletStats(b["name"], b["speed"], b["radius"], parse_color(b["color"]), parse_color(b.get("barrel_color", "WHITE")),
+                                    b.get("barrels", 0), b.get("spread", 0.0), b.get("extra_delay", 0)) for b in data["bullets"]],
+        }
+        bullet_ids = {b.name: i for i, b in enumerate(registry["bullets"])}
+        registry["powerups"] = [PowerUpStats(p["name"], parse_color(p["color"]), parse_color(p["outline"]), POWERUP_EFFECTS.index(p["effect"]),
+                                             bullet_ids[p["weapon"]] if "weapon" in p else -1, p.get("duration", 0)) for p in data["powerups"]]
+    except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+        raise SystemExit(f"Błędny plik definicji encji {path}: {error!r}")
+    for section, names in REQUIRED_ENTITIES.items():
+        missing = set(names) - {entry.name for entry in registry[section]}
+        if missing: raise SystemExit(f"W pliku {path} brakuje typów {section}: {', '.join(sorted(missing))}")
+    return registry
+
+ENTITIES = load_entities()
+ENEMY_STATS, SHIP_STATS = ENTITIES["enemies"], ENTITIES["ships"]
+BULLET_STATS, POWERUP_STATS = ENTITIES["bullets"], ENTITIES["powerups"]
+ENEMY_TYPES = [e.name for e in ENEMY_STATS]
+ENEMY_TYPE_IDS = {name: i for i, name in enumerate(ENEMY_TYPES)}
+SHIP_TYPE_IDS = {s.name: i for i, s in enumerate(SHIP_STATS)}
+BULLET_TYPE_IDS = {b.name: i for i, b in enumerate(BULLET_STATS)}
 
 # --- USTAWIENIA GLOBALNE ---
 DIFFICULTY_SETTINGS = {
@@ -34,38 +101,443 @@ DIFFICULTY_SETTINGS = {
     "normal": {"speed": 1.0, "damage": 1.0, "spawn_rate": 1.0, "name": "Normalny"},
     "hard": {"speed": 1.4, "damage": 1.5, "spawn_rate": 0.6, "name": "Trudny"}
 }
+# Parametry balansu rozgrywki (strojone symulatorem balance.py); wagi spawnu domyślnie z entities.json
+ENEMY_SPAWN_WEIGHTS = {e.name: e.spawn_weight for e in ENEMY_STATS}
+BOSS_BASE_HP, BOSS_HP_PER_LEVEL, BOSS_COOP_HP = 50, 10, 1.5
+LEVEL_CURVE_STEP = 5
 
 sound_enabled = True
 is_fullscreen = False
+sim_random = random.Random()
+
+# --- ZAPIS NA DYSK (W TLE) ---
+# Pliki JSON czytamy z dysku tylko raz - potem obowiązuje kopia w pamięci. save() serializuje
+# dane od razu (wątek nie dotyka obiektów gry), a zapis robi wątek w tle po SAVE_DELAY sekundach,
+# więc kilka zapisów pod rząd daje jeden zapis pliku. Plik powstaje jako .tmp i podmienia stary
+# przez os.replace, więc przerwany zapis nie psuje poprzedniej wersji.
+SAVE_DELAY = 0.5
+
+class Storage:
+    def __init__(self, delay=SAVE_DELAY):
+        self.delay = delay
+        self.cache = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def load(self, filename, default):
+        with self.lock:
+            if filename in self.cache: return self.cache[filename]
+        data = default
+        if os.path.exists(filename):
+            try:
+                with open(filename, "r", encoding="utf-8") as file: data = json.load(file)
+            except (OSError, ValueError) as error:
+                print(f"Nie można wczytać {filename}: {error}", file=sys.stderr)
+        with self.lock: return self.cache.setdefault(filename, data)
+
+    def save(self, filename, data):
+        payload = json.dumps(data).encode("utf-8")
+        with self.lock: self.cache[filename] = data
+        self.write_bytes(filename, payload)
+
+    def write_bytes(self, filename, payload):
+        # Surowe dane (np. powtórki) - bez kopii w pamięci, ten sam zapis w tle
+        with self.lock:
+            self.pending[filename] = payload
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="storage", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.delay)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock: pending, self.pending = self.pending, {}
+            for filename, payload in pending.items():
+                tmp_name = filename + ".tmp"
+                try:
+                    if os.path.dirname(filename): os.makedirs(os.path.dirname(filename), exist_ok=True)
+                    with open(tmp_name, "wb") as file:
+                        file.write(payload)
+                        file.flush()
+                        os.fsync(file.fileno())
+                    os.replace(tmp_name, filename)
+                except OSError as error:
+                    print(f"Nie można zapisać {filename}: {error}", file=sys.stderr)
+                    # Spróbujemy ponownie przy następnym zapisie, o ile nie przyszła nowsza wersja
+                    with self.lock: self.pending.setdefault(filename, payload)
+
+storage = Storage()
+atexit.register(storage.flush)
 
 # --- FUNKCJE POMOCNICZE (W tym brakujące funkcje rankingu!) ---
 def load_json(filename, default):
-    if os.path.exists(filename):
-        try:
-            with open(filename, "r", encoding="utf-8") as file: return json.load(file)
-        except: return default
-    return default
+    return storage.load(filename, default)
 
 def save_json(filename, data):
-    try:
-        with open(filename, "w", encoding="utf-8") as file: json.dump(data, file)
-    except: pass
-
-def load_leaderboard():
-    return load_json("leaderboard.json", [])
-
-def save_score(name, score):
-    leaderboard = load_leaderboard()
-    leaderboard.append({"name": name, "score": score})
-    leaderboard.sort(key=lambda x: x["score"], reverse=True)
-    leaderboard = leaderboard[:10]
-    save_json("leaderboard.json", leaderboard)
+    storage.save(filename, data)
+
+# --- RANKING (SQLITE) ---
+# Każda rozgrywka to wiersz w tabeli runs z poziomem trudności, trybem i statkami. Statki trafiają
+# też do run_ships (wiersz na statek), więc tablica statku obejmuje też statek gracza 2 w co-opie.
+# Każdy zestaw filtrów z ekranu rankingu ma własny indeks kończący się na (score DESC), więc top 10
+# to odczyt pierwszych wierszy indeksu, bez sortowania tabeli. Wstawia wątek w tle na własnym
+# połączeniu (jak Storage); do tego czasu wynik jest widoczny z kopii w pamięci.
+# Stary leaderboard.json jest importowany raz.
+LEADERBOARD_DB = "leaderboard.db"
+LEADERBOARD_LEGACY_JSON = "leaderboard.json"
+LEADERBOARD_PAGE_SIZE = 10
+LEADERBOARD_VERSION = 2
+LEADERBOARD_INDEXES = [
+    "runs_top ON runs (score DESC, id)",
+    "runs_difficulty ON runs (difficulty, score DESC, id)",
+    "runs_mode ON runs (mode, score DESC, id)",
+    "runs_difficulty_mode ON runs (difficulty, mode, score DESC, id)",
+    "ships_ship ON run_ships (ship, score DESC, run_id)",
+    "ships_difficulty ON run_ships (difficulty, ship, score DESC, run_id)",
+    "ships_mode ON run_ships (mode, ship, score DESC, run_id)",
+    "ships_difficulty_mode ON run_ships (difficulty, mode, ship, score DESC, run_id)",
+]
+GAME_MODES = ["single", "coop"]
+SHIP_TYPES = [s.name for s in SHIP_STATS]
+
+class Leaderboard:
+    def __init__(self, path=LEADERBOARD_DB, legacy_json=LEADERBOARD_LEGACY_JSON):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.db = None
+        self.writer_db = None
+        self.pending = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def open(self, check_same_thread=True):
+        db = sqlite3.connect(self.path, check_same_thread=check_same_thread)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def connect(self):
+        if self.db is None:
+            self.db = self.open()
+            self.db.execute("""CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY, name TEXT NOT NULL, score INTEGER NOT NULL,
+                difficulty TEXT, mode TEXT, ship TEXT, ship2 TEXT, created REAL)""")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS run_ships (
+                run_id INTEGER NOT NULL, ship TEXT NOT NULL, score INTEGER NOT NULL,
+                difficulty TEXT, mode TEXT, PRIMARY KEY (run_id, ship))""")
+            self.migrate()
+            for index in LEADERBOARD_INDEXES: self.db.execute(f"CREATE INDEX IF NOT EXISTS {index}")
+        return self.db
+
+    def migrate(self):
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= LEADERBOARD_VERSION: return
+        with self.db:
+            if version < 1 and os.path.exists(self.legacy_json):
+                # Wyniki z JSON nie mają trybu ani statku - trafiają tylko do tablicy "wszystkie"
+                entries = load_json(self.legacy_json, [])
+                self.db.executemany("INSERT INTO runs (name, score, created) VALUES (?, ?, ?)",
+                                    [(entry["name"], entry["score"], time.time()) for entry in entries])
+            if version < 2:
+                # Wersja 1 miała jeden indeks na pełną trójkę filtrów i nie znała statku gracza 2
+                self.db.execute("DROP INDEX IF EXISTS runs_board")
+                for column in ("ship", "ship2"):
+                    self.db.execute(f"""INSERT OR IGNORE INTO run_ships (run_id, ship, score, difficulty, mode)
+                                        SELECT id, {column}, score, difficulty, mode FROM runs WHERE {column} IS NOT NULL""")
+        self.db.execute(f"PRAGMA user_version = {LEADERBOARD_VERSION}")
+
+    def add(self, name, score, difficulty=None, mode=None, ship=None, ship2=None):
+        self.connect()
+        with self.lock:
+            self.pending.append((name, score, difficulty, mode, ship, ship2, time.time()))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="leaderboard", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock: rows = list(self.pending)
+            if not rows: return
+            try:
+                if self.writer_db is None: self.writer_db = self.open(check_same_thread=False)
+                db = self.writer_db
+                for name, score, difficulty, mode, ship, ship2, created in rows:
+                    run_id = db.execute("INSERT INTO runs (name, score, difficulty, mode, ship, ship2, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                        (name, score, difficulty, mode, ship, ship2, created)).lastrowid
+                    db.executemany("INSERT OR IGNORE INTO run_ships (run_id, ship, score, difficulty, mode) VALUES (?, ?, ?, ?, ?)",
+                                   [(run_id, s, score, difficulty, mode) for s in (ship, ship2) if s is not None])
+                # Commit i zdjęcie z kopii w pamięci pod blokadą odczytu - wynik nie pojawi się dwa razy
+                with self.lock:
+                    db.commit()
+                    del self.pending[:len(rows)]
+            except sqlite3.Error as error:
+                print(f"Nie można zapisać wyniku w {self.path}: {error}", file=sys.stderr)
+                # Wyniki zostają w pamięci - spróbujemy ponownie przy następnym zapisie
+                if self.writer_db is not None: self.writer_db.rollback()
+
+    def close(self):
+        self.flush()
+        for db in (self.db, self.writer_db):
+            if db is not None: db.close()
+        self.db = self.writer_db = None
+
+    def where(self, difficulty=None, mode=None, ship=None):
+        # Filtr statku idzie przez run_ships (statek gracza 1 albo 2), pozostałe prosto po runs
+        table, order = ("run_ships s", "s.score DESC, s.run_id") if ship is not None else ("runs r", "r.score DESC, r.id")
+        filters = [(column, value) for column, value in (("difficulty", difficulty), ("mode", mode), ("ship", ship)) if value is not None]
+        clause = " WHERE " + " AND ".join(f"{table[-1]}.{column} = ?" for column, _ in filters) if filters else ""
+        return table, order, clause, [value for _, value in filters]
+
+    def waiting(self, difficulty=None, mode=None, ship=None):
+        return [row for row in self.pending if (difficulty is None or row[2] == difficulty) and (mode is None or row[3] == mode)
+                and (ship is None or ship in (row[4], row[5]))]
+
+    def page(self, page=0, page_size=LEADERBOARD_PAGE_SIZE, **filters):
+        table, order, clause, params = self.where(**filters)
+        source = table + " JOIN runs r ON r.id = s.run_id" if table != "runs r" else table
+        db = self.connect()
+        with self.lock:
+            waiting = self.waiting(**filters)
+            # Wyniki czekające na zapis doklejamy do początku tablicy z bazy i sortujemy razem
+            limit, offset = ((page + 1) * page_size, 0) if waiting else (page_size, page * page_size)
+            rows = db.execute(f"SELECT r.id, r.name, r.score, r.difficulty, r.mode, r.ship, r.ship2 FROM {source}{clause} ORDER BY {order} LIMIT ? OFFSET ?",
+                              params + [limit, offset]).fetchall()
+        if waiting:
+            # Czekające są nowsze od wszystkich w bazie, więc przy remisie idą za nimi (sort jest stabilny)
+            rows.extend((math.inf, *row[:6]) for row in waiting)
+            rows = sorted(rows, key=lambda row: (-row[2], row[0]))[page * page_size:(page + 1) * page_size]
+        return [{"name": name, "score": score, "difficulty": difficulty, "mode": mode, "ship": ship, "ship2": ship2}
+                for _, name, score, difficulty, mode, ship, ship2 in rows]
+
+    def count(self, **filters):
+        table, _, clause, params = self.where(**filters)
+        db = self.connect()
+        with self.lock:
+            return db.execute(f"SELECT COUNT(*) FROM {table}{clause}", params).fetchone()[0] + len(self.waiting(**filters))
+
+    def best(self, **filters):
+        top = self.page(0, 1, **filters)
+        return top[0]["score"] if top else 0
+
+leaderboard_db = Leaderboard()
+atexit.register(leaderboard_db.flush)
+LEADERBOARD_FILTERS = {"difficulty": [None] + list(DIFFICULTY_SETTINGS), "mode": [None] + GAME_MODES, "ship": [None] + SHIP_TYPES}
+MODE_NAMES = {"single": "SINGLE", "coop": "CO-OP"}
+
+def load_leaderboard(page=0, **filters):
+    return leaderboard_db.page(page, **filters)
+
+def save_score(name, score, difficulty=None, mode=None, ship=None, ship2=None):
+    leaderboard_db.add(name, score, difficulty, mode, ship, ship2)
 
 def check_collision(x1, y1, r1, x2, y2, r2):
     return math.hypot(x1 - x2, y1 - y2) < (r1 + r2)
 
+# --- SIATKA KOLIZJI (BROADPHASE) ---
+# Jednorodna siatka budowana od nowa co klatkę. Obiekt trafia do wszystkich komórek,
+# które pokrywa jego prostokąt otaczający, więc zapytanie zwraca tylko kandydatów
+# z sąsiednich komórek zamiast całej listy. Kandydaci wracają w kolejności wstawiania,
+# dzięki czemu "pierwsze trafienie" działa tak samo jak przy pętli po liście.
+class SpatialGrid:
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.count = 0
+        self.bounds = None
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
+        self.bounds = None
+
+    def insert(self, obj, x, y, radius):
+        cs = self.cell_size
+        entry = (self.count, obj)
+        self.count += 1
+        x0, x1 = int((x - radius) // cs), int((x + radius) // cs)
+        y0, y1 = int((y - radius) // cs), int((y + radius) // cs)
+        # Zakres zajętych komórek - granica przeszukiwania w nearest()
+        b = self.bounds
+        if b is None: self.bounds = [x0, x1, y0, y1]
+        else:
+            if x0 < b[0]: b[0] = x0
+            if x1 > b[1]: b[1] = x1
+            if y0 < b[2]: b[2] = y0
+            if y1 > b[3]: b[3] = y1
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is None: self.cells[(cx, cy)] = [entry]
+                else: cell.append(entry)
+
+    def build(self, objects):
+        self.clear()
+        for obj in objects: self.insert(obj, obj.x, obj.y, obj.radius)
+
+    def query(self, x, y, radius):
+        cs = self.cell_size
+        x0, x1 = int((x - radius) // cs), int((x + radius) // cs)
+        y0, y1 = int((y - radius) // cs), int((y + radius) // cs)
+        if x0 == x1 and y0 == y1:
+            cell = self.cells.get((x0, y0))
+            return [obj for _, obj in cell] if cell else []
+        found = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell:
+                    for order, obj in cell: found[order] = obj
+        return [found[order] for order in sorted(found)]
+
+    def rings(self, x, y):
+        # Kolejne pierścienie komórek wokół punktu, przycięte do zajętego obszaru siatki
+        cs = self.cell_size
+        bx0, bx1, by0, by1 = self.bounds
+        qx, qy = int(x // cs), int(y // cs)
+        for ring in range(max(qx - bx0, bx1 - qx, qy - by0, by1 - qy) + 1):
+            if ring == 0:
+                yield 0, [(qx, qy)]
+                continue
+            ring_cells = []
+            for cy in (qy - ring, qy + ring):
+                if by0 <= cy <= by1: ring_cells.extend((cx, cy) for cx in range(max(qx - ring, bx0), min(qx + ring, bx1) + 1))
+            for cx in (qx - ring, qx + ring):
+                if bx0 <= cx <= bx1: ring_cells.extend((cx, cy) for cy in range(max(qy - ring + 1, by0), min(qy + ring - 1, by1) + 1))
+            yield ring, ring_cells
+
+    def nearest(self, x, y, max_dist=float('inf')):
+        # Kończy, gdy dalsze pierścienie nie mogą dać nic bliższego.
+        # Przy równej odległości wygrywa obiekt wstawiony wcześniej.
+        if not self.cells: return None, max_dist
+        best, best_order, best_dist = None, 0, max_dist
+        for ring, ring_cells in self.rings(x, y):
+            # Wszystko poza sprawdzonymi pierścieniami leży dalej niż (ring - 1) * cell_size
+            if (ring - 1) * self.cell_size >= best_dist: break
+            for key in ring_cells:
+                cell = self.cells.get(key)
+                if not cell: continue
+                for order, obj in cell:
+                    d = math.hypot(obj.x - x, obj.y - y)
+                    if d < best_dist or (d == best_dist and best is not None and order < best_order):
+                        best, best_order, best_dist = obj, order, d
+        return best, best_dist
+
+    def around(self, x, y, radius, limit):
+        # Do "limit" obiektów w promieniu, od najbliższych pierścieni - koszt nie zależy od liczby obiektów
+        if not self.cells: return []
+        found = {}
+        for ring, ring_cells in self.rings(x, y):
+            if (ring - 1) * self.cell_size > radius or len(found) >= limit: break
+            for key in ring_cells:
+                for order, obj in self.cells.get(key, ()):
+                    if order not in found and math.hypot(obj.x - x, obj.y - y) <= radius: found[order] = obj
+        return list(found.values())
+
+# --- KONTENER ENCJI ---
+# Usuwanie obiektu to tylko flaga "dead" (O(1)), a martwe obiekty wylatują z listy
+# jednym przebiegiem compact() na koniec klatki. Iteracja pomija martwe obiekty
+# i nie widzi tych dodanych w jej trakcie (jak dawne pętle po kopii listy[:]).
+class EntityList:
+    def __init__(self):
+        self.items = []
+        self.dead_count = 0
+
+    def __len__(self):
+        return len(self.items) - self.dead_count
+
+    def __iter__(self):
+        items = self.items
+        for i in range(len(items)):
+            obj = items[i]
+            if not obj.dead: yield obj
+
+    def append(self, obj):
+        obj.dead = False
+        self.items.append(obj)
+
+    def kill(self, obj):
+        if not obj.dead:
+            obj.dead = True
+            self.dead_count += 1
+
+    def compact(self):
+        if self.dead_count:
+            self.items = [obj for obj in self.items if not obj.dead]
+            self.dead_count = 0
+
+    def clear(self):
+        self.items.clear()
+        self.dead_count = 0
+
+# --- CACHE NAPISÓW ---
+# Wyrenderowane napisy (klucz: czcionka, tekst, kolor, antyaliasing) trzymane w LRU.
+# HUD i menu co klatkę proszą o te same napisy, więc renderowane są tylko te,
+# których treść się zmieniła.
+TEXT_CACHE_SIZE = 256
+text_cache = OrderedDict()
+
+def render_text(font, text, color, antialias=True):
+    key = (font, text, color, antialias)
+    text_surf = text_cache.get(key)
+    if text_surf is not None:
+        text_cache.move_to_end(key)
+        return text_surf
+    text_surf = font.render(text, antialias, color)
+    text_cache[key] = text_surf
+    if len(text_cache) > TEXT_CACHE_SIZE: text_cache.popitem(last=False)
+    return text_surf
+
+# --- EKRANY STATYCZNE (ODŚWIEŻANIE FRAGMENTÓW) ---
+# Menu, sklep, ranking itp. zmieniają się tylko po kliknięciu/klawiszu albo przy najechaniu
+# na przycisk. Każdy przycisk zapisuje swój prostokąt i stan, a pętla wysyła na ekran tylko
+# te prostokąty, których stan zmienił się od poprzedniej klatki (pygame.display.update(rects)).
+STATIC_SCREENS = ("MENU", "SHOP", "SHIP_SELECT", "LEADERBOARD", "GAME_OVER", "VICTORY")
+IDLE_FPS = 15
+IDLE_AFTER = 1.0
+
+class DirtyTracker:
+    def __init__(self):
+        self.widgets = []
+        self.previous = []
+
+    def begin(self):
+        self.previous, self.widgets = self.widgets, []
+
+    def mark(self, rect, *state):
+        self.widgets.append((pygame.Rect(rect), state))
+
+    def changed_rects(self):
+        # None = zmienił się układ ekranu i trzeba odświeżyć całość
+        if len(self.previous) != len(self.widgets): return None
+        dirty = []
+        for (old_rect, old_state), (rect, state) in zip(self.previous, self.widgets):
+            if old_rect != rect: return None
+            if old_state != state: dirty.append(rect)
+        return dirty
+
+ui_widgets = DirtyTracker()
+
 def draw_button(surface, text, font, text_color, x, y):
-    text_surf = font.render(text, True, text_color)
+    text_surf = render_text(font, text, text_color)
     rect = text_surf.get_rect(center=(x, y))
     rect.inflate_ip(40, 20) 
     mouse_pos = pygame.mouse.get_pos()
@@ -74,98 +546,443 @@ def draw_button(surface, text, font, text_color, x, y):
     pygame.draw.rect(surface, bg_color, rect, border_radius=10)
     pygame.draw.rect(surface, text_color, rect, 2, border_radius=10)
     surface.blit(text_surf, text_surf.get_rect(center=(x, y)))
+    ui_widgets.mark(rect, text, text_color, is_hovered)
     return rect
 
+# --- PROFILER KLATKI (F3) ---
+# profiler.lap(etap) dopisuje czas od poprzedniego znacznika do danego etapu klatki, a
+# end_frame() zamyka klatkę w buforze cyklicznym ostatnich PROFILER_FRAMES klatek. Wyłączony
+# profiler kończy każde wywołanie na jednym sprawdzeniu flagi. F3 - nakładka, F4 - eksport CSV/JSON.
+PROFILER_FRAMES = 300
+PROFILER_SCOPES = [
+    ("input", "wejście", (150, 150, 150)),
+    ("players", "gracze", GREEN),
+    ("bullets", "pociski", YELLOW),
+    ("collisions", "kolizje", RED),
+    ("particles", "cząsteczki", ORANGE),
+    ("spawn", "spawn", PINK),
+    ("enemies", "wrogowie", PURPLE),
+    ("compact", "sprzątanie", (120, 80, 40)),
+    ("background", "tło", (60, 60, 160)),
+    ("draw_pickups", "rys. znajdźki", LIGHT_BLUE),
+    ("draw_particles", "rys. cząsteczki", (255, 200, 120)),
+    ("draw_enemies", "rys. wrogowie", (200, 120, 255)),
+    ("draw_bullets", "rys. pociski", (255, 255, 160)),
+    ("draw_players", "rys. gracze", (120, 255, 120)),
+    ("hud", "HUD / menu", WHITE),
+    ("profiler", "profiler", (90, 90, 90)),
+    ("flip", "flip", CYAN),
+    ("wait", "czekanie", (40, 40, 40)),
+]
+PROFILER_ENTITIES = [("enemies", "wrogowie"), ("bosses", "bossowie"), ("bullets", "pociski"), ("particles", "cząsteczki"), ("pickups", "znajdźki")]
+PROFILER_DRAWS = [("drawn", "sprite'y"), ("culled", "poza ekranem"), ("points", "punkty LOD")]
+PROFILER_COUNTS = PROFILER_ENTITIES + PROFILER_DRAWS + [("gc0", "GC gen0")]
+PROFILER_POOLS = [("bullets", "pociski"), ("particles", "cząsteczki")]
+PROFILER_DIR = "profiles"
+PROFILER_GRAPH_H = 100
+PROFILER_GRAPH_MS = 2 * 1000 / 60
+PROFILER_TEXT_EVERY = 30
+PROFILER_PANEL_W = 480
+PROFILER_PANEL_BG = (15, 15, 25)
+
+class Profiler:
+    def __init__(self, frames=PROFILER_FRAMES):
+        self.enabled = False
+        self.index = {key: i for i, (key, _, _) in enumerate(PROFILER_SCOPES)}
+        self.wait_index = self.index["wait"]
+        self.samples = np.zeros((frames, len(PROFILER_SCOPES)))
+        self.counts = np.zeros((frames, len(PROFILER_COUNTS)), dtype=np.int32)
+        self.frame_ids = np.zeros(frames, dtype=np.int64)
+        self.head = self.filled = self.frame = 0
+        self.current = [0.0] * len(PROFILER_SCOPES)
+        self.last = 0.0
+        self.panel = self.graph = None
+        self.lines, self.line_index = [], 0
+        self.notice, self.notice_until = "", 0
+        self.pools = {}
+        self.gc_collections = 0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.head = self.filled = 0
+        self.current = [0.0] * len(PROFILER_SCOPES)
+        self.panel = self.graph = None
+        self.gc_collections = gc.get_stats()[0]["collections"]
+        self.last = time.perf_counter()
+
+    def lap(self, key):
+        if not self.enabled: return
+        now = time.perf_counter()
+        self.current[self.index[key]] += (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self, session=None):
+        # session - trwająca rozgrywka (liczniki encji i stan pul) albo None w menu
+        if not self.enabled: return
+        row = self.current
+        collections = gc.get_stats()[0]["collections"]
+        counts = session.entity_counts() if session else (0,) * (len(PROFILER_COUNTS) - 1)
+        self.pools = session.pool_stats() if session else {}
+        self.samples[self.head] = row
+        self.counts[self.head] = counts + (collections - self.gc_collections,)
+        self.gc_collections = collections
+        self.frame_ids[self.head] = self.frame
+        self.head = (self.head + 1) % len(self.samples)
+        self.filled = min(self.filled + 1, len(self.samples))
+        self.frame += 1
+        self.current = [0.0] * len(PROFILER_SCOPES)
+        if self.graph is not None: self.graph_column(row)
+
+    def graph_column(self, row):
+        # Wykres przesuwa się o piksel w lewo; rysowana jest tylko kolumna nowej klatki
+        graph, x = self.graph, self.graph.get_width() - 1
+        graph.scroll(-1, 0)
+        graph.fill(BLACK, (x, 0, 1, PROFILER_GRAPH_H))
+        y = PROFILER_GRAPH_H
+        for i, (_, _, color) in enumerate(PROFILER_SCOPES):
+            if i == self.wait_index or row[i] <= 0: continue
+            height = row[i] * PROFILER_GRAPH_H / PROFILER_GRAPH_MS
+            pygame.draw.line(graph, color, (x, y), (x, max(0, y - height)))
+            y -= height
+            if y <= 0: break
+        graph.set_at((x, PROFILER_GRAPH_H // 2), WHITE)
+
+    def order(self):
+        return (np.arange(self.filled) + self.head - self.filled) % len(self.samples)
+
+    def summary(self):
+        order = self.order()
+        data, counts = self.samples[order], self.counts[order]
+        total = data.sum(axis=1)
+        # Kolumny: cała klatka, praca (bez czekania), etapy - statystyki liczone naraz dla wszystkich
+        columns = np.column_stack([total, total - data[:, self.wait_index], data]) if len(data) else np.zeros((1, len(PROFILER_SCOPES) + 2))
+        avg, p99, peak = columns.mean(axis=0), np.percentile(columns, 99, axis=0), columns.max(axis=0)
+        stats = [{"avg": float(avg[i]), "p99": float(p99[i]), "max": float(peak[i])} for i in range(columns.shape[1])]
+        counts = counts if len(counts) else np.zeros((1, len(PROFILER_COUNTS)), dtype=np.int32)
+        return {"frames": int(self.filled), "frame": stats[0], "work": stats[1],
+                "scopes": {key: stats[i + 2] for i, (key, _, _) in enumerate(PROFILER_SCOPES)},
+                "counts": {key: {"avg": float(counts[:, i].mean()), "max": int(counts[:, i].max()), "total": int(counts[:, i].sum())}
+                           for i, (key, _) in enumerate(PROFILER_COUNTS)},
+                "pools": self.pools}
+
+    def export(self):
+        basename = os.path.join(PROFILER_DIR, "profil_" + time.strftime("%Y%m%d_%H%M%S"))
+        header = ["frame"] + ["ms_" + key for key, _, _ in PROFILER_SCOPES] + ["n_" + key for key, _ in PROFILER_COUNTS]
+        lines = [",".join(header)]
+        for i in self.order():
+            lines.append(",".join([str(self.frame_ids[i])] + [f"{value:.4f}" for value in self.samples[i]] + [str(value) for value in self.counts[i]]))
+        storage.write_bytes(basename + ".csv", ("\n".join(lines) + "\n").encode("utf-8"))
+        storage.write_bytes(basename + ".json", json.dumps(self.summary(), indent=2).encode("utf-8"))
+        self.notice, self.notice_until = f"zapisano {basename}.csv/.json", self.frame + 180
+        return basename
+
+    def panel_lines(self):
+        summary = self.summary()
+        frame, work = summary["frame"], summary["work"]
+        lines = [(f"klatka {frame['avg']:.2f} ms (p99 {frame['p99']:.2f}), praca {work['avg']:.2f} ms (p99 {work['p99']:.2f})", WHITE)]
+        for key, label, color in PROFILER_SCOPES:
+            scope = summary["scopes"][key]
+            lines.append((f"{label:<16} {scope['avg']:6.2f}  p99 {scope['p99']:6.2f}", color))
+        counts = summary["counts"]
+        lines.append(("  ".join(f"{label} {counts[key]['avg']:.0f}" for key, label in PROFILER_ENTITIES), WHITE))
+        lines.append(("rysowanie: " + "  ".join(f"{label} {counts[key]['avg']:.0f}" for key, label in PROFILER_DRAWS), WHITE))
+        lines.append((f"kolekcje GC gen0: {counts['gc0']['total']}   pule: zajęte / wolne / max", WHITE))
+        for key, label in PROFILER_POOLS:
+            pool = self.pools.get(key)
+            lines.append((f"  {label:<12} " + (f"{pool['live']} / {pool['free']} / {pool['high_water']}" if pool else "-"), (180, 180, 180)))
+        lines.append((self.notice if self.frame < self.notice_until else "F3 - ukryj, F4 - eksport CSV/JSON", (180, 180, 180)))
+        return lines
+
+    def draw(self, surface, font):
+        if not self.enabled or self.filled == 0: return
+        line_h = font.get_linesize()
+        if self.panel is None:
+            self.panel = pygame.Surface((PROFILER_PANEL_W, PROFILER_GRAPH_H + 30 + (len(PROFILER_SCOPES) + 5 + len(PROFILER_POOLS)) * line_h)).convert()
+            self.panel.fill(PROFILER_PANEL_BG)
+            self.graph = pygame.Surface((PROFILER_FRAMES, PROFILER_GRAPH_H))
+            for i in self.order(): self.graph_column(self.samples[i])
+            self.lines, self.line_index = [], 0
+        if self.frame % PROFILER_TEXT_EVERY == 0 or not self.lines: self.lines, self.line_index = self.panel_lines(), 0
+        if self.line_index < len(self.lines):
+            # Jeden wiersz tekstu na klatkę - odświeżenie całego panelu nie robi skoku czasu klatki
+            # (liczby ciągle się zmieniają, więc renderowane są bez cache napisów)
+            text, color = self.lines[self.line_index]
+            y = PROFILER_GRAPH_H + 20 + self.line_index * line_h
+            self.panel.fill(PROFILER_PANEL_BG, (0, y, PROFILER_PANEL_W, line_h))
+            self.panel.blit(font.render(text, True, color), (10, y))
+            self.line_index += 1
+        x = surface.get_width() - PROFILER_PANEL_W - 10
+        surface.blit(self.panel, (x, 10))
+        surface.blit(self.graph, (x + 10, 20))
+
+profiler = Profiler()
+
 # --- SYNTEZATOR DŹWIĘKÓW I MUZYKI ---
-def create_melody(notes_with_durations, volume=0.1, wave_type='sine'):
-    sample_rate = 44100
-    total_samples = sum(int(dur * sample_rate) for freq, dur in notes_with_durations)
-    if total_samples == 0: return pygame.mixer.Sound(buffer=array.array('h', []))
-    buf = array.array('h', [0] * total_samples)
-    current_sample = 0
-    for freq, dur in notes_with_durations:
-        n_samples = int(dur * sample_rate)
-        max_amp = int(32767 * volume)
-        for i in range(n_samples):
-            if freq > 0:
-                time = i / sample_rate
-                if wave_type == 'sine':
-                    val = int(max_amp * math.sin(2.0 * math.pi * freq * time))
-                else: 
-                    val = max_amp if math.sin(2.0 * math.pi * freq * time) > 0 else -max_amp
-                buf[current_sample] = val
-            else:
-                buf[current_sample] = 0
-            current_sample += 1
-    return pygame.mixer.Sound(buffer=buf)
+# Każda nuta to jedno wektorowe wywołanie NumPy. Gotowe próbki PCM są zapisywane
+# w SOUND_CACHE_DIR pod skrótem parametrów melodii, więc kolejne uruchomienia
+# tylko wczytują bufory z dysku zamiast syntezować dźwięk od nowa.
+SAMPLE_RATE = 44100
+SOUND_CACHE_DIR = "sound_cache"
+SYNTH_VERSION = 1
+
+def synth_note(freq, dur, max_amp, wave_type='sine', envelope=None):
+    n_samples = int(dur * SAMPLE_RATE)
+    if freq <= 0 or n_samples == 0: return np.zeros(n_samples, dtype=np.int16)
+    wave = np.sin(2.0 * np.pi * freq * (np.arange(n_samples) / SAMPLE_RATE))
+    if wave_type == 'square': wave = np.where(wave > 0, 1.0, -1.0)
+    if envelope:
+        # Obwiednia (attack, release) w sekundach - liniowe narastanie i wygaszanie nuty
+        attack, release = (min(n_samples, int(t * SAMPLE_RATE)) for t in envelope)
+        gain = np.ones(n_samples)
+        if attack: gain[:attack] = np.linspace(0.0, 1.0, attack, endpoint=False)
+        if release: gain[n_samples - release:] *= np.linspace(1.0, 0.0, release)
+        wave *= gain
+    return (max_amp * wave).astype(np.int16)
+
+def render_melody(notes_with_durations, volume=0.1, wave_type='sine', envelope=None):
+    max_amp = int(32767 * volume)
+    notes = [synth_note(freq, dur, max_amp, wave_type, envelope) for freq, dur in notes_with_durations]
+    return np.concatenate(notes) if notes else np.zeros(0, dtype=np.int16)
+
+def create_melody(notes_with_durations, volume=0.1, wave_type='sine', envelope=None):
+    key = repr((SYNTH_VERSION, SAMPLE_RATE, list(notes_with_durations), volume, wave_type, envelope))
+    cache_file = os.path.join(SOUND_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pcm")
+    expected = sum(int(dur * SAMPLE_RATE) for _, dur in notes_with_durations)
+    samples = None
+    if os.path.exists(cache_file):
+        try: samples = np.fromfile(cache_file, dtype=np.int16)
+        except (OSError, ValueError): samples = None
+        # Ucięty plik (przerwany zapis) nie jest cache'em - syntezujemy dźwięk od nowa
+        if samples is not None and len(samples) != expected: samples = None
+    if samples is None:
+        samples = render_melody(notes_with_durations, volume, wave_type, envelope)
+        # Jak w Storage.flush: zapis do .tmp i podmiana, a nazwa .tmp z numerem procesu,
+        # żeby dwie uruchomione naraz kopie gry nie pisały do jednego pliku
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(SOUND_CACHE_DIR, exist_ok=True)
+            samples.tofile(tmp_file)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            try: os.remove(tmp_file)
+            except OSError: pass
+    return pygame.mixer.Sound(buffer=samples.tobytes())
+
+# --- BANK DŹWIĘKÓW ---
+# Dźwięki powstają w wątku roboczym, więc menu pojawia się od razu. Dopóki dźwięk
+# nie jest gotowy, efekty są po cichu pomijane, a zapętlona muzyka czeka w kolejce
+# i startuje z głównego wątku w SoundBank.update().
+class LazySound:
+    def __init__(self, notes_with_durations, volume, wave_type, envelope):
+        self.recipe = (notes_with_durations, volume, wave_type, envelope)
+        self.sound = None
+        self.pending_loops = None
+
+    def play(self, loops=0):
+        if self.sound is not None: self.sound.play(loops=loops)
+        elif loops != 0: self.pending_loops = loops
+
+class SoundBank:
+    def __init__(self):
+        self.sounds = []
+        self.thread = None
+
+    def register(self, notes_with_durations, volume=0.1, wave_type='sine', envelope=None):
+        lazy = LazySound(notes_with_durations, volume, wave_type, envelope)
+        self.sounds.append(lazy)
+        return lazy
+
+    def start(self):
+        self.thread = threading.Thread(target=self.load_all, name="sound-bank", daemon=True)
+        self.thread.start()
+
+    def load_all(self):
+        for lazy in self.sounds:
+            if lazy.sound is None: lazy.sound = create_melody(*lazy.recipe)
 
-boss_death_sound = create_melody([(300, 0.1), (200, 0.1), (100, 0.15), (50, 0.3)], volume=0.3)
-victory_sound = create_melody([(523.25, 0.15), (659.25, 0.15), (783.99, 0.15), (1046.50, 0.8)], volume=0.3)
-hit_sound = create_melody([(150, 0.05), (100, 0.1)], volume=0.2)
-powerup_sound = create_melody([(600, 0.05), (800, 0.1)], volume=0.1)
-error_sound = create_melody([(100, 0.15)], volume=0.2) 
-bg_music = create_melody([(55, 1.0), (65, 1.0)], volume=0.05, wave_type='square')
+    def is_ready(self):
+        return all(lazy.sound is not None for lazy in self.sounds)
+
+    def update(self):
+        for lazy in self.sounds:
+            if lazy.pending_loops is not None and lazy.sound is not None:
+                lazy.sound.play(loops=lazy.pending_loops)
+                lazy.pending_loops = None
+
+    def stop_all(self):
+        for lazy in self.sounds: lazy.pending_loops = None
+        pygame.mixer.stop()
+
+sound_bank = SoundBank()
+boss_death_sound = sound_bank.register([(300, 0.1), (200, 0.1), (100, 0.15), (50, 0.3)], volume=0.3)
+victory_sound = sound_bank.register([(523.25, 0.15), (659.25, 0.15), (783.99, 0.15), (1046.50, 0.8)], volume=0.3)
+hit_sound = sound_bank.register([(150, 0.05), (100, 0.1)], volume=0.2)
+powerup_sound = sound_bank.register([(600, 0.05), (800, 0.1)], volume=0.1)
+error_sound = sound_bank.register([(100, 0.15)], volume=0.2) 
+bg_music = sound_bank.register([(55, 1.0), (65, 1.0)], volume=0.05, wave_type='square')
 
 def play_sound(sound_obj):
     if sound_enabled: sound_obj.play()
 
 # --- EFEKT 3D TŁA (PARALLAX) ---
+# Każda warstwa gwiazd jest raz renderowana do własnej powierzchni (gwiazdy przy krawędzi
+# są dorysowane też z drugiej strony, żeby zawijanie było bezszwowe). Co klatkę warstwa
+# jest tylko przewijana dwoma blitami. Ponowne renderowanie następuje wyłącznie przy resize.
 class ParallaxBackground:
     def __init__(self, width, height):
+        self.offsets = [0.0, 0.0, 0.0]
+        self.resize(width, height)
+
+    def resize(self, width, height):
         self.width = width
         self.height = height
         self.layers = []
         for i in range(3):
-            layer = []
+            color = (100 + i*50, 100 + i*50, 100 + i*50)
+            layer = pygame.Surface((width, height))
             num_stars = int((width * height) / 3000)
             for _ in range(num_stars):
-                layer.append([random.randint(0, width), random.randint(0, height), random.randint(1, 3), (i+1)*0.5])
-            self.layers.append(layer)
-
-    def resize(self, width, height):
-        self.width = width
-        self.height = height
-
-    def update_and_draw(self, surface):
-        surface.fill(BLACK)
+                x, y, r = random.randint(0, width), random.randint(0, height), random.randint(1, 3)
+                for wrap_y in (y - height, y, y + height):
+                    pygame.draw.circle(layer, color, (x, wrap_y), r)
+            # Najniższa warstwa jest nieprzezroczysta i zastępuje fill(BLACK). Pozostałe mają colorkey
+            # z RLEACCEL - gwiazd jest mało, więc blit przeskakuje całe puste przebiegi pikseli.
+            if i > 0: layer.set_colorkey(BLACK, pygame.RLEACCEL)
+            self.layers.append(layer.convert())
+        self.offsets = [offset % height for offset in self.offsets]
+
+    def update_and_draw(self, surface, scroll=True, layers=3):
+        # layers - ile warstw gwiazd rysować (0 = samo czarne tło); przesuwają się zawsze wszystkie
+        if layers == 0: surface.fill(BLACK)
         for i, layer in enumerate(self.layers):
-            color = (100 + i*50, 100 + i*50, 100 + i*50)
-            for star in layer:
-                star[1] += star[3] 
-                if star[1] > self.height:
-                    star[1] = 0
-                    star[0] = random.randint(0, self.width)
-                pygame.draw.circle(surface, color, (int(star[0]), int(star[1])), star[2])
+            if scroll: self.offsets[i] = (self.offsets[i] + (i+1)*0.5) % self.height
+            if i >= layers: continue
+            offset = int(self.offsets[i])
+            surface.blit(layer, (0, offset))
+            if offset > 0: surface.blit(layer, (0, offset - self.height))
+
+# --- STEROWANIE ---
+# Symulacja nie czyta klawiatury sama - dostaje PlayerInput na każdy tick. Dzięki temu
+# ten sam kod obsługuje gracza, bota w trybie headless i odtwarzanie zapisanych wejść.
+PlayerInput = namedtuple("PlayerInput", "up down left right dash aim_x aim_y")
+IDLE_INPUT = PlayerInput(False, False, False, False, False, 0, 0)
+
+def read_keyboard_input(p_id):
+    keys = pygame.key.get_pressed()
+    if p_id == 1:
+        mouse_x, mouse_y = pygame.mouse.get_pos()
+        return PlayerInput(keys[pygame.K_w], keys[pygame.K_s], keys[pygame.K_a], keys[pygame.K_d], keys[pygame.K_SPACE], mouse_x, mouse_y)
+    return PlayerInput(keys[pygame.K_UP], keys[pygame.K_DOWN], keys[pygame.K_LEFT], keys[pygame.K_RIGHT], keys[pygame.K_RCTRL], 0, 0)
+
+# --- AUTOCELOWANIE (GRACZ 2) ---
+# Cel wybierany przez siatki kolizji wrogów i bossów (te same, których używa GameSession),
+# więc koszt nie rośnie z liczbą wrogów na planszy.
+AIM_PRIORITIES = ["nearest", "lowest_hp", "boss_first"]
+AIM_PRIORITY_NAMES = {"nearest": "NAJBLIŻSZY", "lowest_hp": "NAJSŁABSZY", "boss_first": "NAJPIERW BOSS"}
+AIM_SCAN_RADIUS = 200
+AIM_CANDIDATES = 16
+
+def find_aim_target(x, y, enemy_grid, boss_grid, priority="nearest"):
+    if priority == "boss_first":
+        boss, _ = boss_grid.nearest(x, y)
+        if boss: return boss
+    elif priority == "lowest_hp":
+        # Najmniej HP wśród najbliższych celów w promieniu AIM_SCAN_RADIUS (przy remisie bliższy)
+        candidates = enemy_grid.around(x, y, AIM_SCAN_RADIUS, AIM_CANDIDATES) + boss_grid.around(x, y, AIM_SCAN_RADIUS, AIM_CANDIDATES)
+        if candidates: return min(candidates, key=lambda t: (t.hp, math.hypot(t.x - x, t.y - y)))
+    enemy, enemy_dist = enemy_grid.nearest(x, y)
+    boss, _ = boss_grid.nearest(x, y, enemy_dist)
+    return boss if boss else enemy
+
+# --- SPRITE'Y ENCJI ---
+# Wrogowie, bossowie i znajdźki mają stały kształt dla danego typu i koloru, więc rysujemy
+# je raz na przezroczystej powierzchni, a w klatce już tylko blitujemy (jedno Surface.blits
+# na warstwę). Dynamicznie rysowane są wyłącznie paski zdrowia.
+SPRITE_PAD = 2
+entity_sprites = {}
+
+def get_entity_sprite(key, half_size, paint):
+    sprite = entity_sprites.get(key)
+    if sprite is None:
+        center = half_size + SPRITE_PAD
+        sprite = pygame.Surface((center * 2, center * 2))
+        paint(sprite, center, center)
+        sprite = sprite.convert()
+        sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+        entity_sprites[key] = sprite
+    return sprite
+
+def sprite_blit(entity, alpha=1.0):
+    sprite = entity.sprite()
+    half = sprite.get_width() // 2
+    x = entity.prev_x + (entity.x - entity.prev_x) * alpha
+    y = entity.prev_y + (entity.y - entity.prev_y) * alpha
+    return sprite, (int(x) - half, int(y) - half)
+
+# --- WIDOCZNOŚĆ (CULLING) I POZIOM SZCZEGÓŁÓW (LOD) ---
+# Przed rysowaniem odrzucamy wszystko, co nie przecina widocznego fragmentu świata (ekran
+# przesunięty o bieżący wstrząs): wrogów i pociski za krawędzią, znajdźki pod przesuniętym
+# brzegiem. Drobne kółka (cząsteczki, punkty śladów) o promieniu do quality["points"] rysujemy
+# jako pojedyncze piksele - jeden zapis do tablicy pikseli zamiast setek blitów.
+HEALTH_BAR_MARGIN = 20
+
+def cull_entities(entities, view, alpha=1.0, margin=0):
+    # Zwraca (widoczne encje, ich blity); margin - zapas na paski zdrowia nad sprite'em
+    left, top, right, bottom = view.left - margin, view.top - margin, view.right + margin, view.bottom + margin
+    visible, blits = [], []
+    for entity in entities:
+        blit = sprite_blit(entity, alpha)
+        sprite, (x, y) = blit
+        size = sprite.get_width()
+        if x + size > left and x < right and y + size > top and y < bottom:
+            visible.append(entity)
+            blits.append(blit)
+    return visible, blits
+
+def in_view(view, xs, ys, radius):
+    # Maska NumPy: kółka (xs, ys, promień) przecinające widok
+    return (xs + radius >= view.left) & (xs - radius < view.right) & (ys + radius >= view.top) & (ys - radius < view.bottom)
+
+def draw_points(surface, xs, ys, colors):
+    # Piksele o kolorach z surface.map_rgb; współrzędne poza powierzchnią są pomijane
+    width, height = surface.get_size()
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    if not inside.any(): return
+    if surface.get_bytesize() == 3:
+        for x, y, c in zip(xs[inside].tolist(), ys[inside].tolist(), colors[inside].tolist()): surface.set_at((x, y), surface.unmap_rgb(c))
+        return
+    pixels = pygame.surfarray.pixels2d(surface)
+    pixels[xs[inside], ys[inside]] = colors[inside]
+    del pixels
 
 # --- KLASY GRY ---
+def lerp_position(entity, alpha):
+    # Pozycja do rysowania między poprzednim a bieżącym tickiem symulacji
+    return entity.prev_x + (entity.x - entity.prev_x) * alpha, entity.prev_y + (entity.y - entity.prev_y) * alpha
+
 class Player:
     def __init__(self, p_id, x, y, ship_type, save_data):
         self.p_id = p_id 
         self.x = x
         self.y = y
+        self.prev_x, self.prev_y = x, y
         self.radius = 20
         self.angle = 0
         self.barrel_length = 35
         self.shoot_timer = 0
         
         self.ship_type = ship_type
+        self.aim_priority = "nearest"
         self.color = BLUE if p_id == 1 else PINK
         
         bonus_hp = save_data["upgrades"]["hp_bonus"] * 25
         self.level = save_data["upgrades"]["start_lvl"]
         
-        if ship_type == "light":
-            self.speed = 7
-            self.max_health = 60 + bonus_hp
-            self.dash_cd_max = 40
-        elif ship_type == "heavy":
-            self.speed = 3.5
-            self.max_health = 180 + bonus_hp
-            self.dash_cd_max = 100
-        else: 
-            self.speed = 5
-            self.max_health = 100 + bonus_hp
-            self.dash_cd_max = 60
+        stats = SHIP_STATS[SHIP_TYPE_IDS.get(ship_type, SHIP_TYPE_IDS["balanced"])]
+        self.speed = stats.speed
+        self.max_health = stats.max_health + bonus_hp
+        self.dash_cd_max = stats.dash_cooldown
+        self.damage_taken = stats.damage_taken
             
         self.health = self.max_health
         
@@ -173,49 +990,54 @@ class Player:
         self.dash_timer = 0
         self.dash_cooldown = 0
         
-        self.weapon_type = "normal" 
+        self.weapon_type = BULLET_NORMAL
         self.weapon_timer = 0
         self.rapid_fire_timer = 0
         self.has_shield = False
         self.ghosts = [] 
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0, outlines=True):
+        x, y = lerp_position(self, alpha)
         if self.invincible_timer > 0 and self.invincible_timer % 10 < 5:
             pass 
         else:
-            num_barrels = min(self.level, 8)
-            if self.weapon_type == "shotgun": num_barrels = 3
-            
-            angle_step = (2 * math.pi) / num_barrels if self.weapon_type != "shotgun" else 0.2
-            start_angle = self.angle if self.weapon_type != "shotgun" else self.angle - (0.2 * (num_barrels//2))
+            weapon = BULLET_STATS[self.weapon_type]
+            num_barrels, angle_step, start_angle = self.barrel_layout(weapon)
+            c = weapon.barrel_color
             
             for i in range(num_barrels):
                 current_angle = start_angle + (i * angle_step)
-                end_x = self.x + math.cos(current_angle) * self.barrel_length
-                end_y = self.y + math.sin(current_angle) * self.barrel_length
-                c = WHITE
-                if self.weapon_type == "shotgun": c = ORANGE
-                elif self.weapon_type == "pierce": c = CYAN
-                pygame.draw.line(surface, c, (self.x, self.y), (end_x, end_y), 4)
+                end_x = x + math.cos(current_angle) * self.barrel_length
+                end_y = y + math.sin(current_angle) * self.barrel_length
+                pygame.draw.line(surface, c, (x, y), (end_x, end_y), 4)
                 
-            pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-            if self.has_shield: pygame.draw.circle(surface, LIGHT_BLUE, (int(self.x), int(self.y)), self.radius + 8, 3)
+            pygame.draw.circle(surface, self.color, (int(x), int(y)), self.radius)
+            # Tarcza to stan rozgrywki (następne trafienie nie zada obrażeń), więc rysujemy ją
+            # zawsze - flaga outlines wyłącza tylko ozdobne kontury smugi po zrywie
+            if self.has_shield: pygame.draw.circle(surface, LIGHT_BLUE, (int(x), int(y)), self.radius + 8, 3)
 
+        if not outlines: return
         for gx, gy, life in self.ghosts:
             ghost_color = (self.color[0], self.color[1], self.color[2])
             pygame.draw.circle(surface, ghost_color, (int(gx), int(gy)), self.radius, 1)
 
-    def update(self, enemies, bosses):
-        keys = pygame.key.get_pressed()
+    def barrel_layout(self, weapon):
+        # Broń ze stałą liczbą luf strzela wachlarzem, pozostałe pierścieniem zależnym od poziomu
+        if weapon.barrels:
+            return weapon.barrels, weapon.spread, self.angle - (weapon.spread * (weapon.barrels // 2))
+        num_barrels = min(self.level, 8)
+        return num_barrels, (2 * math.pi) / num_barrels, self.angle
+
+    def update(self, enemy_grid, boss_grid, control):
         if self.invincible_timer > 0: self.invincible_timer -= 1
         if self.dash_cooldown > 0: self.dash_cooldown -= 1
         if self.rapid_fire_timer > 0: self.rapid_fire_timer -= 1
         if self.weapon_timer > 0:
             self.weapon_timer -= 1
-            if self.weapon_timer <= 0: self.weapon_type = "normal"
+            if self.weapon_timer <= 0: self.weapon_type = BULLET_NORMAL
         
         self.shoot_delay = 5 if self.rapid_fire_timer > 0 else 15
-        if self.weapon_type == "shotgun": self.shoot_delay += 10 
+        self.shoot_delay += BULLET_STATS[self.weapon_type].extra_delay
         
         current_speed = self.speed
         if self.dash_timer > 0:
@@ -227,33 +1049,19 @@ class Player:
             ghost[2] -= 1
             if ghost[2] <= 0: self.ghosts.remove(ghost)
 
+        if control.dash and self.dash_cooldown <= 0:
+            self.dash_timer = 12
+            self.dash_cooldown = self.dash_cd_max
+        if control.up and self.y - self.radius > 0: self.y -= current_speed
+        if control.down and self.y + self.radius < HEIGHT: self.y += current_speed
+        if control.left and self.x - self.radius > 0: self.x -= current_speed
+        if control.right and self.x + self.radius < WIDTH: self.x += current_speed
+
         if self.p_id == 1:
-            if keys[pygame.K_SPACE] and self.dash_cooldown <= 0:
-                self.dash_timer = 12
-                self.dash_cooldown = self.dash_cd_max
-            if keys[pygame.K_w] and self.y - self.radius > 0: self.y -= current_speed
-            if keys[pygame.K_s] and self.y + self.radius < HEIGHT: self.y += current_speed
-            if keys[pygame.K_a] and self.x - self.radius > 0: self.x -= current_speed
-            if keys[pygame.K_d] and self.x + self.radius < WIDTH: self.x += current_speed
-            mouse_x, mouse_y = pygame.mouse.get_pos()
-            self.angle = math.atan2(mouse_y - self.y, mouse_x - self.x)
+            self.angle = math.atan2(control.aim_y - self.y, control.aim_x - self.x)
             
         elif self.p_id == 2:
-            if keys[pygame.K_RCTRL] and self.dash_cooldown <= 0:
-                self.dash_timer = 12
-                self.dash_cooldown = self.dash_cd_max
-            if keys[pygame.K_UP] and self.y - self.radius > 0: self.y -= current_speed
-            if keys[pygame.K_DOWN] and self.y + self.radius < HEIGHT: self.y += current_speed
-            if keys[pygame.K_LEFT] and self.x - self.radius > 0: self.x -= current_speed
-            if keys[pygame.K_RIGHT] and self.x + self.radius < WIDTH: self.x += current_speed
-            
-            closest_target = None
-            min_dist = float('inf')
-            for target in enemies + bosses:
-                dist = math.hypot(target.x - self.x, target.y - self.y)
-                if dist < min_dist:
-                    min_dist = dist
-                    closest_target = target
+            closest_target = find_aim_target(self.x, self.y, enemy_grid, boss_grid, self.aim_priority)
             if closest_target:
                 self.angle = math.atan2(closest_target.y - self.y, closest_target.x - self.x)
 
@@ -268,142 +1076,310 @@ class Player:
             play_sound(hit_sound)
             return True 
         else:
-            if self.ship_type == "heavy": amount = int(amount * 0.7)
+            amount = int(amount * self.damage_taken)
             self.health -= amount
             self.invincible_timer = 60 
             play_sound(hit_sound)
             return True
 
-class Bullet:
-    def __init__(self, x, y, angle, owner="player", b_type="normal"):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.owner = owner
-        self.b_type = b_type
-        self.history = [] 
-        self.enemies_hit = [] 
-        
-        if owner == "player":
-            if b_type == "pierce":
-                self.speed = 15; self.radius = 6; self.color = CYAN
-            elif b_type == "shotgun":
-                self.speed = 12; self.radius = 4; self.color = ORANGE
-            else:
-                self.speed = 10; self.radius = 5; self.color = YELLOW
-        else:
-            self.speed = 4; self.radius = 8; self.color = RED
+# --- POCISKI (PULA NUMPY) ---
+# Wszystkie pociski (gracza i wrogów) siedzą w jednej puli struktura-tablic.
+# Ruch, odrzucanie pocisków poza ekranem i kompaktowanie to po jednej operacji
+# wektorowej na klatkę. Pociski lecą po prostej ze stałą prędkością, więc ślad liczymy
+# wprost z pozycji i prędkości (punkt m kroków wstecz = pozycja - m * prędkość).
+OWNER_PLAYER, OWNER_ENEMY = 0, 1
+BULLET_NORMAL, BULLET_SHOTGUN, BULLET_PIERCE, BULLET_ENEMY = (BULLET_TYPE_IDS[name] for name in ("normal", "shotgun", "pierce", "enemy"))
+BULLET_SPEEDS = [b.speed for b in BULLET_STATS]
+BULLET_RADII = [b.radius for b in BULLET_STATS]
+BULLET_COLORS = [b.color for b in BULLET_STATS]
+TRAIL_LENGTH = 6
+# Jakość śladów: ile kroków wstecz (razem z samym pociskiem) rysujemy
+TRAIL_QUALITIES = ["full", "short", "off"]
+TRAIL_STEPS = {"full": TRAIL_LENGTH, "short": TRAIL_LENGTH // 2, "off": 1}
+TRAIL_QUALITY_NAMES = {"full": "PEŁNE", "short": "KRÓTKIE", "off": "WYŁ."}
+bullet_sprites = {}
+
+def get_bullet_sprite(b_type, size):
+    # Kółko danego typu i promienia (głowa pocisku albo punkt śladu); zwraca (sprite, przesunięcie)
+    key = (b_type, size)
+    entry = bullet_sprites.get(key)
+    if entry is None:
+        sprite = pygame.Surface((size * 2 + 1, size * 2 + 1))
+        pygame.draw.circle(sprite, BULLET_COLORS[b_type], (size, size), size)
+        sprite = sprite.convert()
+        sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+        entry = bullet_sprites[key] = (sprite, size)
+    return entry
+
+class BulletPool:
+    def __init__(self, capacity=1024):
+        self.capacity = 0
+        self.count = 0
+        self.x = self.y = self.vx = self.vy = np.zeros(0)
+        self.radius = self.b_type = self.owner = self.age = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.hits = np.empty(0, dtype=object)
+        self.high_water = 0
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        def resized(arr):
+            new = np.zeros((capacity,) + arr.shape[1:], dtype=arr.dtype)
+            new[:self.count] = arr[:self.count]
+            return new
+        self.x, self.y, self.vx, self.vy = resized(self.x), resized(self.y), resized(self.vx), resized(self.vy)
+        self.radius, self.b_type, self.owner = resized(self.radius), resized(self.b_type), resized(self.owner)
+        self.age, self.alive = resized(self.age), resized(self.alive)
+        hits = np.empty(capacity, dtype=object)
+        hits[:self.count] = self.hits[:self.count]
+        self.hits = hits
+        self.capacity = capacity
+
+    def _columns(self):
+        return (self.x, self.y, self.vx, self.vy, self.radius, self.b_type, self.owner, self.age, self.hits)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive[:self.count]))
+
+    def clear(self):
+        self.alive[:self.count] = False
+        self.hits[:self.count] = None
+        self.count = 0
+
+    def stats(self):
+        return {"live": len(self), "free": self.capacity - self.count, "high_water": self.high_water}
+
+    def spawn(self, x, y, angle, owner=OWNER_PLAYER, b_type=BULLET_NORMAL):
+        if owner == OWNER_ENEMY: b_type = BULLET_ENEMY
+        if self.count == self.capacity: self._grow(self.capacity * 2)
+        i = self.count
+        self.count += 1
+        if self.count > self.high_water: self.high_water = self.count
+        speed = BULLET_SPEEDS[b_type]
+        self.x[i], self.y[i] = x, y
+        self.vx[i], self.vy[i] = math.cos(angle) * speed, math.sin(angle) * speed
+        self.radius[i], self.b_type[i], self.owner[i] = BULLET_RADII[b_type], b_type, owner
+        self.age[i] = 0
+        self.alive[i] = True
+        self.hits[i] = [] if b_type == BULLET_PIERCE else None
+
+    def spawn_ring(self, x, y, count, owner=OWNER_ENEMY):
+        for i in range(count):
+            self.spawn(x, y, (2 * math.pi / count) * i, owner)
+
+    def kill(self, i):
+        self.alive[i] = False
+
+    def live(self, owner):
+        # Migawka żywych pocisków danego właściciela: (indeks, x, y, promień, typ)
+        n = self.count
+        idx = np.flatnonzero(self.alive[:n] & (self.owner[:n] == owner))
+        return zip(idx.tolist(), self.x[idx].tolist(), self.y[idx].tolist(), self.radius[idx].tolist(), self.b_type[idx].tolist())
 
     def update(self):
-        self.history.append((self.x, self.y))
-        if len(self.history) > 6: self.history.pop(0)
-        self.x += math.cos(self.angle) * self.speed
-        self.y += math.sin(self.angle) * self.speed
-
-    def draw(self, surface):
-        for i, (hx, hy) in enumerate(self.history):
-            size = int(self.radius * (i / len(self.history)))
-            if size > 0: pygame.draw.circle(surface, self.color, (int(hx), int(hy)), size)
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-
-    def is_off_screen(self):
-        return self.x < -50 or self.x > WIDTH + 50 or self.y < -50 or self.y > HEIGHT + 50
+        n = self.count
+        if n == 0: return
+        self.age[:n] += 1
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+
+    def cull_off_screen(self):
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        self.alive[:n] &= (x >= -50) & (x <= WIDTH + 50) & (y >= -50) & (y <= HEIGHT + 50)
+
+    def compact(self):
+        # Stabilne kompaktowanie (zachowuje kolejność wystrzałów, od której zależy "pierwsze trafienie")
+        n = self.count
+        keep = np.flatnonzero(self.alive[:n])
+        m = len(keep)
+        if m == n: return
+        for column in self._columns(): column[:m] = column[keep]
+        self.alive[:m] = True
+        self.alive[m:n] = False
+        self.hits[m:n] = None
+        self.count = m
+
+    def draw(self, surface, alpha=1.0, quality="full", view=None, point_radius=0):
+        # Zwraca (narysowane sprite'y, odrzucone poza widokiem, punkty LOD)
+        n = self.count
+        if n == 0: return 0, 0, 0
+        view = view or surface.get_rect()
+        # Pociski gracza pod pociskami wrogów
+        idx = np.flatnonzero(self.alive[:n])
+        idx = idx[np.argsort(self.owner[idx], kind="stable")]
+        vx, vy, radius, b_type, age = self.vx[idx], self.vy[idx], self.radius[idx], self.b_type[idx], self.age[idx]
+        # Interpolacja: cofamy pocisk o część ostatniego kroku (nowe pociski jeszcze się nie ruszyły)
+        back = (1.0 - alpha) * (age > 0)
+        xs, ys = self.x[idx] - vx * back, self.y[idx] - vy * back
+        steps = np.minimum(age, TRAIL_STEPS[quality])
+        blits, dots, culled = [], [], 0
+        # Warstwami: najpierw najstarsze (najmniejsze) punkty śladu, na końcu głowy pocisków
+        for m in range(TRAIL_STEPS[quality] - 1, 0, -1):
+            sel = np.flatnonzero(steps > m)
+            if len(sel) == 0: continue
+            k = steps[sel]
+            sizes = radius[sel] * (k - m) // k
+            px, py = (xs[sel] - vx[sel] * m).astype(np.int64), (ys[sel] - vy[sel] * m).astype(np.int64)
+            shown = sizes > 0
+            keep = shown & in_view(view, px, py, sizes)
+            culled += int(np.count_nonzero(shown)) - int(np.count_nonzero(keep))
+            dot = keep & (sizes <= point_radius)
+            if dot.any(): dots.append((px[dot], py[dot], b_type[sel][dot]))
+            keep &= ~dot
+            for size, x, y, t in zip(sizes[keep].tolist(), px[keep].tolist(), py[keep].tolist(), b_type[sel][keep].tolist()):
+                sprite, off = get_bullet_sprite(t, size)
+                blits.append((sprite, (x - off, y - off)))
+        hx, hy = xs.astype(np.int64), ys.astype(np.int64)
+        keep = in_view(view, hx, hy, radius)
+        culled += len(idx) - int(np.count_nonzero(keep))
+        for r, x, y, t in zip(radius[keep].tolist(), hx[keep].tolist(), hy[keep].tolist(), b_type[keep].tolist()):
+            sprite, off = get_bullet_sprite(t, r)
+            blits.append((sprite, (x - off, y - off)))
+        points = 0
+        if dots:
+            # Punkty śladu są najstarszą warstwą, więc idą pod wszystkie sprite'y
+            px, py, types = (np.concatenate(column) for column in zip(*dots))
+            draw_points(surface, px, py, np.array([surface.map_rgb(c) for c in BULLET_COLORS], dtype=np.int64)[types])
+            points = len(px)
+        surface.blits(blits, False)
+        return len(blits), culled, points
 
 class PowerUp:
     def __init__(self):
         while True:
-            self.x = random.randint(50, WIDTH - 50)
-            self.y = random.randint(50, HEIGHT - 50)
+            self.x = sim_random.randint(50, WIDTH - 50)
+            self.y = sim_random.randint(50, HEIGHT - 50)
             # Strefy bez spawnu na UI
             if self.x < 320 and self.y < 220: continue
             if self.x > WIDTH - 220 and self.y < 220: continue
             break 
+        self.prev_x, self.prev_y = self.x, self.y
         self.radius = 15
-        self.type = random.choice(["shield", "rapid_fire", "shotgun", "pierce"])
-        
-    def draw(self, surface):
-        if self.type == "shield":
-            pygame.draw.circle(surface, LIGHT_BLUE, (self.x, self.y), self.radius)
-            pygame.draw.circle(surface, WHITE, (self.x, self.y), self.radius, 2)
-        elif self.type == "rapid_fire": 
-            pygame.draw.circle(surface, YELLOW, (self.x, self.y), self.radius)
-            pygame.draw.circle(surface, ORANGE, (self.x, self.y), self.radius, 2)
-        elif self.type == "shotgun":
-            pygame.draw.circle(surface, RED, (self.x, self.y), self.radius)
-            pygame.draw.circle(surface, ORANGE, (self.x, self.y), self.radius, 2)
-        elif self.type == "pierce":
-            pygame.draw.circle(surface, CYAN, (self.x, self.y), self.radius)
-            pygame.draw.circle(surface, WHITE, (self.x, self.y), self.radius, 2)
+        self.type_id = sim_random.randrange(len(POWERUP_STATS))
+        self.stats = POWERUP_STATS[self.type_id]
+        self.type = self.stats.name
+
+    def sprite(self):
+        return get_entity_sprite(("powerup", self.type_id), self.radius, self.paint)
+
+    def paint(self, surface, x, y):
+        pygame.draw.circle(surface, self.stats.color, (x, y), self.radius)
+        pygame.draw.circle(surface, self.stats.outline, (x, y), self.radius, 2)
+
+    def draw(self, surface, alpha=1.0):
+        surface.blit(*sprite_blit(self))
+
+# --- STEROWANIE WROGÓW (NUMPY) ---
+# Wrogowie zostają obiektami (siatka kolizji i pociski przebijające trzymają referencje),
+# ale ich ruch liczymy raz na tick dla wszystkich naraz: pozycje, prędkości i typy trafiają
+# do tablic, a wybór najbliższego gracza, ruch po wektorze jednostkowym i zasięg strzelców
+# to kilka operacji NumPy zamiast atan2/cos/sin na każdego wroga. Tablice zbieramy z obiektów
+# co tick - wrogowie nie są przechowywani w tablicach według typu. Wektor (dx, dy) / dist
+# różni się od dawnego cos/sin(atan2) na ostatnich bitach (NumPy nie liczy tak jak libm),
+# więc bench.py enemies porównuje ze starą logiką z tolerancją i podaje największą różnicę.
+ENEMY_SHOOTS = np.array([e.shoots for e in ENEMY_STATS], dtype=bool)
+# Minionów bossa wybieramy po nazwie; bez typu "fast" w pliku boss przywołuje pierwszy typ
+ENEMY_FAST = ENEMY_TYPE_IDS.get("fast", 0)
+SHOOTER_RANGE = 200
+
+def nearest_player(x, y, players):
+    closest_player = None
+    min_dist = float('inf')
+    for p in players:
+        d = math.hypot(p.x - x, p.y - y)
+        if d < min_dist:
+            min_dist = d
+            closest_player = p
+    return closest_player, min_dist
+
+def steer_enemies(enemies, players, bullets):
+    live = list(enemies)
+    targets = list(players)
+    if not live or not targets: return
+    n = len(live)
+    xs = np.fromiter((e.x for e in live), float, n)
+    ys = np.fromiter((e.y for e in live), float, n)
+    speeds = np.fromiter((e.speed for e in live), float, n)
+    type_ids = np.fromiter((e.type_id for e in live), np.intp, n)
+
+    # Macierz odległości wróg x gracz; argmin bierze pierwszego przy remisie, jak dawne "d < min_dist"
+    dx = np.array([p.x for p in targets])[None, :] - xs[:, None]
+    dy = np.array([p.y for p in targets])[None, :] - ys[:, None]
+    dist = np.hypot(dx, dy)
+    rows = np.arange(n)
+    nearest = dist.argmin(axis=1)
+    dx, dy, dist = dx[rows, nearest], dy[rows, nearest], dist[rows, nearest]
+
+    shooting = ENEMY_SHOOTS[type_ids] & (dist < SHOOTER_RANGE)
+    # Wróg dokładnie na graczu: atan2(0, 0) = 0, czyli ruch w prawo
+    safe_dist = np.where(dist > 0, dist, 1.0)
+    new_x = np.where(shooting, xs, xs + np.where(dist > 0, dx / safe_dist, 1.0) * speeds)
+    new_y = np.where(shooting, ys, ys + dy / safe_dist * speeds)
+    for e, x, y in zip(live, new_x.tolist(), new_y.tolist()): e.x, e.y = x, y
+
+    for i in np.flatnonzero(shooting).tolist():
+        e = live[i]
+        e.shoot_timer -= 1
+        if e.shoot_timer <= 0:
+            bullets.spawn(e.x, e.y, math.atan2(dy[i], dx[i]), owner=OWNER_ENEMY)
+            e.shoot_timer = 80
 
 class Enemy:
-    def __init__(self, enemy_type, diff_multiplier, diff_settings):
-        side = random.choice(['top', 'bottom', 'left', 'right'])
-        if side == 'top': self.x, self.y = random.randint(0, WIDTH), -50
-        elif side == 'bottom': self.x, self.y = random.randint(0, WIDTH), HEIGHT + 50
-        elif side == 'left': self.x, self.y = -50, random.randint(0, HEIGHT)
-        else: self.x, self.y = WIDTH + 50, random.randint(0, HEIGHT)
+    __slots__ = ("x", "y", "prev_x", "prev_y", "type", "type_id", "stats", "shoot_timer", "radius", "color", "hp", "speed", "damage", "dead")
+
+    def __init__(self, type_id, diff_multiplier, diff_settings):
+        self.dead = False
+        side = sim_random.choice(['top', 'bottom', 'left', 'right'])
+        if side == 'top': self.x, self.y = sim_random.randint(0, WIDTH), -50
+        elif side == 'bottom': self.x, self.y = sim_random.randint(0, WIDTH), HEIGHT + 50
+        elif side == 'left': self.x, self.y = -50, sim_random.randint(0, HEIGHT)
+        else: self.x, self.y = WIDTH + 50, sim_random.randint(0, HEIGHT)
+        self.prev_x, self.prev_y = self.x, self.y
             
-        self.type = enemy_type
+        stats = self.stats = ENEMY_STATS[type_id]
+        self.type, self.type_id = stats.name, type_id
         self.shoot_timer = 60 
         
-        if self.type == "normal":
-            self.radius, base_speed, self.color, self.hp, base_damage = 15, random.uniform(1.5, 3.0), RED, 1, 25
-        elif self.type == "tank":
-            self.radius, base_speed, self.color, self.hp, base_damage = 30, random.uniform(0.5, 1.0), ORANGE, 5, 50
-        elif self.type == "fast":
-            self.radius, base_speed, self.color, self.hp, base_damage = 10, random.uniform(3.5, 5.0), CYAN, 1, 15
-        elif self.type == "shooter": 
-            self.radius, base_speed, self.color, self.hp, base_damage = 15, random.uniform(1.0, 2.0), GREEN, 2, 20
-        elif self.type == "kamikaze": 
-            self.radius, base_speed, self.color, self.hp, base_damage = 12, random.uniform(4.0, 6.0), PURPLE, 1, 40
-            
+        self.radius, self.color, self.hp = stats.radius, stats.color, stats.hp
+        base_speed = sim_random.uniform(stats.speed_min, stats.speed_max)
         self.speed = base_speed * diff_multiplier * diff_settings["speed"]
-        self.damage = int(base_damage * diff_settings["damage"])
-
-    def update(self, players, enemy_bullets):
-        closest_player = None
-        min_dist = float('inf')
-        for p in players:
-            d = math.hypot(p.x - self.x, p.y - self.y)
-            if d < min_dist:
-                min_dist = d
-                closest_player = p
-                
-        if closest_player:
-            angle = math.atan2(closest_player.y - self.y, closest_player.x - self.x)
-            if self.type == "shooter" and min_dist < 200:
-                self.shoot_timer -= 1
-                if self.shoot_timer <= 0:
-                    enemy_bullets.append(Bullet(self.x, self.y, angle, owner="enemy"))
-                    self.shoot_timer = 80
-            else:
-                self.x += math.cos(angle) * self.speed
-                self.y += math.sin(angle) * self.speed
-
-    def draw(self, surface):
-        if self.type == "kamikaze":
-            pygame.draw.polygon(surface, self.color, [(self.x, self.y - self.radius), (self.x - self.radius, self.y + self.radius), (self.x + self.radius, self.y + self.radius)])
-        elif self.type == "shooter":
-            pygame.draw.rect(surface, self.color, (self.x - self.radius, self.y - self.radius, self.radius*2, self.radius*2))
+        self.damage = int(stats.damage * diff_settings["damage"])
+
+    def sprite(self):
+        return get_entity_sprite(("enemy", self.type_id), self.radius, self.paint)
+
+    def paint(self, surface, x, y):
+        if self.stats.shape == SHAPE_TRIANGLE:
+            pygame.draw.polygon(surface, self.color, [(x, y - self.radius), (x - self.radius, y + self.radius), (x + self.radius, y + self.radius)])
+        elif self.stats.shape == SHAPE_SQUARE:
+            pygame.draw.rect(surface, self.color, (x - self.radius, y - self.radius, self.radius*2, self.radius*2))
         else:
-            pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-            
-        if self.type == "tank" and self.hp < 5:
-            pygame.draw.rect(surface, RED, (self.x - 20, self.y - 40, 40, 5))
-            pygame.draw.rect(surface, GREEN, (self.x - 20, self.y - 40, 40 * (self.hp/5), 5))
+            pygame.draw.circle(surface, self.color, (x, y), self.radius)
+
+    def draw(self, surface, alpha=1.0):
+        surface.blit(*sprite_blit(self, alpha))
+        self.draw_health_bar(surface, alpha)
+
+    def draw_health_bar(self, surface, alpha=1.0):
+        if self.stats.health_bar and self.hp < self.stats.hp:
+            x, y = lerp_position(self, alpha)
+            pygame.draw.rect(surface, RED, (x - 20, y - 40, 40, 5))
+            pygame.draw.rect(surface, GREEN, (x - 20, y - 40, 40 * (self.hp/self.stats.hp), 5))
 
 class Boss:
     def __init__(self, diff_multiplier, diff_settings, shared_level, is_multiplayer):
         self.x, self.y = WIDTH // 2, -100
+        self.prev_x, self.prev_y = self.x, self.y
         self.radius = 60
-        self.attack_type = random.choice(["shoot", "dash", "spawn"])
+        self.attack_type = sim_random.choice(["shoot", "dash", "spawn"])
         
         if self.attack_type == "shoot": self.color = PURPLE
         elif self.attack_type == "dash": self.color = YELLOW
         elif self.attack_type == "spawn": self.color = DARK_GREEN
         
-        base_hp = 50 + (shared_level * 10)
-        if is_multiplayer: base_hp *= 1.5 
+        base_hp = BOSS_BASE_HP + (shared_level * BOSS_HP_PER_LEVEL)
+        if is_multiplayer: base_hp *= BOSS_COOP_HP
         
         self.max_hp = int(base_hp * diff_multiplier * diff_settings["damage"])
         self.hp = self.max_hp
@@ -415,7 +1391,7 @@ class Boss:
         self.attack_timer = 120 
         self.dash_timer = 0
 
-    def update(self, players, enemy_bullets, enemies, diff_multiplier, diff_settings):
+    def update(self, players, bullets, enemies, diff_multiplier, diff_settings):
         if self.state == "dashing":
             self.dash_timer -= 1
             if self.dash_timer <= 0:
@@ -424,26 +1400,17 @@ class Boss:
         else:
             self.attack_timer -= 1
             if self.attack_timer <= 0:
-                self.perform_attack(enemy_bullets, enemies, diff_multiplier, diff_settings)
-
-        closest_player = None
-        min_dist = float('inf')
-        for p in players:
-            d = math.hypot(p.x - self.x, p.y - self.y)
-            if d < min_dist:
-                min_dist = d
-                closest_player = p
-                
+                self.perform_attack(bullets, enemies, diff_multiplier, diff_settings)
+
+        closest_player, _ = nearest_player(self.x, self.y, players)
         if closest_player:
             angle = math.atan2(closest_player.y - self.y, closest_player.x - self.x)
             self.x += math.cos(angle) * self.speed
             self.y += math.sin(angle) * self.speed
 
-    def perform_attack(self, enemy_bullets, enemies, diff_multiplier, diff_settings):
+    def perform_attack(self, bullets, enemies, diff_multiplier, diff_settings):
         if self.attack_type == "shoot":
-            for i in range(12):
-                angle = (2 * math.pi / 12) * i
-                enemy_bullets.append(Bullet(self.x, self.y, angle, owner="enemy"))
+            bullets.spawn_ring(self.x, self.y, 12)
             self.attack_timer = 150 
         elif self.attack_type == "dash":
             self.state = "dashing"
@@ -452,59 +1419,814 @@ class Boss:
             self.attack_timer = 120
         elif self.attack_type == "spawn":
             for _ in range(2):
-                minion = Enemy("fast", diff_multiplier, diff_settings)
-                minion.x = self.x + random.randint(-40, 40)
-                minion.y = self.y + random.randint(-40, 40)
+                minion = Enemy(ENEMY_FAST, diff_multiplier, diff_settings)
+                minion.x = self.x + sim_random.randint(-40, 40)
+                minion.y = self.y + sim_random.randint(-40, 40)
+                minion.prev_x, minion.prev_y = minion.x, minion.y
                 enemies.append(minion)
             self.attack_timer = 180
 
-    def draw(self, surface):
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
+    def sprite(self):
+        return get_entity_sprite(("boss", self.color, self.radius, self.state == "dashing"), self.radius, self.paint)
+
+    def paint(self, surface, x, y):
+        pygame.draw.circle(surface, self.color, (x, y), self.radius)
         if self.state == "dashing":
-            pygame.draw.circle(surface, WHITE, (int(self.x), int(self.y)), self.radius, 4)
-            
+            pygame.draw.circle(surface, WHITE, (x, y), self.radius, 4)
+
+    def draw(self, surface, alpha=1.0):
+        surface.blit(*sprite_blit(self, alpha))
+        self.draw_health_bar(surface, alpha)
+
+    def draw_health_bar(self, surface, alpha=1.0):
+        x, y = lerp_position(self, alpha)
         bar_w = 120
         health_ratio = self.hp / self.max_hp
-        pygame.draw.rect(surface, RED, (self.x - bar_w/2, self.y - self.radius - 20, bar_w, 10))
-        pygame.draw.rect(surface, GREEN, (self.x - bar_w/2, self.y - self.radius - 20, bar_w * health_ratio, 10))
-        pygame.draw.rect(surface, WHITE, (self.x - bar_w/2, self.y - self.radius - 20, bar_w, 10), 2)
+        pygame.draw.rect(surface, RED, (x - bar_w/2, y - self.radius - 20, bar_w, 10))
+        pygame.draw.rect(surface, GREEN, (x - bar_w/2, y - self.radius - 20, bar_w * health_ratio, 10))
+        pygame.draw.rect(surface, WHITE, (x - bar_w/2, y - self.radius - 20, bar_w, 10), 2)
 
 class HealthPack:
     def __init__(self):
         while True:
-            self.x = random.randint(50, WIDTH - 50)
-            self.y = random.randint(50, HEIGHT - 50)
+            self.x = sim_random.randint(50, WIDTH - 50)
+            self.y = sim_random.randint(50, HEIGHT - 50)
             if self.x < 320 and self.y < 220: continue
             if self.x > WIDTH - 220 and self.y < 220: continue
             break
+        self.prev_x, self.prev_y = self.x, self.y
         self.radius = 15 
         self.heal_amount = 25
-    def draw(self, surface):
-        rect = pygame.Rect(self.x - 12, self.y - 12, 24, 24)
+
+    def sprite(self):
+        return get_entity_sprite(("health_pack",), 12, self.paint)
+
+    def paint(self, surface, x, y):
+        rect = pygame.Rect(x - 12, y - 12, 24, 24)
         pygame.draw.rect(surface, WHITE, rect)
-        pygame.draw.line(surface, RED, (self.x, self.y - 8), (self.x, self.y + 8), 4)
-        pygame.draw.line(surface, RED, (self.x - 8, self.y), (self.x + 8, self.y), 4)
-
-# --- BRAKUJĄCA KLASA PARTICLE ---
-class Particle:
-    def __init__(self, x, y, color):
-        self.x, self.y = x, y
-        self.color = color
-        self.vx, self.vy = random.uniform(-3, 3), random.uniform(-3, 3)
-        self.radius = random.randint(3, 6)
-        self.life = random.randint(20, 40)
+        pygame.draw.line(surface, RED, (x, y - 8), (x, y + 8), 4)
+        pygame.draw.line(surface, RED, (x - 8, y), (x + 8, y), 4)
+
+    def draw(self, surface, alpha=1.0):
+        surface.blit(*sprite_blit(self))
+
+# --- SYSTEM CZĄSTECZEK ---
+# Cząsteczki trzymane w tablicach NumPy i aktualizowane jednym krokiem wektorowym.
+# Rysowanie to jedno wywołanie Surface.blits z gotowymi sprite'ami kółek
+# (po jednym na parę kolor/promień). Twardy limit usuwa najstarsze cząsteczki.
+MAX_PARTICLES = 800
+circle_sprites = {}
+
+def get_circle_sprite(color, radius):
+    key = (color, radius)
+    sprite = circle_sprites.get(key)
+    if sprite is None:
+        sprite = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        sprite = sprite.convert_alpha()
+        circle_sprites[key] = sprite
+    return sprite
+
+class ParticleSystem:
+    def __init__(self, max_particles=MAX_PARTICLES):
+        self.max_particles = max_particles
+        self.count = 0
+        self.x = np.zeros(max_particles)
+        self.y = np.zeros(max_particles)
+        self.vx = np.zeros(max_particles)
+        self.vy = np.zeros(max_particles)
+        self.life = np.zeros(max_particles, dtype=np.int32)
+        self.radius = np.zeros(max_particles, dtype=np.int32)
+        self.color = np.zeros(max_particles, dtype=np.int32)
+        self.moved = np.zeros(max_particles, dtype=bool)
+        self.palette = []
+        self.palette_ids = {}
+        self.high_water = 0
+
+    def _columns(self):
+        return (self.x, self.y, self.vx, self.vy, self.life, self.radius, self.color, self.moved)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, x, y, color, amount):
+        amount = min(amount, self.max_particles)
+        overflow = self.count + amount - self.max_particles
+        if overflow > 0:
+            # Tablice są w kolejności powstania, więc najstarsze cząsteczki są na początku
+            keep = self.count - overflow
+            for column in self._columns(): column[:keep] = column[overflow:self.count]
+            self.count = keep
+        color_id = self.palette_ids.get(color)
+        if color_id is None:
+            color_id = self.palette_ids[color] = len(self.palette)
+            self.palette.append(color)
+        for i in range(self.count, self.count + amount):
+            self.vx[i], self.vy[i] = sim_random.uniform(-3, 3), sim_random.uniform(-3, 3)
+            self.radius[i] = sim_random.randint(3, 6)
+            self.life[i] = sim_random.randint(20, 40)
+        end = self.count + amount
+        self.x[self.count:end], self.y[self.count:end] = x, y
+        self.color[self.count:end] = color_id
+        self.moved[self.count:end] = False
+        self.count = end
+        if end > self.high_water: self.high_water = end
+
+    def stats(self):
+        return {"live": self.count, "free": self.max_particles - self.count, "high_water": self.high_water}
+
     def update(self):
-        self.x += self.vx; self.y += self.vy; self.life -= 1
-        if self.life % 5 == 0 and self.radius > 0: self.radius -= 1
-    def draw(self, surface):
-        if self.radius > 0: pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
+        n = self.count
+        if n == 0: return
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.moved[:n] = True
+        life, radius = self.life[:n], self.radius[:n]
+        life -= 1
+        radius -= ((life % 5 == 0) & (radius > 0))
+        keep = np.flatnonzero(life > 0)
+        m = len(keep)
+        if m < n:
+            for column in self._columns(): column[:m] = column[keep]
+            self.count = m
+
+    def draw(self, surface, alpha=1.0, limit=MAX_PARTICLES, view=None, point_radius=0):
+        # limit - rysujemy tylko najnowsze cząsteczki (symulacja liczy wszystkie)
+        # Zwraca (narysowane sprite'y, odrzucone poza widokiem, punkty LOD)
+        n = self.count
+        if n == 0: return 0, 0, 0
+        view = view or surface.get_rect()
+        visible = np.flatnonzero(self.radius[max(0, n - limit):n] > 0) + max(0, n - limit)
+        back = (1.0 - alpha) * self.moved[visible]
+        xs = (self.x[visible] - self.vx[visible] * back).astype(np.int32)
+        ys = (self.y[visible] - self.vy[visible] * back).astype(np.int32)
+        radius, color = self.radius[visible], self.color[visible]
+        keep = in_view(view, xs, ys, radius)
+        culled = len(visible) - int(np.count_nonzero(keep))
+        dot = keep & (radius <= point_radius)
+        points = int(np.count_nonzero(dot))
+        if points:
+            draw_points(surface, xs[dot], ys[dot], np.array([surface.map_rgb(c) for c in self.palette], dtype=np.int64)[color[dot]])
+            keep &= ~dot
+        palette = self.palette
+        blits = [(get_circle_sprite(palette[c], r), (x - r, y - r))
+                 for x, y, r, c in zip(xs[keep].tolist(), ys[keep].tolist(), radius[keep].tolist(), color[keep].tolist())]
+        surface.blits(blits, doreturn=False)
+        return len(blits), culled, points
+
+# --- JAKOŚĆ GRAFIKI (AUTOMATYCZNA) ---
+# Regulator patrzy na czas pracy ostatnich QUALITY_WINDOW klatek (bez czekania w clock.tick).
+# Gdy 90. percentyl przekracza budżet klatki, schodzi poziom niżej; wraca wyżej dopiero, gdy
+# spadnie poniżej QUALITY_RAISE_AT budżetu (histereza), a po każdej zmianie odczekuje
+# QUALITY_COOLDOWN klatek. Poziomy zmieniają tylko rysowanie - symulacja (i powtórki) bez zmian.
+FRAME_BUDGET_MS = 1000 / 60
+QUALITY_WINDOW = 60
+QUALITY_RAISE_AT = 0.6
+QUALITY_COOLDOWN = 120
+QUALITY_LEVELS = [
+    {"name": "WYSOKA", "particles": MAX_PARTICLES, "trails": "full", "stars": 3, "outlines": True, "shake": True, "points": 0},
+    {"name": "ŚREDNIA", "particles": 400, "trails": "short", "stars": 2, "outlines": True, "shake": True, "points": 1},
+    {"name": "NISKA", "particles": 200, "trails": "short", "stars": 1, "outlines": False, "shake": False, "points": 2},
+    {"name": "MINIMALNA", "particles": 80, "trails": "off", "stars": 0, "outlines": False, "shake": False, "points": 3},
+]
+
+class QualityGovernor:
+    def __init__(self, budget_ms=FRAME_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.level = 0
+        self.samples = deque(maxlen=QUALITY_WINDOW)
+        self.cooldown = 0
+        self.events = []
+
+    @property
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+
+    def update(self, frame_ms):
+        self.samples.append(frame_ms)
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+        if len(self.samples) < QUALITY_WINDOW: return
+        p90 = sorted(self.samples)[int(QUALITY_WINDOW * 0.9)]
+        if p90 > self.budget_ms and self.level < len(QUALITY_LEVELS) - 1: self.change(1, p90)
+        elif p90 < self.budget_ms * QUALITY_RAISE_AT and self.level > 0: self.change(-1, p90)
+
+    def change(self, step, p90):
+        self.level += step
+        self.samples.clear()
+        self.cooldown = QUALITY_COOLDOWN
+        # Zdarzenie dla HUD (i każdego, kto chce wiedzieć): nowy poziom, kierunek i zmierzony czas klatki
+        self.events.append({"level": self.level, "name": self.settings["name"], "direction": step, "frame_ms": p90})
+
+    def poll_events(self):
+        events, self.events = self.events, []
+        return events
+
+# --- SYMULACJA (STAŁY KROK CZASOWY) ---
+# Cała logika rozgrywki działa w stałych tickach SIM_HZ, niezależnie od tego, ile klatek
+# narysuje ekran. Symulacja ma własny generator liczb losowych (sim_random), więc
+# rysowanie (trzęsienie ekranu, tło) nie zmienia jej przebiegu - ten sam ciąg wejść daje
+# identyczny wynik przy każdej częstotliwości odświeżania.
+SIM_HZ = 60
+SIM_DT = 1.0 / SIM_HZ
+MAX_TICKS_PER_FRAME = 5
+RENDER_FPS_CAP = 144
+
+class GameSession:
+    def __init__(self, difficulty, is_multiplayer, p1_ship, p2_ship, save_data, seed=None, aim_priority="nearest"):
+        # Ziarno jest zawsze znane, żeby rozgrywkę dało się odtworzyć z powtórki
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        sim_random.seed(self.seed)
+        self.difficulty = difficulty
+        self.is_multiplayer = is_multiplayer
+        self.p1_ship, self.p2_ship, self.aim_priority = p1_ship, p2_ship, aim_priority
+        self.upgrades = dict(save_data["upgrades"])
+        self.recorder = None
+        self.started = time.strftime("%Y%m%d_%H%M%S")
+        self.tick = 0
+        self.outcome = None
+        self.endless_mode = False
+
+        self.players = EntityList()
+        if is_multiplayer:
+            self.players.append(Player(1, WIDTH // 2 - 50, HEIGHT // 2, p1_ship, save_data))
+            self.players.append(Player(2, WIDTH // 2 + 50, HEIGHT // 2, p2_ship, save_data))
+            self.players.items[1].aim_priority = aim_priority
+        else:
+            self.players.append(Player(1, WIDTH // 2, HEIGHT // 2, p1_ship, save_data))
+        self.bullets = BulletPool()
+        self.enemies = EntityList()
+        self.bosses = EntityList()
+        self.health_packs = EntityList()
+        self.power_ups = EntityList()
+        self.particles = ParticleSystem()
+
+        self.player_grid = SpatialGrid()
+        self.enemy_grid = SpatialGrid()
+        self.boss_grid = SpatialGrid()
+
+        self.shared_score = 0
+        self.shared_exp = 0 
+        self.shared_level = save_data["upgrades"]["start_lvl"] 
+        self.points_to_next_level = 10 * self.shared_level
+        self.next_level_score = 10 * self.shared_level 
+        self.combo_multiplier = 1.0
+        self.combo_timer = 0
+
+        self.enemy_spawn_timer = 0; self.health_spawn_timer = 0; self.powerup_spawn_timer = 0
+        self.next_health_spawn = sim_random.randint(300, 900)
+        self.next_powerup_spawn = sim_random.randint(600, 1200)
+        self.next_boss_score = 50 * self.shared_level 
+        self.boss_kill_ticks = []
+        # Ostatnie rysowanie: (sprite'y, odrzucone poza widokiem, punkty LOD) - dla profilera
+        self.draw_counts = (0, 0, 0)
+        self.screen_shake_frames = 0
+
+    def step(self, inputs):
+        # inputs: słownik p_id -> PlayerInput (brak wpisu = gracz stoi w miejscu)
+        profiler.lap("input")
+        if self.recorder: self.recorder.record(self.tick, inputs)
+        self.tick += 1
+        for group in (self.players, self.enemies, self.bosses):
+            for entity in group: entity.prev_x, entity.prev_y = entity.x, entity.y
+
+        diff_settings = DIFFICULTY_SETTINGS[self.difficulty]
+        diff_multiplier = 1 + (self.shared_level * 0.1) + (self.shared_exp / 500)
+
+        if self.screen_shake_frames > 0: self.screen_shake_frames -= 1
+        
+        if self.combo_timer > 0:
+            self.combo_timer -= 1
+            if self.combo_timer <= 0: self.combo_multiplier = 1.0 
+
+        while self.shared_exp >= self.next_level_score:
+            self.shared_level += 1
+            self.points_to_next_level += LEVEL_CURVE_STEP
+            self.next_level_score += self.points_to_next_level
+            for p in self.players: p.level = self.shared_level
+
+        if self.shared_level >= 10 and not self.endless_mode:
+            play_sound(victory_sound)
+            self.outcome = "VICTORY"
+            
+        # Siatki wrogów i bossów służą autocelowaniu i kolizjom pocisków; nowo powstałe
+        # encje są do nich dopisywane przy spawnie
+        self.boss_grid.build(self.bosses)
+        self.enemy_grid.build(self.enemies)
+        for p in self.players:
+            p.update(self.enemy_grid, self.boss_grid, inputs.get(p.p_id, IDLE_INPUT))
+            p.shoot_timer += 1
+            if p.shoot_timer >= p.shoot_delay:
+                p.shoot_timer = 0
+                b_type = p.weapon_type
+                num_barrels, angle_step, start_angle = p.barrel_layout(BULLET_STATS[b_type])
+                for i in range(num_barrels):
+                    bullet_angle = start_angle + (i * angle_step)
+                    spawn_x = p.x + math.cos(bullet_angle) * p.barrel_length
+                    spawn_y = p.y + math.sin(bullet_angle) * p.barrel_length
+                    self.bullets.spawn(spawn_x, spawn_y, bullet_angle, OWNER_PLAYER, b_type)
+        profiler.lap("players")
+
+        self.bullets.update()
+        self.bullets.cull_off_screen()
+        profiler.lap("bullets")
+            
+        self.player_grid.build(self.players)
+        for b_idx, bx, by, br, _ in self.bullets.live(OWNER_ENEMY):
+            for p in self.player_grid.query(bx, by, br):
+                if p.dead: continue
+                if check_collision(bx, by, br, p.x, p.y, p.radius):
+                    self.bullets.kill(b_idx)
+                    if p.take_damage(15): 
+                        self.screen_shake_frames = 10
+                        self.shared_score = max(0, self.shared_score - 2) 
+                        play_sound(error_sound)
+                    if p.health <= 0 and not p.dead:
+                        self.particles.emit(p.x, p.y, p.color, 30)
+                        self.players.kill(p)
+                    break
+        profiler.lap("collisions")
+
+        self.particles.update()
+        profiler.lap("particles")
+
+        if self.shared_exp >= self.next_boss_score and len(self.bosses) == 0:
+            boss = Boss(diff_multiplier, diff_settings, self.shared_level, self.is_multiplayer)
+            boss.spawn_tick = self.tick
+            self.bosses.append(boss)
+            self.boss_grid.insert(boss, boss.x, boss.y, boss.radius)
+            self.next_boss_score += 50 
+            
+        if len(self.bosses) == 0:
+            self.enemy_spawn_timer += 1
+            base_spawn_rate = max(10, 60 - (self.shared_level * 3))
+            spawn_rate = base_spawn_rate * diff_settings["spawn_rate"]
+            if self.enemy_spawn_timer >= spawn_rate:
+                chosen_type = sim_random.choices(list(ENEMY_SPAWN_WEIGHTS), weights=list(ENEMY_SPAWN_WEIGHTS.values()), k=1)[0]
+                enemy = Enemy(ENEMY_TYPE_IDS[chosen_type], diff_multiplier, diff_settings)
+                self.enemies.append(enemy)
+                self.enemy_grid.insert(enemy, enemy.x, enemy.y, enemy.radius)
+                self.enemy_spawn_timer = 0
+
+        self.health_spawn_timer += 1
+        if self.health_spawn_timer >= self.next_health_spawn:
+            if len(self.health_packs) < 3: self.health_packs.append(HealthPack())
+            self.health_spawn_timer = 0
+            self.next_health_spawn = sim_random.randint(300, 900)
+            
+        self.powerup_spawn_timer += 1
+        if self.powerup_spawn_timer >= self.next_powerup_spawn:
+            if len(self.power_ups) < 2: self.power_ups.append(PowerUp())
+            self.powerup_spawn_timer = 0
+            self.next_powerup_spawn = sim_random.randint(600, 1200)
+        profiler.lap("spawn")
+
+        self.player_grid.build(self.players)
+        for pack in self.health_packs:
+            for p in self.player_grid.query(pack.x, pack.y, pack.radius):
+                if check_collision(p.x, p.y, p.radius, pack.x, pack.y, pack.radius):
+                    self.health_packs.kill(pack)
+                    p.health += pack.heal_amount
+                    if p.health > p.max_health: p.health = p.max_health
+                    play_sound(powerup_sound)
+                    break 
+                    
+        for pup in self.power_ups:
+            for p in self.player_grid.query(pup.x, pup.y, pup.radius):
+                if check_collision(p.x, p.y, p.radius, pup.x, pup.y, pup.radius):
+                    self.power_ups.kill(pup)
+                    effect = pup.stats.effect
+                    if effect == EFFECT_SHIELD: p.has_shield = True
+                    elif effect == EFFECT_RAPID_FIRE: p.rapid_fire_timer = pup.stats.duration
+                    elif effect == EFFECT_WEAPON: p.weapon_type = pup.stats.weapon; p.weapon_timer = pup.stats.duration
+                    play_sound(powerup_sound)
+                    break 
+
+        for b_idx, bx, by, br, b_type in self.bullets.live(OWNER_PLAYER):
+            hit_something = False
+            enemies_hit = self.bullets.hits[b_idx]
+            for boss in self.boss_grid.query(bx, by, br):
+                if boss.dead: continue
+                if check_collision(bx, by, br, boss.x, boss.y, boss.radius):
+                    if b_type != BULLET_PIERCE: hit_something = True
+                    elif boss in enemies_hit: continue 
+                    if b_type == BULLET_PIERCE: enemies_hit.append(boss)
+                    
+                    boss.hp -= 1
+                    if boss.hp <= 0:
+                        if not boss.dead:
+                            play_sound(boss_death_sound)
+                            self.screen_shake_frames = 20 
+                            self.particles.emit(boss.x, boss.y, boss.color, 50)
+                            self.bosses.kill(boss)
+                            self.boss_kill_ticks.append(self.tick - boss.spawn_tick)
+                            self.shared_score += int(10 * self.combo_multiplier)
+                            self.shared_exp += 10
+                            self.combo_multiplier = min(4.0, self.combo_multiplier + 1.0)
+                            self.combo_timer = 180
+                    break
+                    
+            if hit_something:
+                self.bullets.kill(b_idx)
+                continue 
+
+            for enemy in self.enemy_grid.query(bx, by, br):
+                if enemy.dead: continue
+                if check_collision(bx, by, br, enemy.x, enemy.y, enemy.radius):
+                    if b_type != BULLET_PIERCE: hit_something = True
+                    elif enemy in enemies_hit: continue
+                    if b_type == BULLET_PIERCE: enemies_hit.append(enemy)
+                    
+                    enemy.hp -= 1
+                    if enemy.hp <= 0:
+                        if not enemy.dead:
+                            if enemy.stats.death_ring: self.bullets.spawn_ring(enemy.x, enemy.y, enemy.stats.death_ring)
+                                    
+                            self.particles.emit(enemy.x, enemy.y, enemy.color, 15)
+                            self.enemies.kill(enemy)
+                            self.shared_score += int(1 * self.combo_multiplier)
+                            self.shared_exp += 1
+                            self.combo_multiplier = min(4.0, self.combo_multiplier + 0.1)
+                            self.combo_timer = 180
+                    break
+            if hit_something: self.bullets.kill(b_idx)
+
+        for p in self.players:
+            for boss in self.boss_grid.query(p.x, p.y, p.radius):
+                if boss.dead: continue
+                if check_collision(p.x, p.y, p.radius, boss.x, boss.y, boss.radius):
+                    if p.take_damage(boss.damage):
+                        self.screen_shake_frames = 15
+                        self.shared_score = max(0, self.shared_score - 5)
+                        self.combo_multiplier = 1.0
+                        play_sound(error_sound)
+                        angle = math.atan2(p.y - boss.y, p.x - boss.x)
+                        p.x += math.cos(angle) * 80 
+                        p.y += math.sin(angle) * 80
+            
+            for enemy in self.enemy_grid.query(p.x, p.y, p.radius):
+                if enemy.dead: continue
+                if check_collision(p.x, p.y, p.radius, enemy.x, enemy.y, enemy.radius):
+                    if enemy.stats.death_ring: self.bullets.spawn_ring(enemy.x, enemy.y, enemy.stats.death_ring)
+                    self.enemies.kill(enemy)
+                    
+                    if p.take_damage(enemy.damage): 
+                        self.screen_shake_frames = 10
+                        self.shared_score = max(0, self.shared_score - 3)
+                        self.combo_multiplier = 1.0
+                        play_sound(error_sound)
+
+            if p.health <= 0 and not p.dead:
+                self.particles.emit(p.x, p.y, p.color, 30)
+                self.players.kill(p)
+        profiler.lap("collisions")
+
+        for boss in self.bosses: boss.update(self.players, self.bullets, self.enemies, diff_multiplier, diff_settings)
+        steer_enemies(self.enemies, self.players, self.bullets)
+        profiler.lap("enemies")
+        
+        self.bullets.compact()
+        for group in (self.players, self.enemies, self.bosses, self.health_packs, self.power_ups): group.compact()
+        profiler.lap("compact")
+
+        if len(self.players) == 0:
+            self.outcome = "GAME_OVER"
+
+    def draw(self, surface, alpha=1.0, trail_quality="full", quality=QUALITY_LEVELS[0], view=None):
+        # alpha - ułamek drogi do następnego ticku (interpolacja pozycji przy szybszym ekranie)
+        # view - widoczny fragment świata (ekran przesunięty o wstrząs); poza nim nic nie rysujemy
+        view = view or surface.get_rect()
+        pickups, blits = cull_entities(self.power_ups, view)
+        packs, pack_blits = cull_entities(self.health_packs, view)
+        surface.blits(blits + pack_blits, False)
+        drawn = len(blits) + len(pack_blits)
+        culled = len(self.power_ups) + len(self.health_packs) - len(pickups) - len(packs)
+        profiler.lap("draw_pickups")
+        particle_counts = self.particles.draw(surface, alpha, quality["particles"], view, quality["points"])
+        profiler.lap("draw_particles")
+        for group in (self.bosses, self.enemies):
+            visible, blits = cull_entities(group, view, alpha, HEALTH_BAR_MARGIN)
+            surface.blits(blits, False)
+            for entity in visible: entity.draw_health_bar(surface, alpha)
+            drawn, culled = drawn + len(blits), culled + len(group) - len(visible)
+        profiler.lap("draw_enemies")
+        bullet_counts = self.bullets.draw(surface, alpha, trail_quality, view, quality["points"])
+        profiler.lap("draw_bullets")
+        self.draw_counts = (drawn + particle_counts[0] + bullet_counts[0], culled + particle_counts[1] + bullet_counts[1],
+                            particle_counts[2] + bullet_counts[2])
+        for p in self.players: p.draw(surface, alpha, quality["outlines"])
+        profiler.lap("draw_players")
+
+    def entity_counts(self):
+        return (len(self.enemies), len(self.bosses), len(self.bullets), len(self.particles), len(self.health_packs) + len(self.power_ups)) + self.draw_counts
+
+    def pool_stats(self):
+        return {"bullets": self.bullets.stats(), "particles": self.particles.stats()}
+
+# --- TRYB HEADLESS (POMIAR SYMULACJI) ---
+# Gra bez okna: sterowanie daje bot, losowość jest zasiana, mierzymy tylko GameSession.step().
+# Te same parametry = ta sama rozgrywka, więc wyniki można porównywać między zmianami w kodzie.
+class BotPolicy:
+    # Ucieka od najbliższego zagrożenia, w spokoju wraca w stronę środka i celuje w najbliższego wroga
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def __call__(self, session):
+        inputs = {}
+        for p in session.players:
+            threat, threat_dist = None, 150
+            target, target_dist = None, float('inf')
+            for group in (session.enemies, session.bosses):
+                for e in group:
+                    dist = math.hypot(e.x - p.x, e.y - p.y) - e.radius
+                    if dist < threat_dist: threat, threat_dist = e, dist
+                    if dist < target_dist: target, target_dist = e, dist
+            if threat:
+                dx, dy = p.x - threat.x, p.y - threat.y
+            else:
+                dx = WIDTH / 2 - p.x + self.rng.uniform(-100, 100)
+                dy = HEIGHT / 2 - p.y + self.rng.uniform(-100, 100)
+            aim_x, aim_y = (int(target.x), int(target.y)) if target else (WIDTH // 2, HEIGHT // 2)
+            inputs[p.p_id] = PlayerInput(dy < -10, dy > 10, dx < -10, dx > 10, threat_dist < 40, aim_x, aim_y)
+        return inputs
+
+class RandomWalkPolicy:
+    # Co pół sekundy losuje nowy kierunek ruchu i celowania - prosty, powtarzalny skrypt
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.current = {}
+
+    def __call__(self, session):
+        if session.tick % 30 == 0:
+            self.current = {p_id: PlayerInput(*(self.rng.random() < 0.3 for _ in range(4)), self.rng.random() < 0.05,
+                                              self.rng.randint(0, WIDTH), self.rng.randint(0, HEIGHT)) for p_id in (1, 2)}
+        return self.current
+
+HEADLESS_POLICIES = {"bot": BotPolicy, "random": RandomWalkPolicy}
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def run_headless(minutes=1.0, difficulties=("easy", "normal", "hard"), is_multiplayer=False, start_level=1, seed=0, policy="bot", report_path=None, aim_priority="nearest"):
+    global sound_enabled
+    sound_enabled = False
+    save_data = {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": start_level}}
+    total_ticks = int(minutes * 60 * SIM_HZ)
+    report = []
+
+    for difficulty in difficulties:
+        controller = HEADLESS_POLICIES[policy](seed)
+        run_seed, restarts = seed, 0
+        session = GameSession(difficulty, is_multiplayer, "balanced", "balanced", save_data, seed=run_seed, aim_priority=aim_priority)
+        all_times, by_level = [], {}
+        gc_start = gc.get_stats()[0]["collections"]
+
+        for _ in range(total_ticks):
+            inputs = controller(session)
+            level = session.shared_level
+            start = time.perf_counter()
+            session.step(inputs)
+            elapsed = (time.perf_counter() - start) * 1000
+            all_times.append(elapsed)
+
+            stats = by_level.setdefault(level, {"times": [], "enemies": [], "bullets": [], "particles": []})
+            stats["times"].append(elapsed)
+            stats["enemies"].append(len(session.enemies) + len(session.bosses))
+            stats["bullets"].append(len(session.bullets))
+            stats["particles"].append(len(session.particles))
+
+            if session.outcome == "VICTORY":
+                session.endless_mode = True; session.outcome = None
+            elif session.outcome == "GAME_OVER":
+                run_seed += 1; restarts += 1
+                session = GameSession(difficulty, is_multiplayer, "balanced", "balanced", save_data, seed=run_seed, aim_priority=aim_priority)
+
+        gc_gen0 = gc.get_stats()[0]["collections"] - gc_start
+        all_times.sort()
+        entry = {"difficulty": difficulty, "ticks": total_ticks, "restarts": restarts, "gc_gen0": gc_gen0, "pools": session.pool_stats(),
+                 "ticks_per_sec": total_ticks / (sum(all_times) / 1000),
+                 "p50_ms": percentile(all_times, 0.5), "p99_ms": percentile(all_times, 0.99), "levels": []}
+        print(f"[{DIFFICULTY_SETTINGS[difficulty]['name']}] {total_ticks} ticków, {entry['ticks_per_sec']:.0f} ticków/s, "
+              f"p50 {entry['p50_ms']:.3f} ms, p99 {entry['p99_ms']:.3f} ms, restartów: {restarts}, kolekcji GC gen0: {gc_gen0}")
+        print("  poziom  ticki    p50 ms   p99 ms   wrogowie śr/max   pociski śr/max   cząsteczki śr/max")
+        for level in sorted(by_level):
+            stats = by_level[level]
+            times = sorted(stats["times"])
+            row = {"level": level, "ticks": len(times), "p50_ms": percentile(times, 0.5), "p99_ms": percentile(times, 0.99)}
+            for key in ("enemies", "bullets", "particles"):
+                row[key + "_avg"] = sum(stats[key]) / len(stats[key])
+                row[key + "_max"] = max(stats[key])
+            entry["levels"].append(row)
+            print(f"  {level:>6} {row['ticks']:>6} {row['p50_ms']:>9.3f} {row['p99_ms']:>8.3f} "
+                  f"{row['enemies_avg']:>12.1f}/{row['enemies_max']:<4} {row['bullets_avg']:>11.1f}/{row['bullets_max']:<4} "
+                  f"{row['particles_avg']:>13.1f}/{row['particles_max']}")
+        report.append(entry)
+
+    if report_path: save_json(report_path, report)
+    return report
+
+# --- POWTÓRKI (REPLAY) ---
+# Plik: nagłówek (ziarno i ustawienia sesji) + skompresowany zlib strumień rekordów. Rekord
+# to typ, odstęp w tickach od poprzedniego rekordu (varint) i dane. Wejście gracza zapisujemy
+# tylko wtedy, gdy się zmieni (przyciski w jednym bajcie, celownik tylko gdy się ruszył).
+# Na końcu liczba ticków i skrót stanu gry, żeby odtwarzanie mogło sprawdzić zgodność.
+# Wersja 2: poziom startowy i bonus HP jako I (ulepszenia w sklepie nie mają limitu)
+REPLAY_MAGIC = b"KSR2"
+REPLAY_DIR = "replays"
+REPLAY_KEEP = 20
+REPLAY_HEADER = struct.Struct("<4sIBBBBBIIHH")
+REPLAY_HEADERS = {b"KSR1": struct.Struct("<4sIBBBBBHHHH"), REPLAY_MAGIC: REPLAY_HEADER}
+REC_INPUT, REC_RESIZE, REC_END = 0, 1, 2
+INPUT_BUTTONS = ("up", "down", "left", "right", "dash")
+AIM_CHANGED = 0x80
+AIM_STRUCT = struct.Struct("<hh")
+SIZE_STRUCT = struct.Struct("<HH")
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80: return value, pos
+
+def state_digest(session):
+    state = (session.tick, session.shared_score, session.shared_exp, session.shared_level, session.outcome,
+             [(p.p_id, p.x, p.y, p.health) for p in session.players], [(e.x, e.y, e.hp) for e in session.enemies],
+             [(b.x, b.y, b.hp) for b in session.bosses], len(session.bullets), len(session.particles))
+    return hashlib.sha1(repr(state).encode("utf-8")).digest()
+
+class ReplayRecorder:
+    def __init__(self, session):
+        self.header = REPLAY_HEADER.pack(REPLAY_MAGIC, session.seed, list(DIFFICULTY_SETTINGS).index(session.difficulty),
+                                         int(session.is_multiplayer), SHIP_TYPES.index(session.p1_ship), SHIP_TYPES.index(session.p2_ship),
+                                         AIM_PRIORITIES.index(session.aim_priority), session.upgrades["start_lvl"],
+                                         session.upgrades["hp_bonus"], WIDTH, HEIGHT)
+        self.p_ids = (1, 2) if session.is_multiplayer else (1,)
+        self.body = bytearray()
+        self.last_tick = 0
+        self.last_inputs = {}
+
+    def mark(self, tick, kind):
+        self.body.append(kind)
+        write_varint(self.body, tick - self.last_tick)
+        self.last_tick = tick
+
+    def record(self, tick, inputs):
+        for p_id in self.p_ids:
+            control = inputs.get(p_id, IDLE_INPUT)
+            last = self.last_inputs.get(p_id, IDLE_INPUT)
+            if control == last: continue
+            buttons = sum(1 << i for i, name in enumerate(INPUT_BUTTONS) if getattr(control, name))
+            aim_changed = (control.aim_x, control.aim_y) != (last.aim_x, last.aim_y)
+            self.mark(tick, REC_INPUT | p_id << 4)
+            self.body.append(buttons | (AIM_CHANGED if aim_changed else 0))
+            if aim_changed: self.body += AIM_STRUCT.pack(control.aim_x, control.aim_y)
+            self.last_inputs[p_id] = control
+
+    def resize(self, tick, width, height):
+        self.mark(tick, REC_RESIZE)
+        self.body += SIZE_STRUCT.pack(width, height)
+
+    def finish(self, session):
+        body = bytearray(self.body)
+        body.append(REC_END)
+        write_varint(body, session.tick - self.last_tick)
+        body += state_digest(session)
+        return self.header + zlib.compress(bytes(body), 9)
+
+def save_replay(session):
+    if session.recorder is None or session.tick == 0: return
+    filename = os.path.join(REPLAY_DIR, f"{session.started}_{session.seed}.ksr")
+    storage.write_bytes(filename, session.recorder.finish(session))
+    # Sprzątanie starych powtórek - zablokowany albo już usunięty plik nie może przerwać gry
+    try:
+        if not os.path.isdir(REPLAY_DIR): return
+        old = sorted(name for name in os.listdir(REPLAY_DIR) if name.endswith(".ksr") and name != os.path.basename(filename))
+    except OSError as error:
+        print(f"Nie można przejrzeć {REPLAY_DIR}: {error}", file=sys.stderr)
+        return
+    for name in old[:max(0, len(old) - REPLAY_KEEP + 1)]:
+        try: os.remove(os.path.join(REPLAY_DIR, name))
+        except OSError as error: print(f"Nie można usunąć powtórki {name}: {error}", file=sys.stderr)
+
+class Replay:
+    # Odtwarzanie: zachowuje się jak polityka z trybu headless - dla sesji zwraca wejścia na tick
+    def __init__(self, data):
+        header_struct = REPLAY_HEADERS.get(data[:4])
+        if header_struct is None: raise ValueError("to nie jest plik powtórki")
+        header, body = data[:header_struct.size], zlib.decompress(data[header_struct.size:])
+        (_, self.seed, difficulty, coop, ship1, ship2, aim, start_lvl, hp_bonus, self.width, self.height) = header_struct.unpack(header)
+        self.difficulty = list(DIFFICULTY_SETTINGS)[difficulty]
+        self.is_multiplayer = bool(coop)
+        self.ships = (SHIP_TYPES[ship1], SHIP_TYPES[ship2])
+        self.aim_priority = AIM_PRIORITIES[aim]
+        self.upgrades = {"hp_bonus": hp_bonus, "start_lvl": start_lvl}
+        self.events = {}
+        pos, tick = 0, 0
+        while True:
+            kind = body[pos]
+            gap, pos = read_varint(body, pos + 1)
+            tick += gap
+            if kind == REC_END: break
+            if kind == REC_RESIZE:
+                self.events.setdefault(tick, []).append(("resize", SIZE_STRUCT.unpack_from(body, pos)))
+                pos += SIZE_STRUCT.size
+            else:
+                buttons = body[pos]
+                pos += 1
+                aim = None
+                if buttons & AIM_CHANGED:
+                    aim = AIM_STRUCT.unpack_from(body, pos)
+                    pos += AIM_STRUCT.size
+                self.events.setdefault(tick, []).append(("input", kind >> 4, buttons, aim))
+        self.total_ticks = tick
+        self.digest = bytes(body[pos:pos + 20])
+        self.current = {}
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as file: return cls(file.read())
+
+    def new_session(self):
+        global WIDTH, HEIGHT
+        WIDTH, HEIGHT = self.width, self.height
+        self.current = {}
+        return GameSession(self.difficulty, self.is_multiplayer, *self.ships, {"coins": 0, "upgrades": dict(self.upgrades)},
+                           seed=self.seed, aim_priority=self.aim_priority)
+
+    def __call__(self, session):
+        global WIDTH, HEIGHT
+        for event in self.events.get(session.tick, ()):
+            if event[0] == "resize":
+                WIDTH, HEIGHT = event[1]
+                continue
+            _, p_id, buttons, aim = event
+            last = self.current.get(p_id, IDLE_INPUT)
+            aim_x, aim_y = aim if aim else (last.aim_x, last.aim_y)
+            self.current[p_id] = PlayerInput(*(bool(buttons & 1 << i) for i in range(len(INPUT_BUTTONS))), aim_x, aim_y)
+        return self.current
+
+def run_replay(filename, realtime=False):
+    global sound_enabled, screen
+    replay = Replay.load(filename)
+    session = replay.new_session()
+    if realtime:
+        parallax_bg = ParallaxBackground(WIDTH, HEIGHT)
+        screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
+        hud_font = pygame.font.SysFont(None, 28)
+        sound_bank.start()
+    else:
+        sound_enabled = False
+    times = []
+    while session.tick < replay.total_ticks:
+        inputs = replay(session)
+        # Nagranie trwa dalej po zwycięstwie = gracz wybrał tryb endless
+        if session.outcome == "VICTORY": session.endless_mode = True; session.outcome = None
+        start = time.perf_counter()
+        session.step(inputs)
+        times.append((time.perf_counter() - start) * 1000)
+        if realtime:
+            if any(event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE) for event in pygame.event.get()): break
+            if screen.get_size() != (WIDTH, HEIGHT):
+                screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
+                parallax_bg.resize(WIDTH, HEIGHT)
+            parallax_bg.update_and_draw(screen)
+            session.draw(screen)
+            hud = render_text(hud_font, f"POWTÓRKA  tick {session.tick}/{replay.total_ticks}  Punkty: {session.shared_score}  Poziom: {session.shared_level}", WHITE)
+            screen.blit(hud, (10, 10))
+            pygame.display.flip()
+            sound_bank.update()
+            clock.tick(SIM_HZ)
+
+    times.sort()
+    finished = session.tick == replay.total_ticks
+    verdict = ("ZGODNA" if state_digest(session) == replay.digest else "NIEZGODNA") if finished else "PRZERWANA"
+    print(f"Powtórka {filename}: {session.tick}/{replay.total_ticks} ticków, wynik {session.shared_score}, poziom {session.shared_level}, "
+          f"stan końcowy: {verdict}")
+    if times:
+        print(f"  {len(times) / (sum(times) / 1000):.0f} ticków/s, p50 {percentile(times, 0.5):.3f} ms, p99 {percentile(times, 0.99):.3f} ms, "
+              f"max {times[-1]:.3f} ms")
+    return verdict == "ZGODNA"
 
 # --- GŁÓWNA PĘTLA ---
-def main():
+def main(startup_probe=False, render_fps=RENDER_FPS_CAP, profile=False):
     global WIDTH, HEIGHT, screen, sound_enabled, is_fullscreen
     
+    sound_bank.start()
     parallax_bg = ParallaxBackground(WIDTH, HEIGHT)
-    game_surface = pygame.Surface((WIDTH, HEIGHT)) 
+    pause_overlay = None
     
     save_data = load_json("save_data.json", {"coins": 0, "upgrades": {"hp_bonus": 0, "start_lvl": 1}})
     
@@ -512,33 +2234,15 @@ def main():
     current_difficulty = "normal" 
     is_multiplayer = False
     
-    players = []
-    bullets = []
-    enemy_bullets = [] 
-    enemies = []
-    bosses = [] 
-    health_packs = []
-    power_ups = []
-    particles = []
-    
-    shared_score = 0 
-    shared_exp = 0    
-    shared_level = 1
-    combo_multiplier = 1.0
-    combo_timer = 0
-    endless_mode = False 
+    session = None
     
     p1_ship = "balanced"
     p2_ship = "balanced"
-    
-    enemy_spawn_timer = 0
-    health_spawn_timer = 0
-    powerup_spawn_timer = 0
-    next_health_spawn = random.randint(300, 900)
-    next_powerup_spawn = random.randint(600, 1200)
-    next_boss_score = 50 
-    
-    screen_shake_frames = 0
+    p2_aim = "nearest"
+    # Ślady pocisków: wybór gracza i jakość faktycznie rysowana (regulator może ją obniżyć)
+    trail_setting = trail_quality = "full"
+    governor = QualityGovernor()
+    quality_notice, quality_notice_until = None, 0.0
     player_name = ""
     
     font = pygame.font.SysFont(None, 36)
@@ -548,40 +2252,32 @@ def main():
     
     menu_btns, shop_btns, lb_btns, end_btns, pause_btns, ship_btns = {}, {}, {}, {}, {}, {}
     
-    leaderboard = load_leaderboard()
-    high_score = leaderboard[0]["score"] if len(leaderboard) > 0 else 0
+    leaderboard, lb_page, lb_pages = [], 0, 1
+    lb_filters = {"difficulty": None, "mode": None, "ship": None}
+    high_score = leaderboard_db.best()
     
     if sound_enabled: bg_music.play(loops=-1)
+    if profile: profiler.toggle()
     
+    def refresh_leaderboard():
+        nonlocal leaderboard, lb_pages
+        lb_pages = max(1, -(-leaderboard_db.count(**lb_filters) // LEADERBOARD_PAGE_SIZE))
+        leaderboard = load_leaderboard(lb_page, **lb_filters)
+
     def start_game():
-        nonlocal game_state, endless_mode
-        nonlocal shared_score, shared_exp, shared_level, points_to_next_level, next_level_score
-        nonlocal enemy_spawn_timer, health_spawn_timer, next_boss_score, powerup_spawn_timer, screen_shake_frames
-        nonlocal combo_multiplier, combo_timer
-        
+        nonlocal game_state, session, accumulator
         game_state = "PLAYING"
-        endless_mode = False
-        
-        players.clear()
-        if is_multiplayer:
-            players.append(Player(1, WIDTH // 2 - 50, HEIGHT // 2, p1_ship, save_data))
-            players.append(Player(2, WIDTH // 2 + 50, HEIGHT // 2, p2_ship, save_data))
-        else:
-            players.append(Player(1, WIDTH // 2, HEIGHT // 2, p1_ship, save_data))
-            
-        bullets.clear(); enemy_bullets.clear(); enemies.clear(); bosses.clear()
-        health_packs.clear(); particles.clear(); power_ups.clear()
-        
-        shared_score = 0
-        shared_exp = 0 
-        shared_level = save_data["upgrades"]["start_lvl"] 
-        points_to_next_level = 10 * shared_level
-        next_level_score = 10 * shared_level 
-        combo_multiplier = 1.0
-        combo_timer = 0
-        
-        enemy_spawn_timer = 0; health_spawn_timer = 0; powerup_spawn_timer = 0; next_boss_score = 50 * shared_level 
-        screen_shake_frames = 0
+        session = GameSession(current_difficulty, is_multiplayer, p1_ship, p2_ship, save_data, aim_priority=p2_aim)
+        session.recorder = ReplayRecorder(session)
+        accumulator = 0.0
+
+    def cycle_trails():
+        nonlocal trail_setting
+        trail_setting = TRAIL_QUALITIES[(TRAIL_QUALITIES.index(trail_setting) + 1) % len(TRAIL_QUALITIES)]
+
+    def record_resize():
+        # Po zwycięstwie gracz może grać dalej, więc zmiana rozmiaru na tym ekranie też należy do powtórki
+        if game_state in ["PLAYING", "PAUSED", "VICTORY"]: session.recorder.resize(session.tick, WIDTH, HEIGHT)
 
     def toggle_fs():
         global is_fullscreen, WIDTH, HEIGHT, screen
@@ -594,20 +2290,41 @@ def main():
             WIDTH, HEIGHT = 800, 600
             screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
         parallax_bg.resize(WIDTH, HEIGHT)
-        return pygame.Surface((WIDTH, HEIGHT))
+        record_resize()
 
     running = True
+    accumulator = 0.0
+    last_time = time.perf_counter()
+    last_input_time = last_time
+    # Ekrany statyczne: zatrzymane tło w pamięci i stan, który ostatnio trafił na ekran
+    static_background = None
+    drawn_state = None
 
     while running:
+        now = time.perf_counter()
+        frame_dt = now - last_time
+        last_time = now
+        if game_state != "PLAYING": accumulator = 0.0
+        full_redraw = False
+        
         for event in pygame.event.get():
+            last_input_time = now
+            if event.type != pygame.MOUSEMOTION: full_redraw = True
             if event.type == pygame.QUIT:
+                # Zamknięcie okna w trakcie gry też zapisuje powtórkę (dopisze ją Storage przy wyjściu)
+                if game_state in ["PLAYING", "PAUSED"]: save_replay(session)
                 running = False
+
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_F3, pygame.K_F4):
+                if event.key == pygame.K_F3: profiler.toggle()
+                elif profiler.enabled: print(f"Profil klatek zapisany: {profiler.export()}.csv/.json")
+                continue
                 
             elif event.type == pygame.VIDEORESIZE and not is_fullscreen:
                 WIDTH, HEIGHT = event.w, event.h
                 screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
-                game_surface = pygame.Surface((WIDTH, HEIGHT))
                 parallax_bg.resize(WIDTH, HEIGHT)
+                record_resize()
                 
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 mouse_pos = event.pos
@@ -621,14 +2338,16 @@ def main():
                             elif action == "m_norm": current_difficulty, is_multiplayer, game_state = "normal", True, "SHIP_SELECT"
                             elif action == "m_hard": current_difficulty, is_multiplayer, game_state = "hard", True, "SHIP_SELECT"
                             elif action == "leaderboard":
-                                leaderboard = load_leaderboard()
+                                lb_page = 0
+                                refresh_leaderboard()
                                 game_state = "LEADERBOARD"
                             elif action == "shop": game_state = "SHOP"
                             elif action == "toggle_sound":
                                 sound_enabled = not sound_enabled
                                 if sound_enabled: bg_music.play(loops=-1)
-                                else: pygame.mixer.stop()
-                            elif action == "toggle_fs": game_surface = toggle_fs()
+                                else: sound_bank.stop_all()
+                            elif action == "toggle_fs": toggle_fs()
+                            elif action == "toggle_trails": cycle_trails()
                             
                 elif game_state == "SHIP_SELECT":
                     for action, rect in ship_btns.items():
@@ -639,6 +2358,7 @@ def main():
                             elif action == "p2_light": p2_ship = "light"
                             elif action == "p2_bal": p2_ship = "balanced"
                             elif action == "p2_heavy": p2_ship = "heavy"
+                            elif action == "p2_aim": p2_aim = AIM_PRIORITIES[(AIM_PRIORITIES.index(p2_aim) + 1) % len(AIM_PRIORITIES)]
                             elif action == "start": start_game()
                             elif action == "back": game_state = "MENU"
                             
@@ -656,24 +2376,35 @@ def main():
                                 save_json("save_data.json", save_data)
 
                 elif game_state == "LEADERBOARD":
-                    if "back" in lb_btns and lb_btns["back"].collidepoint(mouse_pos): game_state = "MENU"
+                    for action, rect in lb_btns.items():
+                        if rect.collidepoint(mouse_pos):
+                            if action == "back": game_state = "MENU"
+                            elif action == "prev" and lb_page > 0: lb_page -= 1
+                            elif action == "next" and lb_page < lb_pages - 1: lb_page += 1
+                            elif action in lb_filters:
+                                options = LEADERBOARD_FILTERS[action]
+                                lb_filters[action] = options[(options.index(lb_filters[action]) + 1) % len(options)]
+                                lb_page = 0
+                            refresh_leaderboard()
+                            break
                         
                 elif game_state in ["GAME_OVER", "VICTORY"]:
                     if "save" in end_btns and end_btns["save"].collidepoint(mouse_pos):
                         name_to_save = player_name.strip()
                         if not name_to_save: name_to_save = "Anonim"
-                        save_score(name_to_save, shared_score)
-                        leaderboard = load_leaderboard()
-                        high_score = leaderboard[0]["score"] if len(leaderboard) > 0 else 0
-                        save_data["coins"] += shared_score
+                        save_score(name_to_save, session.shared_score, session.difficulty, "coop" if session.is_multiplayer else "single",
+                                   p1_ship, p2_ship if session.is_multiplayer else None)
+                        high_score = leaderboard_db.best()
+                        save_data["coins"] += session.shared_score
                         save_json("save_data.json", save_data)
                         game_state = "MENU"
                     elif "skip" in end_btns and end_btns["skip"].collidepoint(mouse_pos):
-                        save_data["coins"] += shared_score
+                        save_data["coins"] += session.shared_score
                         save_json("save_data.json", save_data)
                         game_state = "MENU"
                     elif game_state == "VICTORY" and "continue" in end_btns and end_btns["continue"].collidepoint(mouse_pos):
-                        endless_mode = True
+                        session.endless_mode = True
+                        session.outcome = None
                         game_state = "PLAYING"
                         
                 elif game_state == "PAUSED":
@@ -681,28 +2412,31 @@ def main():
                         if rect.collidepoint(mouse_pos):
                             if action == "resume": game_state = "PLAYING"
                             elif action == "save_quit":
+                                save_replay(session)
                                 player_name = ""
                                 game_state = "GAME_OVER"
                             elif action == "menu":
+                                save_replay(session)
                                 game_state = "MENU"
                             elif action == "toggle_sound": 
                                 sound_enabled = not sound_enabled
                                 if sound_enabled: bg_music.play(loops=-1)
-                                else: pygame.mixer.stop()
-                            elif action == "toggle_fs": game_surface = toggle_fs()
+                                else: sound_bank.stop_all()
+                            elif action == "toggle_fs": toggle_fs()
+                            elif action == "toggle_trails": cycle_trails()
 
             if game_state in ["GAME_OVER", "VICTORY"] and event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
                     name_to_save = player_name.strip()
                     if not name_to_save: name_to_save = "Anonim"
-                    save_score(name_to_save, shared_score)
-                    leaderboard = load_leaderboard()
-                    high_score = leaderboard[0]["score"] if len(leaderboard) > 0 else 0
-                    save_data["coins"] += shared_score
+                    save_score(name_to_save, session.shared_score, session.difficulty, "coop" if session.is_multiplayer else "single",
+                               p1_ship, p2_ship if session.is_multiplayer else None)
+                    high_score = leaderboard_db.best()
+                    save_data["coins"] += session.shared_score
                     save_json("save_data.json", save_data)
                     game_state = "MENU"
                 elif event.key == pygame.K_ESCAPE:
-                    save_data["coins"] += shared_score
+                    save_data["coins"] += session.shared_score
                     save_json("save_data.json", save_data)
                     game_state = "MENU"
                 elif event.key == pygame.K_BACKSPACE:
@@ -717,409 +2451,324 @@ def main():
                 if event.key == pygame.K_ESCAPE:
                     game_state = "PLAYING" 
                 elif event.key in [pygame.K_RETURN, pygame.K_KP_ENTER]:
+                    save_replay(session)
                     player_name = ""
                     game_state = "GAME_OVER"
 
         # 2. LOGIKA I RYSOWANIE
-        parallax_bg.update_and_draw(game_surface)
+        profiler.lap("input")
+        ui_widgets.begin()
+        quality = governor.settings
+        trail_quality = TRAIL_QUALITIES[max(TRAIL_QUALITIES.index(trail_setting), TRAIL_QUALITIES.index(quality["trails"]))]
+        static_screen = game_state in STATIC_SCREENS
+        shake_x = shake_y = 0
+        if static_screen:
+            if drawn_state not in STATIC_SCREENS or static_background is None or static_background.get_size() != (WIDTH, HEIGHT):
+                static_background = pygame.Surface((WIDTH, HEIGHT))
+                parallax_bg.update_and_draw(static_background, scroll=False)
+            screen.blit(static_background, (0, 0))
+        else:
+            parallax_bg.update_and_draw(screen, layers=quality["stars"])
+        profiler.lap("background")
 
         if game_state == "MENU":
             menu_btns.clear()
-            title = menu_font_large.render("KOSMICZNA STRZELANKA", True, BLUE)
-            game_surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 2 - 220))
+            title = render_text(menu_font_large, "KOSMICZNA STRZELANKA", BLUE)
+            screen.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 2 - 220))
             
             left_center, right_center = WIDTH // 4, 3 * WIDTH // 4
             
-            single = menu_font_small.render("JEDEN GRACZ (WSAD+Mysz)", True, WHITE)
-            game_surface.blit(single, (left_center - single.get_width() // 2, HEIGHT // 2 - 120))
-            menu_btns["s_easy"] = draw_button(game_surface, "Łatwy", menu_font_small, GREEN, left_center, HEIGHT // 2 - 50)
-            menu_btns["s_norm"] = draw_button(game_surface, "Normalny", menu_font_small, YELLOW, left_center, HEIGHT // 2 + 20)
-            menu_btns["s_hard"] = draw_button(game_surface, "Trudny", menu_font_small, RED, left_center, HEIGHT // 2 + 90)
+            single = render_text(menu_font_small, "JEDEN GRACZ (WSAD+Mysz)", WHITE)
+            screen.blit(single, (left_center - single.get_width() // 2, HEIGHT // 2 - 120))
+            menu_btns["s_easy"] = draw_button(screen, "Łatwy", menu_font_small, GREEN, left_center, HEIGHT // 2 - 50)
+            menu_btns["s_norm"] = draw_button(screen, "Normalny", menu_font_small, YELLOW, left_center, HEIGHT // 2 + 20)
+            menu_btns["s_hard"] = draw_button(screen, "Trudny", menu_font_small, RED, left_center, HEIGHT // 2 + 90)
             
-            multi = menu_font_small.render("DWÓCH GRACZY (Co-op)", True, PINK)
-            game_surface.blit(multi, (right_center - multi.get_width() // 2, HEIGHT // 2 - 120))
-            menu_btns["m_easy"] = draw_button(game_surface, "Łatwy", menu_font_small, GREEN, right_center, HEIGHT // 2 - 50)
-            menu_btns["m_norm"] = draw_button(game_surface, "Normalny", menu_font_small, YELLOW, right_center, HEIGHT // 2 + 20)
-            menu_btns["m_hard"] = draw_button(game_surface, "Trudny", menu_font_small, RED, right_center, HEIGHT // 2 + 90)
+            multi = render_text(menu_font_small, "DWÓCH GRACZY (Co-op)", PINK)
+            screen.blit(multi, (right_center - multi.get_width() // 2, HEIGHT // 2 - 120))
+            menu_btns["m_easy"] = draw_button(screen, "Łatwy", menu_font_small, GREEN, right_center, HEIGHT // 2 - 50)
+            menu_btns["m_norm"] = draw_button(screen, "Normalny", menu_font_small, YELLOW, right_center, HEIGHT // 2 + 20)
+            menu_btns["m_hard"] = draw_button(screen, "Trudny", menu_font_small, RED, right_center, HEIGHT // 2 + 90)
             
-            menu_btns["shop"] = draw_button(game_surface, f"SKLEP ({save_data['coins']} MONET)", menu_font_small, ORANGE, WIDTH // 2 - 150, HEIGHT - 100)
-            menu_btns["leaderboard"] = draw_button(game_surface, "TOP 10 RANKING", menu_font_small, CYAN, WIDTH // 2 + 150, HEIGHT - 100)
+            menu_btns["shop"] = draw_button(screen, f"SKLEP ({save_data['coins']} MONET)", menu_font_small, ORANGE, WIDTH // 2 - 150, HEIGHT - 100)
+            menu_btns["leaderboard"] = draw_button(screen, "TOP 10 RANKING", menu_font_small, CYAN, WIDTH // 2 + 150, HEIGHT - 100)
             
             snd_text = "DŹWIĘK: ON" if sound_enabled else "DŹWIĘK: OFF"
             snd_col = GREEN if sound_enabled else RED
             fs_text = "OKNO" if not is_fullscreen else "PEŁNY EKRAN"
             
-            menu_btns["toggle_sound"] = draw_button(game_surface, snd_text, small_font, snd_col, 100, HEIGHT - 40)
-            menu_btns["toggle_fs"] = draw_button(game_surface, fs_text, small_font, WHITE, 250, HEIGHT - 40)
+            menu_btns["toggle_sound"] = draw_button(screen, snd_text, small_font, snd_col, 100, HEIGHT - 40)
+            menu_btns["toggle_fs"] = draw_button(screen, fs_text, small_font, WHITE, 250, HEIGHT - 40)
+            menu_btns["toggle_trails"] = draw_button(screen, f"ŚLADY: {TRAIL_QUALITY_NAMES[trail_setting]}", small_font, WHITE, 420, HEIGHT - 40)
 
         elif game_state == "SHOP":
             shop_btns.clear()
-            title = menu_font_large.render("SKLEP (META-PROGRESJA)", True, ORANGE)
-            game_surface.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
+            title = render_text(menu_font_large, "SKLEP (META-PROGRESJA)", ORANGE)
+            screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
             
-            coins_txt = font.render(f"Posiadasz: {save_data['coins']} monet", True, YELLOW)
-            game_surface.blit(coins_txt, (WIDTH // 2 - coins_txt.get_width() // 2, 120))
+            coins_txt = render_text(font, f"Posiadasz: {save_data['coins']} monet", YELLOW)
+            screen.blit(coins_txt, (WIDTH // 2 - coins_txt.get_width() // 2, 120))
             
             hp_lvl = save_data["upgrades"]["hp_bonus"]
-            hp_txt = font.render(f"Więcej HP (Obecnie: +{hp_lvl*25} MAX HP)", True, WHITE)
-            game_surface.blit(hp_txt, (WIDTH // 2 - hp_txt.get_width() // 2, 200))
+            hp_txt = render_text(font, f"Więcej HP (Obecnie: +{hp_lvl*25} MAX HP)", WHITE)
+            screen.blit(hp_txt, (WIDTH // 2 - hp_txt.get_width() // 2, 200))
             col = GREEN if save_data["coins"] >= 50 else RED
-            shop_btns["buy_hp"] = draw_button(game_surface, "KUP ZA 50 MONET", small_font, col, WIDTH // 2, 250)
+            shop_btns["buy_hp"] = draw_button(screen, "KUP ZA 50 MONET", small_font, col, WIDTH // 2, 250)
             
             lvl = save_data["upgrades"]["start_lvl"]
-            lvl_txt = font.render(f"Startowy Poziom (Obecnie: Level {lvl})", True, WHITE)
-            game_surface.blit(lvl_txt, (WIDTH // 2 - lvl_txt.get_width() // 2, 330))
+            lvl_txt = render_text(font, f"Startowy Poziom (Obecnie: Level {lvl})", WHITE)
+            screen.blit(lvl_txt, (WIDTH // 2 - lvl_txt.get_width() // 2, 330))
             col = GREEN if save_data["coins"] >= 100 else RED
-            shop_btns["buy_lvl"] = draw_button(game_surface, "KUP ZA 100 MONET", small_font, col, WIDTH // 2, 380)
+            shop_btns["buy_lvl"] = draw_button(screen, "KUP ZA 100 MONET", small_font, col, WIDTH // 2, 380)
             
-            shop_btns["back"] = draw_button(game_surface, "WRÓĆ DO MENU", menu_font_small, WHITE, WIDTH // 2, HEIGHT - 80)
+            shop_btns["back"] = draw_button(screen, "WRÓĆ DO MENU", menu_font_small, WHITE, WIDTH // 2, HEIGHT - 80)
 
         elif game_state == "SHIP_SELECT":
             ship_btns.clear()
-            title = menu_font_large.render("WYBÓR STATKÓW", True, WHITE)
-            game_surface.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
+            title = render_text(menu_font_large, "WYBÓR STATKÓW", WHITE)
+            screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
             
-            p1_t = font.render(f"Gracz 1 (Obecnie: {p1_ship.upper()})", True, BLUE)
-            game_surface.blit(p1_t, (WIDTH // 4 - p1_t.get_width() // 2, 150))
-            ship_btns["p1_light"] = draw_button(game_surface, "Lekki (Szybki, 50HP)", small_font, GREEN if p1_ship == "light" else WHITE, WIDTH // 4, 200)
-            ship_btns["p1_bal"] = draw_button(game_surface, "Zbalansowany (100HP)", small_font, GREEN if p1_ship == "balanced" else WHITE, WIDTH // 4, 250)
-            ship_btns["p1_heavy"] = draw_button(game_surface, "Ciężki (Wolny, 200HP, Armor)", small_font, GREEN if p1_ship == "heavy" else WHITE, WIDTH // 4, 300)
+            p1_t = render_text(font, f"Gracz 1 (Obecnie: {p1_ship.upper()})", BLUE)
+            screen.blit(p1_t, (WIDTH // 4 - p1_t.get_width() // 2, 150))
+            ship_btns["p1_light"] = draw_button(screen, "Lekki (Szybki, 50HP)", small_font, GREEN if p1_ship == "light" else WHITE, WIDTH // 4, 200)
+            ship_btns["p1_bal"] = draw_button(screen, "Zbalansowany (100HP)", small_font, GREEN if p1_ship == "balanced" else WHITE, WIDTH // 4, 250)
+            ship_btns["p1_heavy"] = draw_button(screen, "Ciężki (Wolny, 200HP, Armor)", small_font, GREEN if p1_ship == "heavy" else WHITE, WIDTH // 4, 300)
             
             if is_multiplayer:
-                p2_t = font.render(f"Gracz 2 (Obecnie: {p2_ship.upper()})", True, PINK)
-                game_surface.blit(p2_t, (3 * WIDTH // 4 - p2_t.get_width() // 2, 150))
-                ship_btns["p2_light"] = draw_button(game_surface, "Lekki (Szybki, 50HP)", small_font, GREEN if p2_ship == "light" else WHITE, 3 * WIDTH // 4, 200)
-                ship_btns["p2_bal"] = draw_button(game_surface, "Zbalansowany (100HP)", small_font, GREEN if p2_ship == "balanced" else WHITE, 3 * WIDTH // 4, 250)
-                ship_btns["p2_heavy"] = draw_button(game_surface, "Ciężki (Wolny, 200HP, Armor)", small_font, GREEN if p2_ship == "heavy" else WHITE, 3 * WIDTH // 4, 300)
+                p2_t = render_text(font, f"Gracz 2 (Obecnie: {p2_ship.upper()})", PINK)
+                screen.blit(p2_t, (3 * WIDTH // 4 - p2_t.get_width() // 2, 150))
+                ship_btns["p2_light"] = draw_button(screen, "Lekki (Szybki, 50HP)", small_font, GREEN if p2_ship == "light" else WHITE, 3 * WIDTH // 4, 200)
+                ship_btns["p2_bal"] = draw_button(screen, "Zbalansowany (100HP)", small_font, GREEN if p2_ship == "balanced" else WHITE, 3 * WIDTH // 4, 250)
+                ship_btns["p2_heavy"] = draw_button(screen, "Ciężki (Wolny, 200HP, Armor)", small_font, GREEN if p2_ship == "heavy" else WHITE, 3 * WIDTH // 4, 300)
+                ship_btns["p2_aim"] = draw_button(screen, f"Celowanie: {AIM_PRIORITY_NAMES[p2_aim]}", small_font, CYAN, 3 * WIDTH // 4, 360)
                 
-            ship_btns["start"] = draw_button(game_surface, "START GRY!", menu_font_large, ORANGE, WIDTH // 2, 450)
-            ship_btns["back"] = draw_button(game_surface, "WRÓĆ", menu_font_small, WHITE, WIDTH // 2, HEIGHT - 50)
+            ship_btns["start"] = draw_button(screen, "START GRY!", menu_font_large, ORANGE, WIDTH // 2, 450)
+            ship_btns["back"] = draw_button(screen, "WRÓĆ", menu_font_small, WHITE, WIDTH // 2, HEIGHT - 50)
 
         elif game_state == "LEADERBOARD":
             lb_btns.clear()
-            title = menu_font_large.render("TOP 10 GRACZY", True, YELLOW)
-            game_surface.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
+            title = render_text(menu_font_large, "RANKING GRACZY", YELLOW)
+            screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 40))
+
+            diff_filter, mode_filter, ship_filter = lb_filters["difficulty"], lb_filters["mode"], lb_filters["ship"]
+            lb_btns["difficulty"] = draw_button(screen, f"Poziom: {DIFFICULTY_SETTINGS[diff_filter]['name'] if diff_filter else 'WSZYSTKIE'}", small_font, CYAN, WIDTH // 4, 115)
+            lb_btns["mode"] = draw_button(screen, f"Tryb: {MODE_NAMES[mode_filter] if mode_filter else 'WSZYSTKIE'}", small_font, CYAN, WIDTH // 2, 115)
+            lb_btns["ship"] = draw_button(screen, f"Statek: {ship_filter.upper() if ship_filter else 'WSZYSTKIE'}", small_font, CYAN, 3 * WIDTH // 4, 115)
             
             if not leaderboard:
-                empty_text = font.render("Brak zapisanych wyników.", True, WHITE)
-                game_surface.blit(empty_text, (WIDTH // 2 - empty_text.get_width() // 2, 200))
+                empty_text = render_text(font, "Brak zapisanych wyników.", WHITE)
+                screen.blit(empty_text, (WIDTH // 2 - empty_text.get_width() // 2, 200))
             else:
                 for i, entry in enumerate(leaderboard):
+                    rank = lb_page * LEADERBOARD_PAGE_SIZE + i + 1
                     c = WHITE
-                    if i == 0: c = YELLOW     
-                    elif i == 1: c = (192, 192, 192) 
-                    elif i == 2: c = (205, 127, 50)  
-                    text = font.render(f"{i+1}. {entry['name']} - {entry['score']} pkt", True, c)
-                    game_surface.blit(text, (WIDTH // 2 - text.get_width() // 2, 140 + i * 35))
-            
-            lb_btns["back"] = draw_button(game_surface, "WRÓĆ DO MENU", menu_font_small, GREEN, WIDTH // 2, HEIGHT - 80)
+                    if rank == 1: c = YELLOW     
+                    elif rank == 2: c = (192, 192, 192) 
+                    elif rank == 3: c = (205, 127, 50)  
+                    details = ""
+                    if entry["difficulty"]:
+                        ships = entry["ship"].upper() + (f"/{entry['ship2'].upper()}" if entry["ship2"] else "")
+                        details = f" ({DIFFICULTY_SETTINGS[entry['difficulty']]['name']}, {MODE_NAMES[entry['mode']]}, {ships})"
+                    text = render_text(font, f"{rank}. {entry['name']} - {entry['score']} pkt{details}", c)
+                    screen.blit(text, (WIDTH // 2 - text.get_width() // 2, 155 + i * 32))
+
+            page_text = render_text(small_font, f"Strona {lb_page + 1}/{lb_pages}", (200, 200, 200))
+            screen.blit(page_text, (WIDTH // 2 - page_text.get_width() // 2, HEIGHT - 130))
+            if lb_page > 0: lb_btns["prev"] = draw_button(screen, "<", menu_font_small, WHITE, WIDTH // 2 - 200, HEIGHT - 80)
+            lb_btns["back"] = draw_button(screen, "WRÓĆ DO MENU", menu_font_small, GREEN, WIDTH // 2, HEIGHT - 80)
+            if lb_page < lb_pages - 1: lb_btns["next"] = draw_button(screen, ">", menu_font_small, WHITE, WIDTH // 2 + 200, HEIGHT - 80)
 
         elif game_state in ["PLAYING", "PAUSED"]:
+            alpha = 1.0
             if game_state == "PLAYING":
-                diff_settings = DIFFICULTY_SETTINGS[current_difficulty]
-                diff_multiplier = 1 + (shared_level * 0.1) + (shared_exp / 500)
-
-                if screen_shake_frames > 0: screen_shake_frames -= 1
-                
-                if combo_timer > 0:
-                    combo_timer -= 1
-                    if combo_timer <= 0: combo_multiplier = 1.0 
-
-                while shared_exp >= next_level_score:
-                    shared_level += 1
-                    points_to_next_level += 5 
-                    next_level_score += points_to_next_level
-                    for p in players: p.level = shared_level
-
-                if shared_level >= 10 and not endless_mode:
-                    play_sound(victory_sound)
-                    game_state = "VICTORY"
-                    player_name = "" 
-                    
-                for p in players:
-                    p.update(enemies, bosses)
-                    p.shoot_timer += 1
-                    if p.shoot_timer >= p.shoot_delay:
-                        p.shoot_timer = 0
-                        num_barrels = min(p.level, 8)
-                        if p.weapon_type == "shotgun": num_barrels = 3
-                        
-                        angle_step = (2 * math.pi) / num_barrels if p.weapon_type != "shotgun" else 0.2
-                        start_angle = p.angle if p.weapon_type != "shotgun" else p.angle - (0.2 * (num_barrels//2))
-                        
-                        for i in range(num_barrels):
-                            bullet_angle = start_angle + (i * angle_step)
-                            spawn_x = p.x + math.cos(bullet_angle) * p.barrel_length
-                            spawn_y = p.y + math.sin(bullet_angle) * p.barrel_length
-                            bullets.append(Bullet(spawn_x, spawn_y, bullet_angle, owner="player", b_type=p.weapon_type))
-
-                for bullet in bullets[:]:
-                    bullet.update()
-                    if bullet.is_off_screen(): bullets.remove(bullet)
-                    
-                for e_bullet in enemy_bullets[:]:
-                    e_bullet.update()
-                    if e_bullet.is_off_screen(): 
-                        enemy_bullets.remove(e_bullet)
-                        continue
-                        
-                    for p in players[:]:
-                        if check_collision(e_bullet.x, e_bullet.y, e_bullet.radius, p.x, p.y, p.radius):
-                            if e_bullet in enemy_bullets: enemy_bullets.remove(e_bullet)
-                            if p.take_damage(15): 
-                                screen_shake_frames = 10
-                                shared_score = max(0, shared_score - 2) 
-                                play_sound(error_sound)
-                            if p.health <= 0 and p in players:
-                                for _ in range(30): particles.append(Particle(p.x, p.y, p.color))
-                                players.remove(p)
-                            break
-
-                for particle in particles[:]:
-                    particle.update()
-                    if particle.life <= 0: particles.remove(particle)
-
-                if shared_exp >= next_boss_score and len(bosses) == 0:
-                    bosses.append(Boss(diff_multiplier, diff_settings, shared_level, is_multiplayer))
-                    next_boss_score += 50 
-                    
-                if len(bosses) == 0:
-                    enemy_spawn_timer += 1
-                    base_spawn_rate = max(10, 60 - (shared_level * 3))
-                    spawn_rate = base_spawn_rate * diff_settings["spawn_rate"]
-                    if enemy_spawn_timer >= spawn_rate:
-                        chosen_type = random.choices(["normal", "tank", "fast", "shooter", "kamikaze"], weights=[50, 15, 15, 10, 10], k=1)[0]
-                        enemies.append(Enemy(chosen_type, diff_multiplier, diff_settings))
-                        enemy_spawn_timer = 0
-
-                health_spawn_timer += 1
-                if health_spawn_timer >= next_health_spawn:
-                    if len(health_packs) < 3: health_packs.append(HealthPack())
-                    health_spawn_timer = 0
-                    next_health_spawn = random.randint(300, 900)
-                    
-                powerup_spawn_timer += 1
-                if powerup_spawn_timer >= next_powerup_spawn:
-                    if len(power_ups) < 2: power_ups.append(PowerUp())
-                    powerup_spawn_timer = 0
-                    next_powerup_spawn = random.randint(600, 1200)
-
-                for pack in health_packs[:]:
-                    for p in players:
-                        if check_collision(p.x, p.y, p.radius, pack.x, pack.y, pack.radius):
-                            if pack in health_packs: health_packs.remove(pack)
-                            p.health += pack.heal_amount
-                            if p.health > p.max_health: p.health = p.max_health
-                            play_sound(powerup_sound)
-                            break 
-                            
-                for pup in power_ups[:]:
-                    for p in players:
-                        if check_collision(p.x, p.y, p.radius, pup.x, pup.y, pup.radius):
-                            if pup in power_ups: power_ups.remove(pup)
-                            if pup.type == "shield": p.has_shield = True
-                            elif pup.type == "rapid_fire": p.rapid_fire_timer = 300 
-                            elif pup.type == "shotgun": p.weapon_type = "shotgun"; p.weapon_timer = 300
-                            elif pup.type == "pierce": p.weapon_type = "pierce"; p.weapon_timer = 300
-                            play_sound(powerup_sound)
-                            break 
-
-                for bullet in bullets[:]:
-                    hit_something = False
-                    for boss in bosses[:]:
-                        if check_collision(bullet.x, bullet.y, bullet.radius, boss.x, boss.y, boss.radius):
-                            if bullet.b_type != "pierce": hit_something = True
-                            elif boss in bullet.enemies_hit: continue 
-                            if bullet.b_type == "pierce": bullet.enemies_hit.append(boss)
-                            
-                            boss.hp -= 1
-                            if boss.hp <= 0:
-                                if boss in bosses:
-                                    play_sound(boss_death_sound)
-                                    screen_shake_frames = 20 
-                                    for _ in range(50): particles.append(Particle(boss.x, boss.y, boss.color))
-                                    bosses.remove(boss)
-                                    shared_score += int(10 * combo_multiplier)
-                                    shared_exp += 10
-                                    combo_multiplier = min(4.0, combo_multiplier + 1.0)
-                                    combo_timer = 180
-                            break
-                            
-                    if hit_something:
-                        if bullet in bullets: bullets.remove(bullet)
-                        continue 
-
-                    for enemy in enemies[:]:
-                        if check_collision(bullet.x, bullet.y, bullet.radius, enemy.x, enemy.y, enemy.radius):
-                            if bullet.b_type != "pierce": hit_something = True
-                            elif enemy in bullet.enemies_hit: continue
-                            if bullet.b_type == "pierce": bullet.enemies_hit.append(enemy)
-                            
-                            enemy.hp -= 1
-                            if enemy.hp <= 0:
-                                if enemy in enemies:
-                                    if enemy.type == "kamikaze":
-                                        for i in range(8):
-                                            ang = (2 * math.pi / 8) * i
-                                            enemy_bullets.append(Bullet(enemy.x, enemy.y, ang, owner="enemy"))
-                                            
-                                    for _ in range(15): particles.append(Particle(enemy.x, enemy.y, enemy.color))
-                                    enemies.remove(enemy)
-                                    shared_score += int(1 * combo_multiplier)
-                                    shared_exp += 1
-                                    combo_multiplier = min(4.0, combo_multiplier + 0.1)
-                                    combo_timer = 180
-                            break
-                    if hit_something and bullet in bullets: bullets.remove(bullet)
-
-                for p in players[:]:
-                    for boss in bosses:
-                        if check_collision(p.x, p.y, p.radius, boss.x, boss.y, boss.radius):
-                            if p.take_damage(boss.damage):
-                                screen_shake_frames = 15
-                                shared_score = max(0, shared_score - 5)
-                                combo_multiplier = 1.0
-                                play_sound(error_sound)
-                                angle = math.atan2(p.y - boss.y, p.x - boss.x)
-                                p.x += math.cos(angle) * 80 
-                                p.y += math.sin(angle) * 80
-                    
-                    for enemy in enemies[:]:
-                        if check_collision(p.x, p.y, p.radius, enemy.x, enemy.y, enemy.radius):
-                            if enemy.type == "kamikaze":
-                                for i in range(8):
-                                    ang = (2 * math.pi / 8) * i
-                                    enemy_bullets.append(Bullet(enemy.x, enemy.y, ang, owner="enemy"))
-                            if enemy in enemies: enemies.remove(enemy)
-                            
-                            if p.take_damage(enemy.damage): 
-                                screen_shake_frames = 10
-                                shared_score = max(0, shared_score - 3)
-                                combo_multiplier = 1.0
-                                play_sound(error_sound)
-
-                    if p.health <= 0 and p in players:
-                        for _ in range(30): particles.append(Particle(p.x, p.y, p.color)) 
-                        players.remove(p)
+                accumulator += min(frame_dt, MAX_TICKS_PER_FRAME * SIM_DT)
+                ticks = 0
+                while accumulator >= SIM_DT and session.outcome is None:
+                    session.step({1: read_keyboard_input(1), 2: read_keyboard_input(2)})
+                    accumulator -= SIM_DT
+                    ticks += 1
+                    if ticks >= MAX_TICKS_PER_FRAME:
+                        accumulator = 0.0
+                        break
+                if session.outcome is not None:
+                    # Po zwycięstwie gra może trwać dalej - wtedy kolejny zapis nadpisze ten plik
+                    save_replay(session)
+                    game_state = session.outcome
+                    player_name = ""
+                else:
+                    alpha = accumulator / SIM_DT
 
-                for boss in bosses: boss.update(players, enemy_bullets, enemies, diff_multiplier, diff_settings)
-                for enemy in enemies: enemy.update(players, enemy_bullets)
+            # Wstrząs losujemy przed rysowaniem: obraz przesunięty o (shake_x, shake_y) pokazuje
+            # fragment świata przesunięty w przeciwną stronę i tylko ten fragment rysujemy
+            shaking = session.screen_shake_frames > 0 and quality["shake"]
+            shake_x = random.randint(-5, 5) if shaking else 0
+            shake_y = random.randint(-5, 5) if shaking else 0
+            session.draw(screen, alpha, trail_quality, quality, pygame.Rect(-shake_x, -shake_y, WIDTH, HEIGHT))
 
-                if len(players) == 0:
-                    game_state = "GAME_OVER"
-                    player_name = "" 
-
-            for pup in power_ups: pup.draw(game_surface)
-            for pack in health_packs: pack.draw(game_surface)
-            for particle in particles: particle.draw(game_surface)
-            for boss in bosses: boss.draw(game_surface) 
-            for enemy in enemies: enemy.draw(game_surface)
-            for bullet in bullets: bullet.draw(game_surface)
-            for e_bullet in enemy_bullets: e_bullet.draw(game_surface) 
-            for p in players: p.draw(game_surface)
-
-            for boss in bosses:
+            for boss in session.bosses:
                 if boss.x < 0 or boss.x > WIDTH or boss.y < 0 or boss.y > HEIGHT:
                     rx = max(20, min(WIDTH - 20, boss.x))
                     ry = max(20, min(HEIGHT - 20, boss.y))
                     if pygame.time.get_ticks() % 500 < 250:
-                        pygame.draw.polygon(game_surface, RED, [(rx, ry-15), (rx-10, ry+10), (rx+10, ry+10)])
-                        excl = small_font.render("!", True, WHITE)
-                        game_surface.blit(excl, (rx - excl.get_width()//2, ry - 5))
+                        pygame.draw.polygon(screen, RED, [(rx, ry-15), (rx-10, ry+10), (rx+10, ry+10)])
+                        excl = render_text(small_font, "!", WHITE)
+                        screen.blit(excl, (rx - excl.get_width()//2, ry - 5))
 
-            current_displayed_high_score = max(high_score, shared_score)
+            current_displayed_high_score = max(high_score, session.shared_score)
             diff_name = DIFFICULTY_SETTINGS[current_difficulty]["name"]
             mode_name = "CO-OP" if is_multiplayer else "SINGLE"
             
-            score_text = font.render(f"Punkty: {shared_score}", True, WHITE)
-            high_score_text = font.render(f"TOP 1: {current_displayed_high_score}", True, YELLOW)
+            score_text = render_text(font, f"Punkty: {session.shared_score}", WHITE)
+            high_score_text = render_text(font, f"TOP 1: {current_displayed_high_score}", YELLOW)
             
-            if combo_multiplier > 1.0:
-                combo_text = menu_font_small.render(f"COMBO x{combo_multiplier:.1f}", True, ORANGE)
-                game_surface.blit(combo_text, (WIDTH // 2 - combo_text.get_width() // 2, 60))
-                pygame.draw.rect(game_surface, ORANGE, (WIDTH // 2 - 100, 100, 200 * (combo_timer / 180), 5))
+            if session.combo_multiplier > 1.0:
+                combo_text = render_text(menu_font_small, f"COMBO x{session.combo_multiplier:.1f}", ORANGE)
+                screen.blit(combo_text, (WIDTH // 2 - combo_text.get_width() // 2, 60))
+                pygame.draw.rect(screen, ORANGE, (WIDTH // 2 - 100, 100, 200 * (session.combo_timer / 180), 5))
             
-            lvl_str = f"Poziom: {shared_level}" if endless_mode else f"Poziom: {shared_level}/10"
-            level_text = font.render(lvl_str, True, WHITE)
+            lvl_str = f"Poziom: {session.shared_level}" if session.endless_mode else f"Poziom: {session.shared_level}/10"
+            level_text = render_text(font, lvl_str, WHITE)
             
-            pts_needed = next_level_score - shared_exp
-            level_progress_text = small_font.render(f"(Do awansu brakuje {pts_needed} EXP)", True, (200, 200, 200))
-            diff_text = font.render(f"Złoto z gry: {shared_score} monet", True, ORANGE)
+            pts_needed = session.next_level_score - session.shared_exp
+            level_progress_text = render_text(small_font, f"(Do awansu brakuje {pts_needed} EXP)", (200, 200, 200))
+            diff_text = render_text(font, f"Złoto z gry: {session.shared_score} monet", ORANGE)
             
-            if len(bosses) > 0:
-                warning = font.render("UWAGA: BOSS!", True, RED)
-                game_surface.blit(warning, (WIDTH // 2 - warning.get_width() // 2, 20))
+            if len(session.bosses) > 0:
+                warning = render_text(font, "UWAGA: BOSS!", RED)
+                screen.blit(warning, (WIDTH // 2 - warning.get_width() // 2, 20))
 
-            game_surface.blit(score_text, (10, 10))
-            game_surface.blit(high_score_text, (10, 40))
-            game_surface.blit(level_text, (10, 70))
-            game_surface.blit(level_progress_text, (10, 100))
-            game_surface.blit(diff_text, (10, 125))
+            if quality_notice and now < quality_notice_until:
+                notice = render_text(small_font, *quality_notice)
+                screen.blit(notice, (WIDTH // 2 - notice.get_width() // 2, HEIGHT - 40))
+
+            screen.blit(score_text, (10, 10))
+            screen.blit(high_score_text, (10, 40))
+            screen.blit(level_text, (10, 70))
+            screen.blit(level_progress_text, (10, 100))
+            screen.blit(diff_text, (10, 125))
 
             bar_w, bar_h = 150, 20
-            for p in players:
+            for p in session.players:
                 ratio = p.health / p.max_health
                 if p.p_id == 1:
                     x, y = 10, 160
                 else:
                     x, y = WIDTH - 160, 160
                     
-                pygame.draw.rect(game_surface, RED, (x, y, bar_w, bar_h))
-                pygame.draw.rect(game_surface, GREEN, (x, y, bar_w * ratio, bar_h))
-                pygame.draw.rect(game_surface, WHITE, (x, y, bar_w, bar_h), 2)
+                pygame.draw.rect(screen, RED, (x, y, bar_w, bar_h))
+                pygame.draw.rect(screen, GREEN, (x, y, bar_w * ratio, bar_h))
+                pygame.draw.rect(screen, WHITE, (x, y, bar_w, bar_h), 2)
                 
             if game_state == "PAUSED":
                 pause_btns.clear()
-                overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-                overlay.fill((0, 0, 0, 180)) 
-                game_surface.blit(overlay, (0, 0))
+                # Półprzezroczyste przyciemnienie tworzone raz (i po zmianie rozmiaru okna)
+                if pause_overlay is None or pause_overlay.get_size() != (WIDTH, HEIGHT):
+                    pause_overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+                    pause_overlay.fill((0, 0, 0, 180)) 
+                screen.blit(pause_overlay, (0, 0))
                 
-                pause_title = menu_font_large.render("PAUZA", True, WHITE)
-                game_surface.blit(pause_title, (WIDTH // 2 - pause_title.get_width() // 2, HEIGHT // 2 - 160))
+                pause_title = render_text(menu_font_large, "PAUZA", WHITE)
+                screen.blit(pause_title, (WIDTH // 2 - pause_title.get_width() // 2, HEIGHT // 2 - 160))
                 
-                pause_btns["resume"] = draw_button(game_surface, "WZNÓW GRĘ", menu_font_small, GREEN, WIDTH // 2, HEIGHT // 2 - 50)
-                pause_btns["save_quit"] = draw_button(game_surface, "ZAKOŃCZ I ZAPISZ WYNIK", menu_font_small, YELLOW, WIDTH // 2, HEIGHT // 2 + 10)
-                pause_btns["menu"] = draw_button(game_surface, "WYJDŹ BEZ ZAPISU", menu_font_small, RED, WIDTH // 2, HEIGHT // 2 + 70)
+                pause_btns["resume"] = draw_button(screen, "WZNÓW GRĘ", menu_font_small, GREEN, WIDTH // 2, HEIGHT // 2 - 50)
+                pause_btns["save_quit"] = draw_button(screen, "ZAKOŃCZ I ZAPISZ WYNIK", menu_font_small, YELLOW, WIDTH // 2, HEIGHT // 2 + 10)
+                pause_btns["menu"] = draw_button(screen, "WYJDŹ BEZ ZAPISU", menu_font_small, RED, WIDTH // 2, HEIGHT // 2 + 70)
+                trails_text = f"ŚLADY POCISKÓW: {TRAIL_QUALITY_NAMES[trail_setting]}"
+                if trail_quality != trail_setting: trails_text += f" (AUTO: {TRAIL_QUALITY_NAMES[trail_quality]})"
+                pause_btns["toggle_trails"] = draw_button(screen, trails_text, small_font, WHITE, WIDTH // 2, HEIGHT // 2 + 130)
 
         elif game_state in ["GAME_OVER", "VICTORY"]:
             end_btns.clear()
             if game_state == "GAME_OVER":
-                title_text = menu_font_large.render("KONIEC GRY", True, RED)
+                title_text = render_text(menu_font_large, "KONIEC GRY", RED)
             else:
                 vic_str = "WYGRALIŚCIE!" if is_multiplayer else "WYGRAŁEŚ!"
-                title_text = menu_font_large.render(vic_str, True, GREEN)
+                title_text = render_text(menu_font_large, vic_str, GREEN)
 
-            final_score_text = font.render(f"Zdobyliście: {shared_score} pkt na poziomie {shared_level}", True, YELLOW)
-            prompt_text = font.render("Wpisz swój Nick (Klawiatura):", True, WHITE)
+            final_score_text = render_text(font, f"Zdobyliście: {session.shared_score} pkt na poziomie {session.shared_level}", YELLOW)
+            prompt_text = render_text(font, "Wpisz swój Nick (Klawiatura):", WHITE)
             cursor = "|" if pygame.time.get_ticks() % 1000 < 500 else ""
-            name_box_text = menu_font_small.render(f"{player_name}{cursor}", True, CYAN)
+            name_box_text = render_text(menu_font_small, f"{player_name}{cursor}", CYAN)
             
-            game_surface.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, HEIGHT // 2 - 180))
-            game_surface.blit(final_score_text, (WIDTH // 2 - final_score_text.get_width() // 2, HEIGHT // 2 - 100))
-            game_surface.blit(prompt_text, (WIDTH // 2 - prompt_text.get_width() // 2, HEIGHT // 2 - 20))
+            screen.blit(title_text, (WIDTH // 2 - title_text.get_width() // 2, HEIGHT // 2 - 180))
+            screen.blit(final_score_text, (WIDTH // 2 - final_score_text.get_width() // 2, HEIGHT // 2 - 100))
+            screen.blit(prompt_text, (WIDTH // 2 - prompt_text.get_width() // 2, HEIGHT // 2 - 20))
             
             box_rect = pygame.Rect(WIDTH // 2 - 150, HEIGHT // 2 + 20, 300, 50)
-            pygame.draw.rect(game_surface, (50, 50, 50), box_rect)
-            pygame.draw.rect(game_surface, WHITE, box_rect, 2)
-            game_surface.blit(name_box_text, (WIDTH // 2 - name_box_text.get_width() // 2, HEIGHT // 2 + 35))
+            pygame.draw.rect(screen, (50, 50, 50), box_rect)
+            pygame.draw.rect(screen, WHITE, box_rect, 2)
+            screen.blit(name_box_text, (WIDTH // 2 - name_box_text.get_width() // 2, HEIGHT // 2 + 35))
+            ui_widgets.mark(box_rect, player_name, cursor)
             
-            end_btns["save"] = draw_button(game_surface, "ZAPISZ (ENTER)", menu_font_small, GREEN, WIDTH // 2 - 130, HEIGHT // 2 + 120)
-            end_btns["skip"] = draw_button(game_surface, "POMIŃ (ESC)", menu_font_small, RED, WIDTH // 2 + 130, HEIGHT // 2 + 120)
+            end_btns["save"] = draw_button(screen, "ZAPISZ (ENTER)", menu_font_small, GREEN, WIDTH // 2 - 130, HEIGHT // 2 + 120)
+            end_btns["skip"] = draw_button(screen, "POMIŃ (ESC)", menu_font_small, RED, WIDTH // 2 + 130, HEIGHT // 2 + 120)
             
             if game_state == "VICTORY":
-                end_btns["continue"] = draw_button(game_surface, "GRAJ DALEJ (ENDLESS)", menu_font_small, YELLOW, WIDTH // 2, HEIGHT // 2 + 190)
+                end_btns["continue"] = draw_button(screen, "GRAJ DALEJ (ENDLESS)", menu_font_small, YELLOW, WIDTH // 2, HEIGHT // 2 + 190)
 
+        profiler.lap("hud")
         # --- FINALNE RYSOWANIE NA EKRAN ---
-        screen.fill(BLACK) 
-        shake_x = random.randint(-5, 5) if screen_shake_frames > 0 else 0
-        shake_y = random.randint(-5, 5) if screen_shake_frames > 0 else 0
-        screen.blit(game_surface, (shake_x, shake_y))
-
-        pygame.display.flip()
-        clock.tick(60)
-
+        # Klatka jest rysowana od razu na ekranie; wstrząs przesuwa gotowy obraz w miejscu
+        # (Surface.scroll) i zaczernia odsłonięte pasy - bez kopii całej klatki.
+        dirty = ui_widgets.changed_rects() if static_screen else None
+        if static_screen and not full_redraw and drawn_state == game_state and dirty is not None and not profiler.enabled:
+            # Bez zmian układu: tylko przyciski, których stan się zmienił (albo nic)
+            if dirty: pygame.display.update(dirty)
+        else:
+            if shake_x or shake_y:
+                screen.scroll(shake_x, shake_y)
+                if shake_x > 0: screen.fill(BLACK, (0, 0, shake_x, HEIGHT))
+                elif shake_x < 0: screen.fill(BLACK, (WIDTH + shake_x, 0, -shake_x, HEIGHT))
+                if shake_y > 0: screen.fill(BLACK, (0, 0, WIDTH, shake_y))
+                elif shake_y < 0: screen.fill(BLACK, (0, HEIGHT + shake_y, WIDTH, -shake_y))
+            profiler.draw(screen, small_font)
+            profiler.lap("profiler")
+            pygame.display.flip()
+        profiler.lap("flip")
+        drawn_state = game_state
+
+        if game_state == "PLAYING":
+            governor.update((time.perf_counter() - now) * 1000)
+            for event in governor.poll_events():
+                arrow = "v" if event["direction"] > 0 else "^"
+                quality_notice = (f"JAKOŚĆ GRAFIKI: {event['name']} {arrow} (klatka {event['frame_ms']:.1f} ms)", ORANGE if event["direction"] > 0 else GREEN)
+                quality_notice_until = now + 2.0
+
+        if startup_probe:
+            # Znacznik czasu pierwszej wyświetlonej klatki (mierzony przez bench.py startup)
+            print(f"first_frame {time.time():.6f} sounds_ready {sound_bank.is_ready()}", flush=True)
+            running = False
+        sound_bank.update()
+        if static_screen and now - last_input_time > IDLE_AFTER: clock.tick(IDLE_FPS)
+        else: clock.tick(render_fps)
+        if profiler.enabled:
+            profiler.lap("wait")
+            profiler.end_frame(session if game_state in ["PLAYING", "PAUSED"] else None)
+
+    storage.flush()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Kosmiczna Strzelanka 2D")
+    parser.add_argument("--startup-probe", action="store_true", help="wypisz czas pierwszej klatki i zakończ")
+    parser.add_argument("--profile", action="store_true", help="włącz profiler klatki (F3) od startu")
+    parser.add_argument("--fps", type=int, default=RENDER_FPS_CAP, help="limit klatek rysowania (0 = bez limitu)")
+    parser.add_argument("--headless", action="store_true", help="symulacja bez okna, sterowanie przez bota, pomiar czasu ticku")
+    parser.add_argument("--minutes", type=float, default=1.0, help="headless: ile minut gry zasymulować (na poziom trudności)")
+    parser.add_argument("--difficulty", nargs="+", choices=list(DIFFICULTY_SETTINGS), default=list(DIFFICULTY_SETTINGS), help="headless: poziomy trudności")
+    parser.add_argument("--coop", action="store_true", help="headless: tryb dwóch graczy")
+    parser.add_argument("--seed", type=int, default=0, help="headless: ziarno losowania")
+    parser.add_argument("--policy", choices=list(HEADLESS_POLICIES), default="bot", help="headless: kto steruje statkiem")
+    parser.add_argument("--start-level", type=int, default=1, help="headless: poziom startowy")
+    parser.add_argument("--report", help="headless: zapisz wyniki do pliku JSON")
+    parser.add_argument("--aim", choices=AIM_PRIORITIES, default="nearest", help="headless: priorytet autocelowania gracza 2")
+    parser.add_argument("--replay", help="odtwórz powtórkę z pliku .ksr (domyślnie najszybciej, bez rysowania)")
+    parser.add_argument("--realtime", action="store_true", help="replay: odtwarzaj w oknie z prędkością gry")
+    args = parser.parse_args()
+    if args.replay:
+        sys.exit(0 if run_replay(args.replay, args.realtime) else 1)
+    elif args.headless:
+        run_headless(args.minutes, args.difficulty, args.coop, args.start_level, args.seed, args.policy, args.report, args.aim)
+    else:
+        main(startup_probe=args.startup_probe, render_fps=args.fps, profile=args.profile)